@@ -0,0 +1,120 @@
+import re
+import sys
+import logging
+from datetime import datetime, timedelta, timezone
+
+from storage import get_backend
+
+# ----------------------------
+# 文章發文時間
+# PTT 文章網址 .../M.<epoch>.A.<hex>.html 的 epoch 即發文時間，不必解析頁面就能取得；
+# 內文 meta 行的「時間」只用來確認，兩者都沒有時才對全文做正規表示式搜尋。
+# 都取不到時回傳 None，不再以現在時間代替 (會讓時間序列在爬取當下出現尖峰)
+# ----------------------------
+
+# PTT 顯示的是台灣時間 (無日光節約)，資料庫存放不含時區的台灣時間
+PTT_TZ = timezone(timedelta(hours=8))
+LINK_EPOCH_RE = re.compile(r"/M\.(\d{9,10})\.A(?:\.[0-9A-Fa-f]+)?\.html")
+META_TIME_FORMAT = '%a %b %d %H:%M:%S %Y'
+FULL_TEXT_TIME_RE = re.compile(r"[A-Z][a-z]{2}\s[A-Z][a-z]{2}\s{1,2}\d{1,2}\s\d{2}:\d{2}:\d{2}\s\d{4}")
+# meta 時間可被作者編輯，與 epoch 相差超過此值時記錄下來並以 epoch 為準
+META_TOLERANCE = timedelta(minutes=5)
+
+def link_epoch_time(link):
+    """
+    由文章網址取出發文時間 (台灣時間，不含時區)；不是 M.<epoch>.A 格式則回傳 None
+    """
+    if not link:
+        return None
+    m = LINK_EPOCH_RE.search(link)
+    if not m:
+        return None
+    return datetime.fromtimestamp(int(m.group(1)), tz=PTT_TZ).replace(tzinfo=None)
+
+def meta_time(soup):
+    """
+    由內文 meta 行 (作者 / 標題 / 時間) 取出發文時間
+    """
+    for meta in soup.select("div.article-metaline, div.article-metaline-right"):
+        tag_span = meta.find("span", class_="article-meta-tag")
+        value_span = meta.find("span", class_="article-meta-value")
+        if tag_span and value_span and "時間" in tag_span.text.strip():
+            post_time_str = value_span.text.strip()
+            try:
+                return datetime.strptime(post_time_str, META_TIME_FORMAT)
+            except ValueError as e:
+                logging.warning(f"Time parsing failed: {post_time_str}, {e}")
+                return None
+    return None
+
+def full_text_time(soup):
+    match = FULL_TEXT_TIME_RE.search(soup.get_text())
+    if match:
+        try:
+            return datetime.strptime(match.group(0).strip(), META_TIME_FORMAT)
+        except ValueError as e:
+            logging.warning(f"Time parsing failed: {match.group(0)}, {e}")
+    return None
+
+def fetch_article_time(soup=None, link=None):
+    """
+    依序：網址 epoch -> meta 行 -> 全文搜尋；都失敗回傳 None
+    soup 可為 None (頁面抓取失敗時仍可由網址得到時間)
+    """
+    epoch_time = link_epoch_time(link)
+    if soup is None:
+        return epoch_time
+    post_time = meta_time(soup)
+    if epoch_time is not None:
+        if post_time is not None and abs(post_time - epoch_time) > META_TOLERANCE:
+            logging.info(f"Meta time {post_time} differs from link time {epoch_time}, using link time: {link}")
+        return epoch_time
+    if post_time is not None:
+        return post_time
+    return full_text_time(soup)
+
+# ----------------------------
+# 修正既有資料：過去抓取失敗時以「現在」代替的發文時間，改回網址 epoch
+#   python article_time.py
+# ----------------------------
+REPAIR_BATCH = 5000
+
+def repair_article_times(batch_size=REPAIR_BATCH, backend=None):
+    backend = backend or get_backend()
+    conn = backend.connect()
+    fixed = 0
+    last_id = 0
+    try:
+        while True:
+            with backend.transaction(conn) as cur:
+                backend.execute(cur, """
+                SELECT id, timestamp, link FROM sentiments
+                WHERE id > %s ORDER BY id LIMIT %s
+                """, (last_id, batch_size))
+                rows = cur.fetchall()
+                if not rows:
+                    break
+                updates = []
+                for article_id, ts, link in rows:
+                    epoch_time = link_epoch_time(link)
+                    if epoch_time is None:
+                        continue
+                    if not isinstance(ts, datetime) or abs(ts - epoch_time) > META_TOLERANCE:
+                        updates.append((article_id, epoch_time))
+                backend.bulk_update(cur, "sentiments", "id", ["timestamp"], updates)
+            last_id = rows[-1][0]
+            fixed += len(updates)
+    finally:
+        conn.close()
+    logging.info(f"Repaired {fixed} article timestamps from link epochs.")
+    if fixed:
+        logging.info("Run `python term_index.py` to rebuild the per-day title term counts.")
+    return fixed
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    try:
+        repair_article_times()
+    except Exception as e:
+        logging.error(f"Article time repair error: {e}")
+        sys.exit(1)
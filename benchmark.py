@@ -0,0 +1,430 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import resource
+import statistics
+import subprocess
+from datetime import datetime
+from contextlib import contextmanager
+
+# ----------------------------
+# 離線端到端效能基準
+# 在同一行程內啟動 fake_ptt_server.py，以暫存 SQLite 資料庫依序量測：
+#   crawler_multi  crawl_board        pages/s, articles/s, pushes/s
+#   crawler_auto   crawl_latest_page  pages/s, articles/s, pushes/s
+#   post_sentiment 標籤寫回 + 看板統計量 rows/s；推論 texts/s (需 transformers 與模型)
+#   dashboard      dashboard_data 各 loader 延遲 (中位數 ms，快取函式每次先清除)
+#   冷啟動         post_sentiment (無待分析資料) 與 dashboard 首頁的啟動時間與 RSS (各在新行程中量測)
+# 每次結果附加一行 JSON 到 benchmark_results.jsonl，並與相同參數的上一筆比較，
+# 吞吐量下降或延遲上升超過門檻即列為退步。
+#   python benchmark.py
+#   python benchmark.py --pages 20 --pushes 50 --delay 0.01 --fail-rate 0.02
+#   python benchmark.py --compare-only            # 只比較最後兩筆相同參數的結果
+#   python benchmark.py --fail-on-regression      # 有退步時 exit 1 (CI 用)
+# ----------------------------
+
+RESULTS_FILE = os.environ.get("PTT_BENCH_RESULTS", "benchmark_results.jsonl")
+REGRESSION_THRESHOLD = 0.2
+LOADER_REPEAT = 5
+INFER_TEXTS = 256
+MULTI_BOARD = "BenchMulti"
+AUTO_BOARDS = ["BenchAutoA", "BenchAutoB", "BenchAutoC"]
+# 只有參數相同的結果可以互相比較
+COMPARE_PARAMS = ["pages", "pushes", "delay", "fail_rate", "infer_texts"]
+
+def setup_environment(db_path, base_url):
+    """
+    storage / 爬蟲在 import 時讀取環境變數，必須在 import 前設定
+    """
+    os.environ["PTT_DB_BACKEND"] = "sqlite"
+    os.environ["PTT_SQLITE_PATH"] = db_path
+    os.environ["PTT_BASE_URL"] = base_url
+    # loader 一律查詢資料庫，不讀 Parquet 快照
+    os.environ.pop("PTT_SNAPSHOT_DIR", None)
+
+@contextmanager
+def quiet():
+    """
+    量測期間只保留 WARNING 以上的 log，避免逐頁 / 逐篇 log 影響結果
+    """
+    root = logging.getLogger()
+    level = root.level
+    root.setLevel(logging.WARNING)
+    try:
+        yield
+    finally:
+        root.setLevel(level)
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def board_counts(backend, boards):
+    """
+    回傳 (文章數, 推文數)
+    """
+    in_boards, params = backend.in_list("s.board", boards, "boards")
+    df = backend.read_sql(f"""
+    SELECT COUNT(DISTINCT s.id) AS articles, COUNT(p.id) AS pushes
+    FROM sentiments s
+    LEFT JOIN push_comments p ON p.article_id = s.id
+    WHERE {in_boards}
+    """, params)
+    return int(df["articles"].iloc[0]), int(df["pushes"].iloc[0])
+
+def throughput(prefix, pages, articles, pushes, elapsed):
+    return {
+        f"{prefix}.pages_per_s": pages / elapsed,
+        f"{prefix}.articles_per_s": articles / elapsed,
+        f"{prefix}.pushes_per_s": pushes / elapsed,
+    }
+
+# ----------------------------
+# 爬蟲
+# ----------------------------
+def bench_crawler_multi(backend, pages):
+    import crawler_multi
+    from fake_ptt_server import LATEST_PAGE
+
+    crawler_multi.SLEEP_SEC = 0
+    crawler_multi.init_db()
+    start = time.perf_counter()
+    with quiet():
+        crawler_multi.crawl_board(MULTI_BOARD, LATEST_PAGE, LATEST_PAGE - pages + 1)
+    elapsed = time.perf_counter() - start
+    articles, pushes = board_counts(backend, [MULTI_BOARD])
+    return throughput("crawler_multi", pages, articles, pushes, elapsed)
+
+def bench_crawler_auto(backend):
+    import crawler_auto
+
+    crawler_auto.init_db()
+    pages = 0
+    start = time.perf_counter()
+    with quiet():
+        for board in AUTO_BOARDS:
+            latest_page = crawler_auto.get_latest_page(board)
+            if latest_page is None:
+                continue
+            crawler_auto.crawl_latest_page(board, latest_page)
+            pages += 1
+    elapsed = time.perf_counter() - start
+    articles, pushes = board_counts(backend, AUTO_BOARDS)
+    return throughput("crawler_auto", pages, articles, pushes, elapsed)
+
+# ----------------------------
+# post_sentiment：寫回與推論
+# ----------------------------
+def fake_label(rng):
+    star = rng.randint(1, 5)
+    sentiment = "NEGATIVE" if star <= 2 else "NEUTRAL" if star == 3 else "POSITIVE"
+    return (f"{star} stars", sentiment, rng.random())
+
+def bench_writeback(backend, seed=42):
+    """
+    以隨機標籤走 post_sentiment 的寫回路徑 (bulk_update + refresh_articles，每 UPDATE_CHUNK 筆一個交易)，
+    同時為 dashboard loader 準備已標記的資料
+    """
+    from stats_engine import refresh_articles
+    from post_sentiment import ensure_db_columns, SENTIMENT_COLUMNS, PUSH_COLUMNS, UPDATE_CHUNK
+
+    rng = random.Random(seed)
+    ensure_db_columns()
+    conn = backend.connect()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM sentiments ORDER BY id")
+        article_rows = [(r[0],) + fake_label(rng) + fake_label(rng) for r in cur.fetchall()]
+        cur.execute("SELECT id, article_id FROM push_comments ORDER BY id")
+        push_rows = cur.fetchall()
+        cur.close()
+
+        start = time.perf_counter()
+        for i in range(0, len(article_rows), UPDATE_CHUNK):
+            chunk = article_rows[i:i + UPDATE_CHUNK]
+            with backend.transaction(conn) as wcur:
+                backend.bulk_update(wcur, "sentiments", "id", SENTIMENT_COLUMNS, chunk)
+                refresh_articles(wcur, [r[0] for r in chunk], backend)
+        for i in range(0, len(push_rows), UPDATE_CHUNK):
+            chunk = push_rows[i:i + UPDATE_CHUNK]
+            with backend.transaction(conn) as wcur:
+                backend.bulk_update(wcur, "push_comments", "id", PUSH_COLUMNS,
+                                    [(push_id,) + fake_label(rng) for push_id, _ in chunk])
+                refresh_articles(wcur, {a for _, a in chunk if a is not None}, backend)
+        elapsed = time.perf_counter() - start
+    finally:
+        conn.close()
+    return {"post_sentiment.writeback_rows_per_s": (len(article_rows) + len(push_rows)) / elapsed}
+
+def bench_inference(backend, n_texts):
+    """
+    需要 transformers 與模型；無法載入時回傳 ({}, 原因)
+    """
+    import post_sentiment
+
+    try:
+        post_sentiment.get_sentiment_analyzer()
+    except (ImportError, SystemExit) as e:
+        return {}, f"sentiment model unavailable: {e!r}"
+    df = backend.read_sql("SELECT push_content FROM push_comments ORDER BY id LIMIT %(n)s", {"n": n_texts})
+    texts = [t or "" for t in df["push_content"]]
+    if not texts:
+        return {}, "no texts"
+    # 第一批含模型暖機，不計入
+    post_sentiment.batch_inference(texts[:16])
+    start = time.perf_counter()
+    post_sentiment.batch_inference(texts)
+    elapsed = time.perf_counter() - start
+    return {"post_sentiment.inference_texts_per_s": len(texts) / elapsed}, None
+
+# ----------------------------
+# dashboard loader
+# ----------------------------
+def time_call(fn, args, kwargs, repeat):
+    samples = []
+    for _ in range(repeat):
+        # st.cache_data 包裝的函式先清快取，量測實際查詢
+        if hasattr(fn, "clear"):
+            fn.clear()
+        start = time.perf_counter()
+        fn(*args, **kwargs)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def bench_dashboard(repeat):
+    import pandas as pd
+    import dashboard_data as dd
+
+    page = dd.fetch_article_page(None, page_size=10)
+    ids = [int(i) for i in page["id"]]
+    since = pd.Timestamp(page["timestamp"].min()).to_pydatetime()
+    # 與 dashboard.py 相同：since 與游標以 python datetime 傳入
+    cursor = (pd.Timestamp(page["timestamp"].iloc[-1]).to_pydatetime(), int(page["id"].iloc[-1]))
+    tmin, tmax = dd.fetch_time_bounds(None)
+    loaders = [
+        ("fetch_article_page", dd.fetch_article_page, (None,), {"page_size": 10}),
+        ("fetch_article_page_board_next", dd.fetch_article_page, (MULTI_BOARD,), {"cursor": cursor, "page_size": 10}),
+        ("fetch_article_count", dd.fetch_article_count, (None,), {}),
+        ("fetch_push_counts", dd.fetch_push_counts, (ids,), {"since": since}),
+        ("fetch_push_pages", dd.fetch_push_pages, ({i: 1 for i in ids},), {"since": since}),
+        ("fetch_top_terms", dd.fetch_top_terms, (None,), {}),
+        ("fetch_star_distribution", dd.fetch_star_distribution, (None,), {}),
+        ("fetch_time_bounds", dd.fetch_time_bounds, (None,), {}),
+        ("fetch_time_series", dd.fetch_time_series, (None, tmin, tmax, "hour"), {}),
+        ("fetch_push_rate", dd.fetch_push_rate, (None, tmin, tmax, "minute"), {}),
+        ("get_data_for_analysis", dd.get_data_for_analysis, (None,), {}),
+        ("fetch_board_stats", dd.fetch_board_stats, (), {}),
+    ]
+    return {f"dashboard.{name}_ms": time_call(fn, args, kwargs, repeat) for name, fn, args, kwargs in loaders}
+
+# ----------------------------
+# 冷啟動：在新行程中執行，回報耗時與最大 RSS
+# ----------------------------
+COLD_START_TARGETS = ["post_sentiment", "dashboard"]
+
+def current_rss_mb():
+    """
+    目前的 RSS；ru_maxrss 會跨 execve 保留父行程的峰值，Linux 上改讀 /proc/self/status
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # 非 Linux：ru_maxrss (macOS 單位為 bytes)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def cold_start_child(target):
+    """
+    子行程 (benchmark.py --cold-start-child <target>) 內執行，最後一行輸出 JSON
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    if target == "post_sentiment":
+        # 資料已全部標記，量測的是沒有待分析資料時的啟動成本
+        import runpy
+
+        start = time.perf_counter()
+        sys.argv = ["post_sentiment.py"]
+        runpy.run_path(os.path.join(here, "post_sentiment.py"), run_name="__main__")
+    else:
+        # streamlit server 已在執行，只計頁面腳本第一次執行的時間
+        from streamlit.testing.v1 import AppTest
+
+        start = time.perf_counter()
+        AppTest.from_file(os.path.join(here, "dashboard.py"), default_timeout=120).run()
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"ms": elapsed * 1000, "rss_mb": current_rss_mb()}))
+
+def bench_cold_start(workdir):
+    metrics = {}
+    for target in COLD_START_TARGETS:
+        # cwd 設為暫存目錄，子行程的 log 檔不寫進專案目錄
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--cold-start-child", target],
+                             cwd=workdir, capture_output=True, text=True, timeout=600)
+        if out.returncode != 0:
+            raise RuntimeError(f"Cold start of {target} failed: {out.stderr[-500:]}")
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        metrics[f"{target}.cold_start_ms"] = result["ms"]
+        metrics[f"{target}.idle_rss_mb"] = result["rss_mb"]
+    return metrics
+
+# ----------------------------
+# 執行與比較
+# ----------------------------
+def run_benchmark(args):
+    from fake_ptt_server import start_server
+
+    server, server_stats, base_url = start_server(fail_rate=args.fail_rate, delay=args.delay,
+                                                  push_count=args.pushes)
+    metrics = {}
+    skipped = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            setup_environment(os.path.join(tmp, "bench.db"), base_url)
+            from storage import get_backend
+
+            backend = get_backend("sqlite")
+            logging.info(f"Crawling {args.pages} pages from {base_url} ...")
+            metrics.update(bench_crawler_multi(backend, args.pages))
+            metrics.update(bench_crawler_auto(backend))
+            logging.info("Writing back labels ...")
+            metrics.update(bench_writeback(backend))
+            infer, reason = bench_inference(backend, args.infer_texts)
+            metrics.update(infer)
+            if reason:
+                skipped["post_sentiment.inference_texts_per_s"] = reason
+                logging.warning(f"Skipping inference benchmark: {reason}")
+            logging.info("Timing dashboard loaders ...")
+            metrics.update(bench_dashboard(args.repeat))
+            logging.info("Measuring cold start ...")
+            metrics.update(bench_cold_start(tmp))
+            backend.engine().dispose()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return {
+        "time": datetime.now().replace(microsecond=0).isoformat(),
+        "commit": git_commit(),
+        "label": args.label,
+        "python": platform.python_version(),
+        "params": {"pages": args.pages, "pushes": args.pushes, "delay": args.delay,
+                   "fail_rate": args.fail_rate, "infer_texts": args.infer_texts},
+        "server": server_stats.snapshot(),
+        "metrics": metrics,
+        "skipped": skipped,
+    }
+
+def load_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def append_result(path, record):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def find_baseline(results, record):
+    """
+    與 record 參數相同的上一筆結果
+    """
+    key = [record["params"].get(k) for k in COMPARE_PARAMS]
+    for prev in reversed(results):
+        if prev is not record and [prev["params"].get(k) for k in COMPARE_PARAMS] == key:
+            return prev
+    return None
+
+def lower_is_better(metric):
+    return metric.endswith("_ms") or metric.endswith("_mb")
+
+def compare(baseline, record, threshold):
+    """
+    印出比較表，回傳退步的指標名稱
+    """
+    print(f"\n== {record.get('commit')} vs baseline {baseline.get('commit')} ({baseline['time']}) ==")
+    print(f"{'metric':<48}{'baseline':>12}{'current':>12}{'change':>10}")
+    regressions = []
+    for metric, value in record["metrics"].items():
+        base = baseline["metrics"].get(metric)
+        if base is None or base == 0:
+            print(f"{metric:<48}{'-':>12}{value:>12.2f}")
+            continue
+        change = (value - base) / base
+        worse = change > threshold if lower_is_better(metric) else change < -threshold
+        flag = "  REGRESSION" if worse else ""
+        print(f"{metric:<48}{base:>12.2f}{value:>12.2f}{change:>+10.1%}{flag}")
+        if worse:
+            regressions.append(metric)
+    return regressions
+
+def print_record(record):
+    print(f"\n== benchmark ({record['commit']}, {record['params']}) ==")
+    for metric, value in record["metrics"].items():
+        print(f"{metric:<48}{value:>12.2f}")
+    for metric, reason in record["skipped"].items():
+        print(f"{metric:<48}{'skipped':>12}  {reason}")
+    print(f"server: {record['server']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark against a local fake PTT server")
+    parser.add_argument("--pages", type=int, default=10, help="index pages crawled by crawler_multi")
+    parser.add_argument("--pushes", type=int, default=5, help="push comments per article")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds added to every fake server response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--infer-texts", type=int, default=INFER_TEXTS, help="push texts used for inference timing")
+    parser.add_argument("--repeat", type=int, default=LOADER_REPEAT, help="runs per dashboard loader (median)")
+    parser.add_argument("--label", default=None, help="free-form note stored with the result")
+    parser.add_argument("--results", default=RESULTS_FILE)
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--compare-only", action="store_true", help="compare the last two comparable results")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--cold-start-child", choices=COLD_START_TARGETS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold_start_child:
+        cold_start_child(args.cold_start_child)
+        return
+
+    results = load_results(args.results)
+    if args.compare_only:
+        if not results:
+            print(f"No results in {args.results}.")
+            return
+        record = results[-1]
+    else:
+        record = run_benchmark(args)
+        append_result(args.results, record)
+        print_record(record)
+        logging.info(f"Result appended to {args.results}")
+
+    baseline = find_baseline(results if args.compare_only else results + [record], record)
+    if baseline is None:
+        print("\nNo earlier result with the same parameters to compare against.")
+        return
+    regressions = compare(baseline, record, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    # 先設定 log，爬蟲模組 import 時的 basicConfig 不會覆寫它們的 log 檔
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    try:
+        main()
+    except Exception as e:
+        logging.error(f"Benchmark error: {e}")
+        sys.exit(1)
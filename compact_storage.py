@@ -0,0 +1,463 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+from storage import get_backend
+
+# ----------------------------
+# 壓縮儲存 (縮小資料庫與讀寫 I/O)
+# 文章內文：zstd 壓縮，搭配以站上文章訓練的字典 (PTT 文章有大量固定格式：作者 / 標題 / 時間標頭、
+#   「※ 發信站」、「※ 文章網址」、簽名檔…)，短文也能有好的壓縮率。
+#   sentiments.content_z 存壓縮後的內文、content_dict 為字典 id (content_dicts)、
+#   content_len 為原文字數 (列表頁判斷「顯示全文」用)，content 留 NULL。
+# 推文欄位：改存小整數
+#   push_tag_code  1=推, 2=噓, 3=→ (其他值仍存 push_tag 文字)
+#   push_star      1~5；push_star_label ("N stars") 與 push_sentiment 都由星等決定，不另外儲存
+# 新舊格式可以並存 (舊分片 / 尚未轉換的列)，讀取端一律透過本模組解碼：
+#   SQL 端    push_star_sql / push_tag_sql / push_star_label_sql / push_sentiment_sql /
+#             push_labeled_sql / push_pending_sql
+#   Python 端 decode_content / decode_content_rows / decode_content_frame
+# content_dicts 有字典之後 (migrate) 爬蟲與 post_sentiment 才改寫壓縮格式，未遷移的資料庫行為不變。
+#   python compact_storage.py migrate [--vacuum]  # 訓練字典並轉換既有資料 (可重複執行，只轉換尚未轉換的列)
+#   python compact_storage.py retrain             # 以最近的文章重新訓練字典 (之後的新文章改用新字典)
+#   python compact_storage.py expand              # 還原成純文字欄位 (先停止爬蟲)
+#   python compact_storage.py stats
+# SQLite 已搬到月分片的推文不會被轉換 (分片唯讀)，讀取時照樣解碼。
+# ----------------------------
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZSTD_LEVEL = 9
+DICT_SIZE = 112 * 1024          # zstd 建議的字典大小 (~110KB)
+DICT_SAMPLES = 20000            # 訓練字典取最近幾篇文章
+MIN_DICT_SAMPLES = 100
+DICT_REFRESH_SEC = 600          # 長時間執行的爬蟲多久重新確認一次最新字典
+CONTENT_BATCH = 2000
+PUSH_BATCH = 50000
+
+CONTENT_COLUMNS = ["content", "content_z", "content_dict", "content_len"]
+PUSH_TAG_COLUMNS = ["push_tag", "push_tag_code"]
+PUSH_TAG_CODES = {"推": 1, "噓": 2, "→": 3}
+STAR_LABELS = {1: "1 star", 2: "2 stars", 3: "3 stars", 4: "4 stars", 5: "5 stars"}
+
+# ----------------------------
+# 建表 / 欄位 (由 schema.ensure_schema 呼叫)
+# ----------------------------
+def init_compact_storage(cur, backend=None):
+    backend = backend or get_backend()
+    cur.execute(backend.ddl("""
+    CREATE TABLE IF NOT EXISTS content_dicts (
+        id SERIAL PRIMARY KEY,
+        created_at TIMESTAMP NOT NULL,
+        samples INT NOT NULL,
+        dict BYTEA NOT NULL
+    );
+    """))
+    backend.add_column(cur, "sentiments", "content_z", backend.ddl("BYTEA"))
+    backend.add_column(cur, "sentiments", "content_dict", "INT")
+    backend.add_column(cur, "sentiments", "content_len", "INT")
+    backend.add_column(cur, "push_comments", "push_tag_code", "SMALLINT")
+    backend.add_column(cur, "push_comments", "push_star", "SMALLINT")
+
+# ----------------------------
+# 推文欄位：SQL 解碼運算式 (新舊格式皆可)
+# ----------------------------
+def _col(alias, column):
+    return f"{alias}.{column}" if alias else column
+
+def push_star_sql(backend, alias=None):
+    """
+    推文星等 1~5 (整數)，未標籤為 NULL
+    """
+    return f"COALESCE({_col(alias, 'push_star')}, {backend.star_int(_col(alias, 'push_star_label'))})"
+
+def push_labeled_sql(alias=None):
+    return f"({_col(alias, 'push_star')} IS NOT NULL OR {_col(alias, 'push_star_label')} IS NOT NULL)"
+
+def push_pending_sql(alias=None):
+    return f"({_col(alias, 'push_star')} IS NULL AND {_col(alias, 'push_star_label')} IS NULL)"
+
+def push_tag_sql(alias=None):
+    cases = " ".join(f"WHEN {code} THEN '{tag}'" for tag, code in PUSH_TAG_CODES.items())
+    return f"COALESCE({_col(alias, 'push_tag')}, CASE {_col(alias, 'push_tag_code')} {cases} END)"
+
+def push_star_label_sql(alias=None):
+    cases = " ".join(f"WHEN {star} THEN '{label}'" for star, label in STAR_LABELS.items())
+    return f"COALESCE({_col(alias, 'push_star_label')}, CASE {_col(alias, 'push_star')} {cases} END)"
+
+def push_sentiment_sql(alias=None):
+    # 與 post_sentiment.star_label_to_sentiment 相同的對應
+    star = _col(alias, "push_star")
+    return (f"COALESCE({_col(alias, 'push_sentiment')}, CASE WHEN {star} <= 2 THEN 'NEGATIVE' "
+            f"WHEN {star} = 3 THEN 'NEUTRAL' WHEN {star} IS NOT NULL THEN 'POSITIVE' END)")
+
+def encode_push_tag(tag, compact):
+    """
+    回傳 PUSH_TAG_COLUMNS 的值
+    """
+    code = PUSH_TAG_CODES.get(tag) if compact else None
+    return (None, code) if code is not None else (tag, None)
+
+# ----------------------------
+# 文章內文：zstd + 字典
+# ----------------------------
+class ContentCodec:
+    """
+    zstandard 的 compressor / decompressor 不能跨執行緒共用，每個執行緒各建一份
+    """
+    def __init__(self, dict_id, dict_data):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required for compressed article content (pip install zstandard)")
+        self.dict_id = dict_id
+        self.dict = zstandard.ZstdCompressionDict(bytes(dict_data))
+        self.local = threading.local()
+
+    def compress(self, text):
+        compressor = getattr(self.local, "compressor", None)
+        if compressor is None:
+            compressor = self.local.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=self.dict)
+        return compressor.compress(text.encode("utf-8"))
+
+    def decompress(self, blob):
+        decompressor = getattr(self.local, "decompressor", None)
+        if decompressor is None:
+            decompressor = self.local.decompressor = zstandard.ZstdDecompressor(dict_data=self.dict)
+        return decompressor.decompress(bytes(blob)).decode("utf-8")
+
+_codecs = {}                    # 字典 id -> ContentCodec
+_latest = {}                    # backend 名稱 -> (確認時間, 最新字典 id 或 None)
+_codec_lock = threading.Lock()
+
+def get_codec(dict_id, backend=None, cur=None):
+    dict_id = int(dict_id)
+    codec = _codecs.get(dict_id)
+    if codec is not None:
+        return codec
+    backend = backend or get_backend()
+    query = "SELECT dict FROM content_dicts WHERE id = %(id)s"
+    if cur is not None:
+        backend.execute(cur, query, {"id": dict_id})
+        row = cur.fetchone()
+        dict_data = row[0] if row else None
+    else:
+        df = backend.read_sql(query, {"id": dict_id})
+        dict_data = df["dict"].iloc[0] if not df.empty else None
+    if dict_data is None:
+        raise LookupError(f"Content dictionary {dict_id} not found")
+    with _codec_lock:
+        return _codecs.setdefault(dict_id, ContentCodec(dict_id, dict_data))
+
+def latest_dict_id(cur, backend=None):
+    """
+    最新字典 id；沒有字典 (尚未遷移) 時為 None。結果快取 DICT_REFRESH_SEC 秒
+    """
+    backend = backend or get_backend()
+    checked = _latest.get(backend.name)
+    now = time.time()
+    if checked is not None and now - checked[0] < DICT_REFRESH_SEC:
+        return checked[1]
+    backend.execute(cur, "SELECT MAX(id) FROM content_dicts")
+    dict_id = cur.fetchone()[0]
+    _latest[backend.name] = (now, dict_id)
+    return dict_id
+
+def compact_enabled(cur, backend=None):
+    return latest_dict_id(cur, backend) is not None
+
+def content_codec(cur, backend=None):
+    """
+    寫入新文章用的 codec；尚未遷移時為 None (維持純文字)
+    """
+    dict_id = latest_dict_id(cur, backend)
+    return get_codec(dict_id, backend, cur) if dict_id is not None else None
+
+def encode_content(content, codec):
+    """
+    回傳 CONTENT_COLUMNS 的值
+    """
+    if codec is None or content is None:
+        return (content, None, None, None)
+    return (None, codec.compress(content), codec.dict_id, len(content))
+
+def decode_content(content, content_z, content_dict, backend=None):
+    if content_z is None:
+        return content
+    return get_codec(content_dict, backend).decompress(content_z)
+
+def decode_content_rows(columns, rows, backend=None):
+    """
+    DB-API 列：content_z / content_dict 解碼回 content 欄，回傳去掉這兩欄後的 (columns, rows)
+    """
+    if "content_z" not in columns:
+        return columns, rows
+    i_content, i_z, i_dict = (columns.index(c) for c in ("content", "content_z", "content_dict"))
+    keep = [i for i, c in enumerate(columns) if c not in ("content_z", "content_dict")]
+    out = []
+    for row in rows:
+        row = list(row)
+        row[i_content] = decode_content(row[i_content], row[i_z], row[i_dict], backend)
+        out.append(tuple(row[i] for i in keep))
+    return [columns[i] for i in keep], out
+
+def decode_content_frame(df, content_chars=None, backend=None):
+    """
+    DataFrame：解碼 content_z 到 content 欄 (content_chars 有值時截斷)，並移除 content_z / content_dict
+    """
+    if "content_z" not in df.columns:
+        return df
+    mask = df["content_z"].notna()
+    if mask.any():
+        df["content"] = df["content"].astype(object)
+        df.loc[mask, "content"] = [
+            decode_content(None, z, d, backend)[:content_chars]
+            for z, d in zip(df.loc[mask, "content_z"], df.loc[mask, "content_dict"])
+        ]
+    return df.drop(columns=["content_z", "content_dict"])
+
+# ----------------------------
+# 訓練字典
+# ----------------------------
+def train_dictionary(backend=None, samples=DICT_SAMPLES, dict_size=DICT_SIZE):
+    """
+    以最近 samples 篇文章 (已壓縮的先解碼) 訓練字典並寫入 content_dicts，回傳新字典 id
+    """
+    if zstandard is None:
+        raise RuntimeError("zstandard is required for compressed article content (pip install zstandard)")
+    backend = backend or get_backend()
+    conn = backend.connect()
+    try:
+        cur = conn.cursor()
+        backend.execute(cur, """
+        SELECT content, content_z, content_dict FROM sentiments
+        WHERE content IS NOT NULL OR content_z IS NOT NULL
+        ORDER BY id DESC LIMIT %(n)s
+        """, {"n": samples})
+        texts = [decode_content(*row, backend=backend) for row in cur.fetchall()]
+        cur.close()
+        texts = [t.encode("utf-8") for t in texts if t]
+        if len(texts) < MIN_DICT_SAMPLES:
+            raise ValueError(f"Need at least {MIN_DICT_SAMPLES} articles to train a dictionary, found {len(texts)}")
+        # 樣本太少時縮小字典，避免訓練失敗
+        dict_size = min(dict_size, max(4096, sum(map(len, texts)) // 20))
+        trained = zstandard.train_dictionary(dict_size, texts, level=ZSTD_LEVEL)
+        with backend.transaction(conn) as cur:
+            dict_id = backend.insert_returning_id(
+                cur, "content_dicts", ["created_at", "samples", "dict"],
+                (datetime.now().replace(microsecond=0), len(texts), trained.as_bytes())
+            )
+    finally:
+        conn.close()
+    _latest.pop(backend.name, None)
+    logging.info(f"Trained content dictionary {dict_id} ({len(trained.as_bytes())} bytes) from {len(texts)} articles.")
+    return dict_id
+
+# ----------------------------
+# 遷移 / 還原 (分批，每批一個短交易，爬蟲可在批次之間寫入)
+# ----------------------------
+def id_batches(conn, table, batch_size, backend):
+    cur = conn.cursor()
+    backend.execute(cur, f"SELECT MIN(id), MAX(id) FROM {table}")
+    lo, hi = cur.fetchone()
+    cur.close()
+    if lo is None:
+        return
+    for start in range(lo, hi + 1, batch_size):
+        yield start, start + batch_size - 1
+
+def compress_contents(conn, codec, backend, batch_size=CONTENT_BATCH):
+    n = 0
+    last_id = 0
+    cur = conn.cursor()
+    while True:
+        backend.execute(cur, """
+        SELECT id, content FROM sentiments
+        WHERE id > %(last_id)s AND content IS NOT NULL AND content_z IS NULL
+        ORDER BY id LIMIT %(n)s
+        """, {"last_id": last_id, "n": batch_size})
+        rows = cur.fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        with backend.transaction(conn) as wcur:
+            backend.bulk_update(wcur, "sentiments", "id", CONTENT_COLUMNS,
+                                [(article_id,) + encode_content(content, codec) for article_id, content in rows])
+        n += len(rows)
+        logging.info(f"Compressed {n} articles...")
+    cur.close()
+    return n
+
+def encode_pushes(conn, backend, batch_size=PUSH_BATCH):
+    tag_cases = " ".join(f"WHEN '{tag}' THEN {code}" for tag, code in PUSH_TAG_CODES.items())
+    tag_in = ", ".join(f"'{tag}'" for tag in PUSH_TAG_CODES)
+    for lo, hi in id_batches(conn, "push_comments", batch_size, backend):
+        params = {"lo": lo, "hi": hi}
+        with backend.transaction(conn) as cur:
+            backend.execute(cur, f"""
+            UPDATE push_comments SET push_tag_code = CASE push_tag {tag_cases} END, push_tag = NULL
+            WHERE id BETWEEN %(lo)s AND %(hi)s AND push_tag IN ({tag_in})
+            """, params)
+            backend.execute(cur, f"""
+            UPDATE push_comments
+            SET push_star = {backend.star_int("push_star_label")}, push_star_label = NULL, push_sentiment = NULL
+            WHERE id BETWEEN %(lo)s AND %(hi)s AND push_star_label IS NOT NULL
+            """, params)
+        logging.info(f"Encoded push fields up to id {hi}...")
+
+def migrate(backend=None, vacuum=False):
+    backend = backend or get_backend()
+    conn = backend.connect()
+    try:
+        with backend.transaction(conn) as cur:
+            init_compact_storage(cur, backend)
+            dict_id = latest_dict_id(cur, backend)
+        if dict_id is None:
+            dict_id = train_dictionary(backend)
+        codec = get_codec(dict_id, backend)
+        n_articles = compress_contents(conn, codec, backend)
+        encode_pushes(conn, backend)
+        logging.info(f"Migrated {n_articles} articles to compressed content (dictionary {dict_id}).")
+    finally:
+        conn.close()
+    if vacuum:
+        vacuum_tables(backend)
+    logging.info("Restart running crawlers or wait up to "
+                 f"{DICT_REFRESH_SEC // 60} minutes for them to switch to the compact format.")
+
+def expand(backend=None, vacuum=False):
+    """
+    還原成純文字欄位並刪除字典 (寫入端隨之回到純文字格式)
+    """
+    backend = backend or get_backend()
+    conn = backend.connect()
+    try:
+        cur = conn.cursor()
+        last_id = 0
+        n = 0
+        while True:
+            backend.execute(cur, """
+            SELECT id, content_z, content_dict FROM sentiments
+            WHERE id > %(last_id)s AND content_z IS NOT NULL
+            ORDER BY id LIMIT %(n)s
+            """, {"last_id": last_id, "n": CONTENT_BATCH})
+            rows = cur.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            # 全為 NULL 的 VALUES 欄位在 PG 會被當成 text，壓縮欄位另以 UPDATE 清空
+            in_ids, params = backend.in_list("id", [r[0] for r in rows], "ids")
+            with backend.transaction(conn) as wcur:
+                backend.bulk_update(wcur, "sentiments", "id", ["content"],
+                                    [(article_id, decode_content(None, z, d, backend))
+                                     for article_id, z, d in rows])
+                backend.execute(wcur, f"""
+                UPDATE sentiments SET content_z = NULL, content_dict = NULL, content_len = NULL
+                WHERE {in_ids}
+                """, params)
+            n += len(rows)
+            logging.info(f"Decompressed {n} articles...")
+        cur.close()
+
+        for lo, hi in id_batches(conn, "push_comments", PUSH_BATCH, backend):
+            params = {"lo": lo, "hi": hi}
+            with backend.transaction(conn) as wcur:
+                backend.execute(wcur, f"""
+                UPDATE push_comments SET push_tag = {push_tag_sql()}, push_tag_code = NULL
+                WHERE id BETWEEN %(lo)s AND %(hi)s AND push_tag_code IS NOT NULL
+                """, params)
+                backend.execute(wcur, f"""
+                UPDATE push_comments
+                SET push_star_label = {push_star_label_sql()}, push_sentiment = {push_sentiment_sql()},
+                    push_star = NULL
+                WHERE id BETWEEN %(lo)s AND %(hi)s AND push_star IS NOT NULL
+                """, params)
+
+        with backend.transaction(conn) as wcur:
+            backend.execute(wcur, "SELECT COUNT(*) FROM sentiments WHERE content_z IS NOT NULL")
+            if wcur.fetchone()[0] == 0:
+                backend.execute(wcur, "DELETE FROM content_dicts")
+            else:
+                logging.warning("New compressed articles were written during expand; stop the crawlers and rerun.")
+        _latest.pop(backend.name, None)
+        logging.info(f"Expanded {n} articles back to plain text.")
+    finally:
+        conn.close()
+    if vacuum:
+        vacuum_tables(backend)
+
+def vacuum_tables(backend):
+    """
+    歸還轉換後空出的空間：SQLite 重寫整個檔案，PG 重寫 sentiments / push_comments (需要獨占鎖)
+    """
+    conn = backend.connect()
+    try:
+        if backend.name == "postgres":
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute("VACUUM (FULL, ANALYZE) sentiments")
+            cur.execute("VACUUM (FULL, ANALYZE) push_comments")
+            cur.close()
+        else:
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+    logging.info("Vacuum done.")
+
+# ----------------------------
+# 統計
+# ----------------------------
+def print_stats(backend=None):
+    backend = backend or get_backend()
+    articles = backend.read_sql("""
+    SELECT COUNT(content) AS plain, COUNT(content_z) AS compressed,
+           SUM(LENGTH(content_z)) AS compressed_bytes, SUM(content_len) AS compressed_chars
+    FROM sentiments
+    """)
+    pushes = backend.read_sql("""
+    SELECT COUNT(push_tag_code) AS tag_codes, COUNT(push_tag) AS tag_text,
+           COUNT(push_star) AS star_codes, COUNT(push_star_label) AS star_text
+    FROM push_comments
+    """)
+    dicts = backend.read_sql("SELECT id, created_at, samples, LENGTH(dict) AS dict_bytes FROM content_dicts ORDER BY id")
+    print(articles.to_string(index=False))
+    print(pushes.to_string(index=False))
+    print(dicts.to_string(index=False))
+    if backend.name == "postgres":
+        size = backend.read_sql("""
+        SELECT pg_total_relation_size('sentiments') AS sentiments_bytes,
+               (SELECT SUM(pg_total_relation_size(inhrelid)) FROM pg_inherits
+                WHERE inhparent = 'push_comments'::regclass) AS push_comments_bytes
+        """)
+        print(size.to_string(index=False))
+    else:
+        print(f"Database file: {os.path.getsize(backend.path)} bytes")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Compressed article content and integer-coded push fields")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_migrate = sub.add_parser("migrate", help="train a dictionary (if none) and convert existing rows")
+    p_migrate.add_argument("--vacuum", action="store_true", help="reclaim the freed space afterwards")
+    sub.add_parser("retrain", help="train a new dictionary from recent articles")
+    p_expand = sub.add_parser("expand", help="convert back to plain text columns")
+    p_expand.add_argument("--vacuum", action="store_true", help="reclaim the freed space afterwards")
+    sub.add_parser("stats", help="print storage format counts and sizes")
+    args = parser.parse_args()
+    try:
+        if args.command == "migrate":
+            migrate(vacuum=args.vacuum)
+        elif args.command == "retrain":
+            train_dictionary()
+        elif args.command == "expand":
+            expand(vacuum=args.vacuum)
+        else:
+            print_stats()
+    except Exception as e:
+        logging.error(f"Compact storage error: {e}")
+        sys.exit(1)
@@ -0,0 +1,434 @@
+import os
+import sys
+import time
+import random
+import socket
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+import requests
+from bs4 import BeautifulSoup
+
+from storage import get_backend
+from retry_queue import init_retry_queue, record_failure
+
+# ----------------------------
+# 分散式爬取：任務放在資料庫，多台主機上的 worker 各自租用 (lease) 任務
+#   crawl_tasks        每列一個「看板 + 頁碼區間」任務；租約到期未續約即可被其他 worker 接手，
+#                      從 next_page 繼續 (文章 link UNIQUE，重抓同一頁也不會重複寫入)
+#   crawl_workers      各 worker 的心跳與累計吞吐量
+#   crawl_rate_budget  全體 worker 共用的 token bucket，以資料庫時鐘計算補充量
+# PG 以 FOR UPDATE SKIP LOCKED 搶任務；SQLite 的寫入交易本身即序列化 (僅適合單機多行程測試)
+#   python crawl_tasks.py add --board NBA --start 6503 --end 6400 --chunk 20
+#   python crawl_tasks.py budget --rps 2 --burst 5
+#   python crawl_tasks.py worker                  # 每台主機可啟動多個
+#   python crawl_tasks.py status
+# 本機測試：python fake_ptt_server.py 後以 PTT_BASE_URL=http://127.0.0.1:8808 啟動 worker
+# ----------------------------
+
+PTT_BASE_URL = os.environ.get("PTT_BASE_URL", "https://www.ptt.cc")
+LEASE_SEC = 120             # 租約長度
+HEARTBEAT_SEC = 30          # 續約 / 回報吞吐量的間隔 (需小於 LEASE_SEC)
+IDLE_POLL_SEC = 10          # 沒有任務時的輪詢間隔
+MAX_TASK_ATTEMPTS = 5       # 同一任務失敗 (或租約過期) 超過此次數即標記 failed
+DEFAULT_RPS = 2.0           # 全體 worker 每秒請求數
+DEFAULT_BURST = 5.0
+BUDGET_NAME = "ptt"
+
+def init_crawl_tables(cur, backend=None):
+    backend = backend or get_backend()
+    cur.execute(backend.ddl("""
+    CREATE TABLE IF NOT EXISTS crawl_tasks (
+        id SERIAL PRIMARY KEY,
+        board TEXT NOT NULL,
+        start_page INT NOT NULL,
+        end_page INT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        lease_owner TEXT,
+        lease_expires_at TIMESTAMP,
+        attempts INT NOT NULL DEFAULT 0,
+        next_page INT,
+        pages_done INT NOT NULL DEFAULT 0,
+        articles_done INT NOT NULL DEFAULT 0,
+        last_error TEXT,
+        created_at TIMESTAMP,
+        finished_at TIMESTAMP,
+        UNIQUE (board, start_page, end_page)
+    );
+    """))
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_crawl_tasks_status ON crawl_tasks (status, id)")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS crawl_workers (
+        worker_id TEXT PRIMARY KEY,
+        host TEXT,
+        pid INT,
+        status TEXT,
+        current_task INT,
+        started_at TIMESTAMP,
+        heartbeat_at TIMESTAMP,
+        requests INT NOT NULL DEFAULT 0,
+        pages INT NOT NULL DEFAULT 0,
+        articles INT NOT NULL DEFAULT 0,
+        failures INT NOT NULL DEFAULT 0
+    );
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS crawl_rate_budget (
+        name TEXT PRIMARY KEY,
+        rate DOUBLE PRECISION NOT NULL,
+        burst DOUBLE PRECISION NOT NULL,
+        tokens DOUBLE PRECISION NOT NULL,
+        updated_epoch DOUBLE PRECISION NOT NULL
+    );
+    """)
+    backend.execute(cur, f"""
+    INSERT INTO crawl_rate_budget (name, rate, burst, tokens, updated_epoch)
+    VALUES (%s, %s, %s, %s, {backend.epoch_now()})
+    ON CONFLICT (name) DO NOTHING
+    """, (BUDGET_NAME, DEFAULT_RPS, DEFAULT_BURST, DEFAULT_BURST))
+    init_retry_queue(cur)
+
+# ----------------------------
+# 任務
+# ----------------------------
+def add_tasks(board, start_page, end_page, chunk=20, backend=None):
+    """
+    將頁碼區間切成每 chunk 頁一個任務 (已存在的區間略過)，回傳新增數
+    """
+    backend = backend or get_backend()
+    step = -1 if start_page > end_page else 1
+    ranges = []
+    page = start_page
+    while (step < 0 and page >= end_page) or (step > 0 and page <= end_page):
+        last = page + step * (chunk - 1)
+        last = max(last, end_page) if step < 0 else min(last, end_page)
+        ranges.append((board, page, last))
+        page = last + step
+    conn = backend.connect()
+    try:
+        with backend.transaction(conn) as cur:
+            init_crawl_tables(cur, backend)
+            added = 0
+            for board_name, first, last in ranges:
+                backend.execute(cur, f"""
+                INSERT INTO crawl_tasks (board, start_page, end_page, next_page, created_at)
+                VALUES (%s, %s, %s, %s, {backend.now()})
+                ON CONFLICT (board, start_page, end_page) DO NOTHING
+                """, (board_name, first, last, first))
+                added += max(cur.rowcount, 0)
+    finally:
+        conn.close()
+    logging.info(f"[{board}] Added {added} tasks for pages {start_page}..{end_page} ({chunk} pages each).")
+    return added
+
+def lease_task(worker_id, backend):
+    """
+    租用一個待處理或租約已過期的任務；回傳 (id, board, start_page, end_page, next_page) 或 None
+    """
+    conn = backend.connect()
+    try:
+        with backend.transaction(conn) as cur:
+            # 租約過期且次數已用盡的任務不會再被租用，先標記 failed，避免一直停在 leased
+            backend.execute(cur, f"""
+            UPDATE crawl_tasks
+            SET status = 'failed', lease_owner = NULL, lease_expires_at = NULL,
+                last_error = COALESCE(last_error, 'lease expired')
+            WHERE status = 'leased' AND lease_expires_at < {backend.now()}
+              AND attempts >= %(max_attempts)s
+            """, {"max_attempts": MAX_TASK_ATTEMPTS})
+            backend.execute(cur, f"""
+            UPDATE crawl_tasks
+            SET status = 'leased', lease_owner = %(owner)s,
+                lease_expires_at = {backend.seconds_from_now("lease")},
+                attempts = attempts + 1
+            WHERE id = (
+                SELECT id FROM crawl_tasks
+                WHERE (status = 'pending' OR (status = 'leased' AND lease_expires_at < {backend.now()}))
+                  AND attempts < %(max_attempts)s
+                ORDER BY id
+                LIMIT 1
+                {backend.skip_locked()}
+            )
+            RETURNING id, board, start_page, end_page, next_page
+            """, {"owner": worker_id, "lease": LEASE_SEC, "max_attempts": MAX_TASK_ATTEMPTS})
+            rows = cur.fetchall()
+        return rows[0] if rows else None
+    finally:
+        conn.close()
+
+def update_task(task_id, worker_id, backend, assignments, params=None):
+    """
+    只在租約仍屬於自己時更新並續約；回傳 False 表示租約已被他人接手
+    """
+    conn = backend.connect()
+    try:
+        with backend.transaction(conn) as cur:
+            backend.execute(cur, f"""
+            UPDATE crawl_tasks
+            SET {assignments}
+            WHERE id = %(task_id)s AND lease_owner = %(owner)s AND status = 'leased'
+            """, {**(params or {}), "task_id": task_id, "owner": worker_id, "lease": LEASE_SEC})
+            return cur.rowcount > 0
+    finally:
+        conn.close()
+
+def release_task(task_id, worker_id, backend, error):
+    """
+    任務失敗：放回 pending (從 next_page 繼續)；失敗次數用盡則標記 failed
+    """
+    return update_task(task_id, worker_id, backend, """
+    status = CASE WHEN attempts >= %(max_attempts)s THEN 'failed' ELSE 'pending' END,
+    lease_owner = NULL, lease_expires_at = NULL, last_error = %(error)s
+    """, {"max_attempts": MAX_TASK_ATTEMPTS, "error": str(error)[:500]})
+
+# ----------------------------
+# 全域速率預算 (token bucket)
+# ----------------------------
+def acquire_token(backend, name=BUDGET_NAME):
+    """
+    取得一個請求額度，不足時等待；補充量以資料庫時鐘計算，各主機時鐘不同步也不影響
+    """
+    refill = f"{backend.least('burst', f'tokens + rate * ({backend.epoch_now()} - updated_epoch)')}"
+    while True:
+        conn = backend.connect()
+        try:
+            with backend.transaction(conn) as cur:
+                backend.execute(cur, f"""
+                UPDATE crawl_rate_budget
+                SET tokens = {refill} - 1, updated_epoch = {backend.epoch_now()}
+                WHERE name = %(name)s AND {refill} >= 1
+                RETURNING tokens
+                """, {"name": name})
+                if cur.fetchall():
+                    return
+                backend.execute(cur, "SELECT rate FROM crawl_rate_budget WHERE name = %s", (name,))
+                row = cur.fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            raise RuntimeError(f"Rate budget {name!r} not found; run `python crawl_tasks.py budget`")
+        # 等待約一個 token 的補充時間，加上抖動避免所有 worker 同時重試
+        time.sleep(random.uniform(0.5, 1.5) / max(row[0], 0.01))
+
+def set_budget(rps, burst, backend, name=BUDGET_NAME):
+    conn = backend.connect()
+    try:
+        with backend.transaction(conn) as cur:
+            init_crawl_tables(cur, backend)
+            backend.execute(cur, f"""
+            UPDATE crawl_rate_budget
+            SET rate = %s, burst = %s, tokens = %s, updated_epoch = {backend.epoch_now()}
+            WHERE name = %s
+            """, (rps, burst, min(burst, rps), name))
+    finally:
+        conn.close()
+    logging.info(f"Rate budget {name}: {rps} req/s, burst {burst}.")
+
+# ----------------------------
+# Worker
+# ----------------------------
+class CrawlWorker:
+    def __init__(self, worker_id=None, backend=None):
+        self.backend = backend or get_backend()
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.stats = {"requests": 0, "pages": 0, "articles": 0, "failures": 0}
+        self.current_task = None
+        self.lease_lost = threading.Event()
+        self.stop_event = threading.Event()
+
+    # ---------- 心跳 ----------
+    def report(self, status):
+        conn = self.backend.connect()
+        try:
+            with self.backend.transaction(conn) as cur:
+                self.backend.upsert(
+                    cur, "crawl_workers",
+                    ["worker_id", "host", "pid", "status", "current_task", "started_at", "heartbeat_at",
+                     "requests", "pages", "articles", "failures"],
+                    ["worker_id"],
+                    [(self.worker_id, socket.gethostname(), os.getpid(), status, self.current_task,
+                      self.started_at, self.started_at, self.stats["requests"], self.stats["pages"],
+                      self.stats["articles"], self.stats["failures"])],
+                    update="status = EXCLUDED.status, current_task = EXCLUDED.current_task, "
+                           "requests = EXCLUDED.requests, pages = EXCLUDED.pages, "
+                           "articles = EXCLUDED.articles, failures = EXCLUDED.failures"
+                )
+                self.backend.execute(cur, f"UPDATE crawl_workers SET heartbeat_at = {self.backend.now()} "
+                                          "WHERE worker_id = %s", (self.worker_id,))
+        finally:
+            conn.close()
+
+    def heartbeat_loop(self):
+        while not self.stop_event.wait(HEARTBEAT_SEC):
+            try:
+                task_id = self.current_task
+                if task_id is not None and not update_task(
+                        task_id, self.worker_id, self.backend,
+                        f"lease_expires_at = {self.backend.seconds_from_now('lease')}"):
+                    logging.warning(f"Lease on task {task_id} lost, abandoning it.")
+                    self.lease_lost.set()
+                self.report("running")
+            except Exception as e:
+                logging.error(f"Heartbeat failed: {e}")
+
+    # ---------- 爬取 ----------
+    def get(self, url):
+        acquire_token(self.backend)
+        self.stats["requests"] += 1
+        resp = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, cookies={"over18": "1"}, timeout=10)
+        resp.raise_for_status()
+        return resp
+
+    def crawl_page(self, board, page):
+        from crawler_auto import fetch_content_and_push, save_article_and_push
+
+        soup = BeautifulSoup(self.get(f"{PTT_BASE_URL}/bbs/{board}/index{page}.html").text, "html.parser")
+        saved = 0
+        for art in soup.select(".r-ent"):
+            if self.lease_lost.is_set() or self.stop_event.is_set():
+                break
+            title_tag = art.select_one(".title a")
+            if not title_tag:
+                continue
+            title = title_tag.text.strip()
+            link = PTT_BASE_URL + title_tag["href"]
+            acquire_token(self.backend)
+            self.stats["requests"] += 1
+            try:
+                post_time, content_text, push_list = fetch_content_and_push(link)
+            except Exception as e:
+                self.stats["failures"] += 1
+                # 已在佇列中的連結交給重試 worker 依退避時間處理
+                record_failure(link, board, title, e, self.backend, keep_schedule=True)
+                continue
+            status = save_article_and_push(post_time, board, title, content_text, link, push_list)
+            # 重試佇列中的同一連結已由 save_article_and_push 在文章交易內移除
+            if status == "saved":
+                saved += 1
+            elif status == "failed":
+                self.stats["failures"] += 1
+        return saved
+
+    def run_task(self, task):
+        task_id, board, start_page, end_page, next_page = task
+        step = -1 if start_page > end_page else 1
+        page = next_page if next_page is not None else start_page
+        logging.info(f"[{self.worker_id}] Task {task_id}: {board} index{page}..{end_page}")
+        while (step < 0 and page >= end_page) or (step > 0 and page <= end_page):
+            if self.lease_lost.is_set() or self.stop_event.is_set():
+                return
+            try:
+                saved = self.crawl_page(board, page)
+            except Exception as e:
+                logging.error(f"[{board}] index{page} failed: {e}")
+                release_task(task_id, self.worker_id, self.backend, e)
+                return
+            self.stats["pages"] += 1
+            self.stats["articles"] += saved
+            # 進度與續約一起寫回，接手的 worker 從下一頁開始
+            if not update_task(task_id, self.worker_id, self.backend, f"""
+                next_page = %(next_page)s, pages_done = pages_done + 1,
+                articles_done = articles_done + %(saved)s,
+                lease_expires_at = {self.backend.seconds_from_now('lease')}
+                """, {"next_page": page + step, "saved": saved}):
+                logging.warning(f"Lease on task {task_id} lost after index{page}.")
+                return
+            page += step
+        update_task(task_id, self.worker_id, self.backend, f"""
+        status = 'done', lease_expires_at = NULL, finished_at = {self.backend.now()}
+        """)
+        logging.info(f"[{self.worker_id}] Task {task_id} done.")
+
+    def run(self, exit_when_idle=False):
+        from crawler_auto import init_db
+
+        self.started_at = datetime.now().replace(microsecond=0)
+        init_db()
+        conn = self.backend.connect()
+        with self.backend.transaction(conn) as cur:
+            init_crawl_tables(cur, self.backend)
+        conn.close()
+        self.report("running")
+        heartbeat = threading.Thread(target=self.heartbeat_loop, name="heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            while not self.stop_event.is_set():
+                task = lease_task(self.worker_id, self.backend)
+                if task is None:
+                    if exit_when_idle:
+                        break
+                    self.stop_event.wait(IDLE_POLL_SEC)
+                    continue
+                self.current_task = task[0]
+                self.lease_lost.clear()
+                self.run_task(task)
+                self.current_task = None
+        except KeyboardInterrupt:
+            if self.current_task is not None:
+                release_task(self.current_task, self.worker_id, self.backend, "worker interrupted")
+            self.current_task = None
+        finally:
+            self.stop_event.set()
+            heartbeat.join()
+            self.report("stopped")
+        logging.info(f"[{self.worker_id}] Stopped: {self.stats}")
+        return self.stats
+
+# ----------------------------
+# 狀態
+# ----------------------------
+def print_status(backend):
+    tasks = backend.read_sql("""
+    SELECT board, status, COUNT(*) AS tasks, SUM(pages_done) AS pages, SUM(articles_done) AS articles
+    FROM crawl_tasks
+    GROUP BY board, status
+    ORDER BY board, status
+    """)
+    print(tasks.to_string(index=False) if not tasks.empty else "No crawl tasks.")
+    workers = backend.read_sql("""
+    SELECT worker_id, status, current_task, started_at, heartbeat_at, requests, pages, articles, failures
+    FROM crawl_workers
+    ORDER BY worker_id
+    """)
+    if not workers.empty:
+        elapsed = (workers["heartbeat_at"] - workers["started_at"]).dt.total_seconds().clip(lower=1)
+        workers["articles_per_min"] = (workers["articles"] * 60 / elapsed).round(1)
+        print()
+        print(workers.to_string(index=False))
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed crawl coordination")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_add = sub.add_parser("add", help="add page-range tasks for a board")
+    p_add.add_argument("--board", required=True)
+    p_add.add_argument("--start", type=int, required=True)
+    p_add.add_argument("--end", type=int, required=True)
+    p_add.add_argument("--chunk", type=int, default=20, help="pages per task")
+    p_worker = sub.add_parser("worker", help="lease and crawl tasks until stopped")
+    p_worker.add_argument("--id", help="worker id (default: host-pid)")
+    p_worker.add_argument("--exit-when-idle", action="store_true")
+    p_budget = sub.add_parser("budget", help="set the global request rate shared by all workers")
+    p_budget.add_argument("--rps", type=float, required=True)
+    p_budget.add_argument("--burst", type=float, default=DEFAULT_BURST)
+    sub.add_parser("status", help="task progress and worker throughput")
+    args = parser.parse_args()
+
+    backend = get_backend()
+    if args.command == "add":
+        add_tasks(args.board, args.start, args.end, args.chunk, backend)
+    elif args.command == "worker":
+        CrawlWorker(args.id, backend).run(exit_when_idle=args.exit_when_idle)
+    elif args.command == "budget":
+        set_budget(args.rps, args.burst, backend)
+    else:
+        print_status(backend)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    try:
+        main()
+    except Exception as e:
+        logging.error(f"Crawl task error: {e}")
+        sys.exit(1)
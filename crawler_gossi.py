@@ -3,11 +3,26 @@ from bs4 import BeautifulSoup
 import re
 import time
 import logging
+import argparse
 from datetime import datetime
-import psycopg2
 import os
 import sys
 
+from storage import get_backend
+from term_index import add_title
+from search_index import index_article
+from user_index import add_pushes
+from compact_storage import (content_codec, encode_content, encode_push_tag,
+                             CONTENT_COLUMNS, PUSH_TAG_COLUMNS)
+from push_time import parse_push_time
+from article_time import fetch_article_time
+from retry_queue import record_failure, discard_retry, start_retry_worker
+from schema import ensure_schema
+from log_setup import setup_logging, ProgressReporter
+from profiling import add_profile_argument, profiled
+from metrics import (HTTP_SECONDS, PARSE_SECONDS, DB_WRITE_SECONDS, FETCH_ERRORS, ARTICLES, PUSHES_SAVED,
+                     log_summary)
+
 # ----------------------------
 # 參數設定
 # ----------------------------
@@ -16,104 +31,25 @@ START_PAGE = 38949
 END_PAGE = 38700
 SLEEP_SEC = 1         # 每頁之間等待秒數，可自行調整
 LOG_FILE = "gossi_crawler.log"
+# 本機測試 / benchmark.py 可改指向 fake_ptt_server.py
+PTT_BASE_URL = os.environ.get("PTT_BASE_URL", "https://www.ptt.cc")
 
-# PostgreSQL 連線參數
-PG_HOST = "localhost"
-PG_PORT = 5432
-PG_DBNAME = "ptt_db"
-PG_USER = "ptt_user"
-PG_PASSWORD = "ptt_password"
+# 儲存層 (PTT_DB_BACKEND=postgres|sqlite，見 storage.py)
+backend = get_backend()
 
 # ----------------------------
 # Logging 設定
 # ----------------------------
-try:
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(message)s',
-        filename=LOG_FILE,
-        filemode='w',
-        encoding='utf-8'
-    )
-    logging.info("Logging initialized (crawler)")
-except Exception as e:
-    print(f"Logging init error: {e}")
-    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
-
-# ----------------------------
-# PostgreSQL 連線函式
-# ----------------------------
-def get_pg_connection():
-    return psycopg2.connect(
-        host=PG_HOST,
-        port=PG_PORT,
-        dbname=PG_DBNAME,
-        user=PG_USER,
-        password=PG_PASSWORD
-    )
+# 佇列式非同步寫檔 + 壓縮輪替 (見 log_setup.py)
+setup_logging(LOG_FILE, filemode='w')
+logging.info("Logging initialized (crawler)")
 
 # ----------------------------
 # 資料庫初始化（不含情緒欄位）
 # ----------------------------
 def init_db():
-    conn = get_pg_connection()
-    cur = conn.cursor()
-    # 只存標題、內文、link；沒有 sentiment 相關欄位
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS sentiments (
-        id SERIAL PRIMARY KEY,
-        timestamp TIMESTAMP,
-        board TEXT,
-        title TEXT,
-        content TEXT,
-        link TEXT UNIQUE
-    );
-    """)
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS push_comments (
-        id SERIAL PRIMARY KEY,
-        article_id INT,
-        push_tag TEXT,
-        push_userid TEXT,
-        push_content TEXT,
-        push_time TEXT,
-        CONSTRAINT fk_article FOREIGN KEY(article_id)
-           REFERENCES sentiments(id) ON DELETE CASCADE
-    );
-    """)
-    conn.commit()
-    cur.close()
-    conn.close()
-
-# ----------------------------
-# 從文章頁中抓取發文時間
-# ----------------------------
-def fetch_article_time(soup) -> datetime:
-    post_time_str = None
-    metalines = soup.find_all("div", class_="article-metaline")
-    metalines_right = soup.find_all("div", class_="article-metaline-right")
-    all_metalines = metalines + metalines_right
-    for meta in all_metalines:
-        tag_span = meta.find("span", class_="article-meta-tag")
-        value_span = meta.find("span", class_="article-meta-value")
-        if tag_span and value_span and "時間" in tag_span.text.strip():
-            post_time_str = value_span.text.strip()
-            break
-
-    if not post_time_str:
-        full_text = soup.get_text()
-        pattern = r"[A-Z][a-z]{2}\s[A-Z][a-z]{2}\s{1,2}\d{1,2}\s\d{2}:\d{2}:\d{2}\s\d{4}"
-        match = re.search(pattern, full_text)
-        if match:
-            post_time_str = match.group(0).strip()
-
-    if post_time_str:
-        try:
-            dt = datetime.strptime(post_time_str, '%a %b %d %H:%M:%S %Y')
-            return dt
-        except ValueError as e:
-            logging.warning(f"Time parsing failed: {post_time_str}, {e}")
-    return datetime.now().replace(microsecond=0)
+    # 建表 / 補欄位與 post_sentiment、dashboard 共用，見 schema.py
+    ensure_schema(backend)
 
 # ----------------------------
 # 從文章內頁抓取內文與推文
@@ -122,11 +58,14 @@ def fetch_content_and_push(link_url: str):
     headers = {"User-Agent": "Mozilla/5.0"}
     cookies = {"over18": "1"}
     try:
-        resp = requests.get(link_url, headers=headers, cookies=cookies, timeout=10)
+        with HTTP_SECONDS.time(kind="article"):
+            resp = requests.get(link_url, headers=headers, cookies=cookies, timeout=10)
         resp.raise_for_status()
+        parse_start = time.perf_counter()
         from bs4 import BeautifulSoup
         soup = BeautifulSoup(resp.text, "html.parser")
-        post_time = fetch_article_time(soup)
+        # 網址 epoch 為準，meta 行只做確認
+        post_time = fetch_article_time(soup, link_url)
         
         # 抓內文
         main_content = soup.find(id="main-content")
@@ -153,87 +92,111 @@ def fetch_content_and_push(link_url: str):
             push_userid = userid_span.get_text(strip=True) if userid_span else ""
             push_content = content_span.get_text(strip=True).lstrip(":") if content_span else ""
             push_time = time_span.get_text(strip=True) if time_span else ""
+            # IP 與推文時間拆成欄位，年份由文章時間推算
+            push_ip, push_at = parse_push_time(push_time, post_time)
             push_list.append({
                 "tag": push_tag,
                 "userid": push_userid,
                 "content": push_content,
-                "time": push_time
+                "time": push_time,
+                "ip": push_ip,
+                "at": push_at
             })
 
+        PARSE_SECONDS.observe(time.perf_counter() - parse_start, kind="article")
         return post_time, content_text, push_list
     except Exception as e:
+        FETCH_ERRORS.inc(kind="article")
         logging.error(f"Fetching content failed: {e}, URL: {link_url}")
-        return datetime.now().replace(microsecond=0), "", []
+        # 交給呼叫端放入重試佇列，不寫入空文章 (連結 UNIQUE，寫入後就不會再被重抓)
+        raise
 
 # ----------------------------
 # 將爬到的文章主文與推文寫入資料庫（無情緒分析）
 # ----------------------------
 def save_article_and_push(timestamp, board, title, content, link, push_list):
-    conn = get_pg_connection()
-    cur = conn.cursor()
-    article_id = None
+    """
+    回傳 "saved" / "duplicate" / "failed" (重試佇列依此決定是否移除項目)
+    """
+    conn = backend.connect()
     try:
-        insert_sql = """
-        INSERT INTO sentiments(timestamp, board, title, content, link)
-        VALUES (%s, %s, %s, %s, %s)
-        RETURNING id
-        """
-        cur.execute(insert_sql, (timestamp, board, title, content, link))
-        article_id = cur.fetchone()[0]
-        conn.commit()
-    except psycopg2.IntegrityError:
-        logging.info(f"Duplicate article, skipping: {link}")
-        conn.rollback()
-        cur.close()
+        with DB_WRITE_SECONDS.time(table="sentiments"), backend.transaction(conn) as cur:
+            # 已遷移到壓縮儲存時內文以 zstd + 字典寫入 content_z (見 compact_storage.py)
+            codec = content_codec(cur, backend)
+            article_id = backend.insert_returning_id(
+                cur, "sentiments", ["timestamp", "board", "title", *CONTENT_COLUMNS, "link"],
+                (timestamp, board, title, *encode_content(content, codec), link)
+            )
+            # 標題詞頻與文章同一交易寫入，重複文章不會被重複計數
+            add_title(cur, board, timestamp, title, backend)
+            # 全文檢索索引 (標題 / 內文 / 推文) 同樣隨文章寫入
+            index_article(cur, article_id, title, content, [p["content"] for p in push_list], backend)
+            # 先前抓取失敗而排入重試佇列的文章已寫入：在同一交易內移出佇列，不另開寫入交易
+            discard_retry(cur, link, backend)
+    except backend.IntegrityError:
+        ARTICLES.inc(result="duplicate")
+        logging.debug(f"Duplicate article, skipping: {link}")
         conn.close()
-        return
+        return "duplicate"
     except Exception as e:
+        ARTICLES.inc(result="failed")
         logging.error(f"Inserting main article failed: {e}")
-        conn.rollback()
-        cur.close()
         conn.close()
-        return
+        return "failed"
+    ARTICLES.inc(result="saved")
 
+    # 推文整批寫入 (PG: COPY，SQLite: executemany)
+    # crawled_at 為分區鍵，同一篇文章的推文落在同一個月分區
+    crawled_at = datetime.now().replace(microsecond=0)
     try:
-        for p in push_list:
-            cur.execute("""
-            INSERT INTO push_comments(article_id, push_tag, push_userid, push_content, push_time)
-            VALUES (%s, %s, %s, %s, %s)
-            """, (article_id, p["tag"], p["userid"], p["content"], p["time"]))
-        conn.commit()
+        with DB_WRITE_SECONDS.time(table="push_comments"), backend.transaction(conn) as cur:
+            backend.bulk_insert(
+                cur, "push_comments",
+                ["article_id", *PUSH_TAG_COLUMNS, "push_userid", "push_content", "push_time",
+                 "push_ip", "push_at", "crawled_at"],
+                [(article_id, *encode_push_tag(p["tag"], codec is not None), p["userid"], p["content"], p["time"],
+                  p["ip"], p["at"], crawled_at)
+                 for p in push_list]
+            )
+            # 推文使用者索引 (推文數 / 推噓比 / 出現時間) 與推文同一交易累加
+            add_pushes(cur, board, push_list, backend)
+        PUSHES_SAVED.inc(len(push_list))
     except Exception as e:
         logging.error(f"Inserting push_comments failed: {e}")
-        conn.rollback()
     finally:
-        cur.close()
         conn.close()
+    return "saved"
 
 def main():
     init_db()
+    # 抓取失敗的文章由背景執行緒依退避時間重試
+    retry_thread, retry_stop = start_retry_worker(fetch_content_and_push, save_article_and_push, backend)
     logging.info(f"Start crawling {BOARD} pages from index {START_PAGE} to index {END_PAGE}")
 
     total_pages = abs(START_PAGE - END_PAGE) + 1
-    pages_processed = 0
+    # 依時間間隔回報進度 (速度 / 預估剩餘時間)，逐頁細節在 DEBUG
+    progress = ProgressReporter(f"[{BOARD}] index pages", total_pages, unit="pages")
     step = -1 if START_PAGE > END_PAGE else 1
     page = START_PAGE
 
     while (step < 0 and page >= END_PAGE) or (step > 0 and page <= END_PAGE):
-        pages_processed += 1
-        progress = (pages_processed / total_pages) * 100
-        logging.info(f"Processing page {page}, progress: {pages_processed}/{total_pages} ({progress:.1f}%)")
+        logging.debug(f"Processing page {page}")
 
-        url = f"https://www.ptt.cc/bbs/{BOARD}/index{page}.html"
+        url = f"{PTT_BASE_URL}/bbs/{BOARD}/index{page}.html"
         headers = {"User-Agent":"Mozilla/5.0"}
         cookies = {"over18":"1"}
 
         try:
-            resp = requests.get(url, headers=headers, cookies=cookies, timeout=10)
+            with HTTP_SECONDS.time(kind="index"):
+                resp = requests.get(url, headers=headers, cookies=cookies, timeout=10)
             if resp.status_code != 200:
+                FETCH_ERRORS.inc(kind="index")
                 logging.error(f"Failed to access {url}, status code: {resp.status_code}")
                 break
             soup = BeautifulSoup(resp.text, "html.parser")
             articles = soup.select(".r-ent")
         except Exception as e:
+            FETCH_ERRORS.inc(kind="index")
             logging.error(f"Error reading {url}: {e}")
             break
 
@@ -242,22 +205,39 @@ def main():
             if not title_tag:
                 continue
             title = title_tag.text.strip()
-            link = "https://www.ptt.cc" + title_tag["href"]
+            link = PTT_BASE_URL + title_tag["href"]
 
             # 抓文章內文與推文
-            post_time, content_text, push_list = fetch_content_and_push(link)
+            try:
+                post_time, content_text, push_list = fetch_content_and_push(link)
+            except Exception as e:
+                # 已在佇列中的連結交給重試 worker 依退避時間處理
+                record_failure(link, BOARD, title, e, backend, keep_schedule=True)
+                continue
 
             # 寫入資料庫（不包含情緒分析）
             save_article_and_push(post_time, BOARD, title, content_text, link, push_list)
 
         page += step
+        progress.update()
         time.sleep(SLEEP_SEC)
 
+    progress.finish()
+    # 尚未到期的項目留在佇列，可之後以 python retry_queue.py --drain 處理
+    retry_stop.set()
+    retry_thread.join()
+    # 各階段耗時摘要：HTTP / 解析 / 寫入各占多少時間
+    log_summary()
     logging.info("Crawling finished. (no sentiment analysis)")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gossiping board crawler")
+    add_profile_argument(parser)
+    args = parser.parse_args()
     try:
-        main()
+        # --profile：熱點分析 (見 profiling.py)
+        with profiled(args.profile):
+            main()
     except Exception as e:
         logging.error(f"Main error: {e}")
         sys.exit(1)
\ No newline at end of file
@@ -1,44 +1,39 @@
 import streamlit as st
 import pandas as pd
+import io
 import math
-import plotly.express as px
-from sqlalchemy import create_engine
-from scipy.stats import pearsonr, spearmanr
-import statsmodels.api as sm
-from statsmodels.formula.api import ols
-
-# 新增 WordCloud 套件
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
-import numpy as np
-
-#############################
-# PostgreSQL 連線參數
-#############################
-PG_HOST = "localhost"
-PG_PORT = 5432
-PG_DBNAME = "ptt_db"
-PG_USER = "ptt_user"
-PG_PASSWORD = "ptt_password"
-
-#############################
-# 建立 SQLAlchemy engine
-#############################
-def get_engine():
-    db_uri = f"postgresql+psycopg2://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DBNAME}"
-    engine = create_engine(db_uri)
-    return engine
-
-#############################
-# star_label -> 數字
-#############################
-def star_label_to_int(star_label: str):
-    if not star_label:
-        return None
-    try:
-        return int(star_label[0])  # "1 star" -> 1, "5 stars" -> 5
-    except:
-        return None
+import html
+from datetime import timedelta
+
+# plotly / scipy / statsmodels / wordcloud 匯入成本高 (statsmodels 約 2 秒、200 MB)，
+# 只在用到的頁面內匯入，冷啟動與文章列表頁不需要載入
+
+from storage import get_backend
+from timeseries import RESOLUTIONS, pick_resolution, downsample_series
+from stats_engine import anova_push_mean, combine_board_stats, spearman_from_hist
+from search_index import highlight, COUNT_CAP as SEARCH_COUNT_CAP
+from dashboard_data import (
+    LIST_CONTENT_CHARS,
+    PUSH_PAGE_SIZE,
+    fetch_article_page,
+    fetch_article_count,
+    fetch_article_content,
+    fetch_search_results,
+    fetch_push_counts,
+    fetch_push_pages,
+    fetch_top_terms,
+    fetch_star_distribution,
+    fetch_time_bounds,
+    fetch_time_series,
+    fetch_push_rate,
+    fetch_board_stats,
+    fetch_trending,
+    fetch_top_users,
+    fetch_user_boards,
+    fetch_user_daily,
+    get_data_for_analysis,
+    ensure_dashboard_schema,
+)
 
 #############################
 # 顏色映射 + HTML 呈現
@@ -68,189 +63,107 @@ def color_star_label(star_label):
         return star_label
 
 #############################
-# 讀取文章 (支援看板篩選)
-#############################
-def fetch_articles(board_filter=None):
-    engine = get_engine()
-    if board_filter and board_filter != "All":
-        sql = f"""
-        SELECT id, timestamp, board, title, content,
-               title_star_label, content_star_label
-        FROM sentiments
-        WHERE board = '{board_filter}'
-        ORDER BY timestamp DESC
-        """
-    else:
-        sql = """
-        SELECT id, timestamp, board, title, content,
-               title_star_label, content_star_label
-        FROM sentiments
-        ORDER BY timestamp DESC
-        """
-    df = pd.read_sql_query(sql, engine)
-    engine.dispose()
-    return df
-
-#############################
-# 文字雲
+# 推文 HTML 表格
 #############################
-def generate_wordcloud(text, font_path="Noto_Sans_TC"):
-    # 若系統中找不到字體，請使用完整路徑，如 "./fonts/Noto_Sans_TC.ttf"
-    wordcloud = WordCloud(font_path=font_path,
-                          width=800, height=400, 
-                          background_color="white",
-                          max_words=200, colormap="viridis").generate(text)
-    return wordcloud
-
-#############################
-# 星等分佈 (1~5)
-#############################
-def fetch_star_distribution(board_filter=None):
+def render_push_table(records):
     """
-    讀取 title_star_label, content_star_label, push_star_label 分佈
+    將一頁推文組成單一 HTML 表格，只需一次 st.markdown
     """
-    engine = get_engine()
-    if board_filter and board_filter != "All":
-        sql_title = f"""
-        SELECT title_star_label AS star_label, COUNT(*) AS cnt
-        FROM sentiments
-        WHERE title_star_label IS NOT NULL AND board='{board_filter}'
-        GROUP BY title_star_label
-        """
-        sql_content = f"""
-        SELECT content_star_label AS star_label, COUNT(*) AS cnt
-        FROM sentiments
-        WHERE content_star_label IS NOT NULL AND board='{board_filter}'
-        GROUP BY content_star_label
-        """
-        sql_push = f"""
-        SELECT push_star_label AS star_label, COUNT(*) AS cnt
-        FROM push_comments
-        WHERE push_star_label IS NOT NULL
-          AND article_id IN (
-             SELECT id FROM sentiments WHERE board='{board_filter}'
-          )
-        GROUP BY push_star_label
-        """
-    else:
-        sql_title = """
-        SELECT title_star_label AS star_label, COUNT(*) AS cnt
-        FROM sentiments
-        WHERE title_star_label IS NOT NULL
-        GROUP BY title_star_label
-        """
-        sql_content = """
-        SELECT content_star_label AS star_label, COUNT(*) AS cnt
-        FROM sentiments
-        WHERE content_star_label IS NOT NULL
-        GROUP BY content_star_label
-        """
-        sql_push = """
-        SELECT push_star_label AS star_label, COUNT(*) AS cnt
-        FROM push_comments
-        WHERE push_star_label IS NOT NULL
-        GROUP BY push_star_label
-        """
-
-    df_title = pd.read_sql_query(sql_title, engine)
-    df_content = pd.read_sql_query(sql_content, engine)
-    df_push = pd.read_sql_query(sql_push, engine)
-    engine.dispose()
-
-    # star_label -> int
-    df_title["star_int"] = df_title["star_label"].apply(star_label_to_int)
-    df_content["star_int"] = df_content["star_label"].apply(star_label_to_int)
-    df_push["star_int"] = df_push["star_label"].apply(star_label_to_int)
-
-    return df_title, df_content, df_push
+    rows = []
+    for p in records:
+        star = color_star_label(p["push_star_label"]) if p.get("push_star_label") else ""
+        rows.append(
+            "<tr>"
+            f"<td>{html.escape(p['push_tag'] or '')}</td>"
+            f"<td>{html.escape(p['push_userid'] or '')}</td>"
+            f"<td>{html.escape(p['push_content'] or '')}</td>"
+            f"<td style='white-space:nowrap'>{html.escape(p['push_time'] or '')}</td>"
+            f"<td>{star}</td>"
+            "</tr>"
+        )
+    return (
+        "<table style='width:100%; font-size:0.9em'>"
+        "<tr><th></th><th>ID</th><th>推文</th><th>時間</th><th>星等</th></tr>"
+        + "".join(rows)
+        + "</table>"
+    )
 
 #############################
-# 時間序列 (timestamp vs star_int)
+# 全文檢索結果 (文章列表頁輸入關鍵字時)
 #############################
-def fetch_time_series(board_filter=None):
-    """
-    讀取 timestamp, title_star_label, content_star_label, push_mean
+SEARCH_SNIPPET_CHARS = 200
+
+def render_search_results(query, board_selection, page_size):
     """
-    engine = get_engine()
-    if board_filter and board_filter != "All":
-        sql_sent = f"""
-        SELECT id, timestamp, board, title_star_label, content_star_label
-        FROM sentiments
-        WHERE board='{board_filter}'
-        ORDER BY timestamp ASC
-        """
-    else:
-        sql_sent = """
-        SELECT id, timestamp, board, title_star_label, content_star_label
-        FROM sentiments
-        ORDER BY timestamp ASC
-        """
-    df_sent = pd.read_sql_query(sql_sent, engine)
-
-    # 讀取推文
-    sql_push = """
-    SELECT article_id, push_star_label
-    FROM push_comments
+    依相關度排序、OFFSET 分頁；標題與內文片段以 <mark> 標示命中詞
     """
-    df_push = pd.read_sql_query(sql_push, engine)
-    engine.dispose()
-
-    # 計算推文平均星等
-    df_push["push_int"] = df_push["push_star_label"].apply(star_label_to_int)
-    df_push_mean = df_push.groupby("article_id", as_index=False)["push_int"].mean().rename(columns={"push_int":"push_mean"})
-
-    # 合併
-    df_merged = pd.merge(df_sent, df_push_mean, left_on="id", right_on="article_id", how="left")
-    # 轉成 int
-    df_merged["title_int"] = df_merged["title_star_label"].apply(star_label_to_int)
-    df_merged["content_int"] = df_merged["content_star_label"].apply(star_label_to_int)
-
-    # dropna
-    df_merged = df_merged.dropna(subset=["title_int", "content_int", "push_mean"])
-    return df_merged
+    state = st.session_state
+    # 換查詢或看板時回到第一頁
+    if state.get("search_key") != (query, board_selection):
+        state["search_key"] = (query, board_selection)
+        state["search_page"] = 1
+
+    df_hits, total = fetch_search_results(query, board_filter=board_selection,
+                                          page=state["search_page"], page_size=page_size)
+    current_page = state["search_page"]
+    total_text = f"超過 {SEARCH_COUNT_CAP} 筆" if total > SEARCH_COUNT_CAP else f"共 {total} 筆"
+    st.write(f"搜尋「{query}」| 看板: {board_selection} | {total_text}結果，目前顯示第 {current_page} 頁。")
+
+    def _goto_search_page(page):
+        state["search_page"] = page
+
+    nav_first, nav_prev, nav_next = st.sidebar.columns(3)
+    nav_first.button("第一頁", on_click=_goto_search_page, args=(1,), disabled=current_page == 1)
+    nav_prev.button("上一頁", on_click=_goto_search_page, args=(current_page - 1,), disabled=current_page == 1)
+    nav_next.button("下一頁", on_click=_goto_search_page, args=(current_page + 1,),
+                    disabled=current_page * page_size >= min(total, SEARCH_COUNT_CAP))
+
+    if df_hits.empty:
+        st.write("找不到符合的文章。")
+        return
+    for _, row in df_hits.iterrows():
+        st.markdown(f"#### [{html.escape(row['board'] or '')}] {highlight(row['title'], query)}",
+                    unsafe_allow_html=True)
+        st.write(f"文章ID: {row['id']} | 發文時間: {row['timestamp']}")
+        stars = [f"【{name}】 {color_star_label(row[col])}"
+                 for name, col in (("標題星等", "title_star_label"), ("內文星等", "content_star_label"))
+                 if row.get(col)]
+        if stars:
+            st.markdown(" ".join(stars), unsafe_allow_html=True)
+        st.markdown(highlight(row["content"], query, width=SEARCH_SNIPPET_CHARS), unsafe_allow_html=True)
+        st.markdown("---")
 
 #############################
-# 統計分析: 取 sentiments & push 平均
+# 文字雲 (由 term_daily 詞頻索引產生)
 #############################
-def get_data_for_analysis(board_filter=None):
-    engine = get_engine()
-
-    if board_filter and board_filter != "All":
-        sql_sent = f"""
-        SELECT id, title_star_label, content_star_label, board
-        FROM sentiments
-        WHERE board = '{board_filter}'
-        """
-    else:
-        sql_sent = """
-        SELECT id, title_star_label, content_star_label, board
-        FROM sentiments
-        """
-    df_sent = pd.read_sql_query(sql_sent, engine)
-
-    sql_push = """
-    SELECT article_id, push_star_label
-    FROM push_comments
-    """
-    df_push = pd.read_sql_query(sql_push, engine)
-    engine.dispose()
+WORDCLOUD_WINDOWS = {"近 1 天": 1, "近 7 天": 7, "近 30 天": 30, "全部": None}
 
-    df_sent['title_int'] = df_sent['title_star_label'].apply(star_label_to_int)
-    df_sent['content_int'] = df_sent['content_star_label'].apply(star_label_to_int)
-
-    df_push['push_int'] = df_push['push_star_label'].apply(star_label_to_int)
-    df_push_mean = df_push.groupby('article_id', as_index=False)['push_int'].mean().rename(columns={'push_int':'push_mean'})
+@st.cache_data(ttl=600)
+def render_wordcloud_png(board_filter=None, days=None, font_path="Noto_Sans_TC"):
+    """
+    以預先計算好的詞頻繪製文字雲，並依 (看板, 期間) 快取 PNG
+    若系統中找不到字體，請使用完整路徑，如 "./fonts/Noto_Sans_TC.ttf"
+    """
+    frequencies = fetch_top_terms(board_filter=board_filter, days=days)
+    if not frequencies:
+        return None
+    from wordcloud import WordCloud
 
-    df_all = pd.merge(df_sent, df_push_mean, left_on='id', right_on='article_id', how='left')
-    df_all = df_all.dropna(subset=['title_int','content_int','push_mean'])
-    return df_all
+    wordcloud = WordCloud(font_path=font_path,
+                          width=800, height=400,
+                          background_color="white",
+                          max_words=200, colormap="viridis").generate_from_frequencies(frequencies)
+    buf = io.BytesIO()
+    wordcloud.to_image().save(buf, format="PNG")
+    return buf.getvalue()
 
 #############################
 # Streamlit 主程式
 #############################
-st.set_page_config(page_title="PTT Dashboard (PostgreSQL)", layout="wide")
+st.set_page_config(page_title=f"PTT Dashboard ({get_backend().label})", layout="wide")
+ensure_dashboard_schema()
 
-menu = st.sidebar.radio("功能選單", ["文章列表", "資料視覺化", "文字雲", "時間序列", "統計分析"], index=0)
+menu = st.sidebar.radio("功能選單", ["文章列表", "資料視覺化", "文字雲", "時間序列", "熱門話題", "推文使用者", "統計分析"], index=0)
 
 # 手動刷新按鈕
 if st.sidebar.button("刷新資料"):
@@ -260,62 +173,80 @@ if menu == "文章列表":
     st.title("PTT 文章列表（含情緒）")
 
     board_selection = st.sidebar.selectbox("篩選看板", ["All", "Gossiping", "NBA", "Stock"])
-    engine = get_engine()
-    # 計算總文章數
-    if board_selection != "All":
-        sql_count = f"SELECT COUNT(*) as cnt FROM sentiments WHERE board='{board_selection}'"
-    else:
-        sql_count = "SELECT COUNT(*) as cnt FROM sentiments"
-    df_count = pd.read_sql_query(sql_count, engine)
-    engine.dispose()
-    total_articles = df_count["cnt"].iloc[0]
-
     page_size = 10
-    total_pages = math.ceil(total_articles / page_size)
-
-    current_page = st.sidebar.number_input("當前頁碼", min_value=1, max_value=max(1,total_pages), value=1, step=1)
-    st.write(f"當前看板: {board_selection} | 共 {total_articles} 篇文章，每頁 {page_size} 篇，總頁數: {total_pages}。目前顯示第 {current_page} 頁。")
-
-    offset = (current_page - 1) * page_size
-    engine = get_engine()
-    if board_selection != "All":
-        query = f"""
-        SELECT id, timestamp, board, title, content,
-               title_star_label, content_star_label
-        FROM sentiments
-        WHERE board='{board_selection}'
-        ORDER BY timestamp DESC
-        LIMIT {page_size} OFFSET {offset}
-        """
-    else:
-        query = f"""
-        SELECT id, timestamp, board, title, content,
-               title_star_label, content_star_label
-        FROM sentiments
-        ORDER BY timestamp DESC
-        LIMIT {page_size} OFFSET {offset}
-        """
-    df_articles = pd.read_sql_query(query, engine)
-    engine.dispose()
-
-    # 取得對應推文
+
+    # 有輸入關鍵字時改顯示全文檢索結果
+    search_query = st.text_input("搜尋標題 / 內文 / 推文", key="search_query").strip()
+    if search_query:
+        render_search_results(search_query, board_selection, page_size)
+        st.stop()
+
+    # 分頁游標存在 session_state；切換看板時回到第一頁
+    state = st.session_state
+    if state.get("list_board") != board_selection:
+        state["list_board"] = board_selection
+        state["list_cursor"] = None
+        state["list_direction"] = "next"
+        state["list_page"] = 1
+
+    df_articles = fetch_article_page(
+        board_filter=board_selection,
+        cursor=state["list_cursor"],
+        direction=state["list_direction"],
+        page_size=page_size,
+    )
+    # 往前翻到頂 (資料有新增時可能發生) 就重新從第一頁開始
+    if df_articles.empty and state["list_cursor"] is not None and state["list_direction"] == "prev":
+        state["list_cursor"] = None
+        state["list_direction"] = "next"
+        state["list_page"] = 1
+        df_articles = fetch_article_page(board_filter=board_selection, page_size=page_size)
+
+    if not df_articles.empty:
+        first, last = df_articles.iloc[0], df_articles.iloc[-1]
+        state["list_first"] = (pd.Timestamp(first["timestamp"]).to_pydatetime(), int(first["id"]))
+        state["list_last"] = (pd.Timestamp(last["timestamp"]).to_pydatetime(), int(last["id"]))
+
+    def _goto_first_page():
+        state["list_cursor"] = None
+        state["list_direction"] = "next"
+        state["list_page"] = 1
+
+    def _goto_prev_page():
+        state["list_cursor"] = state.get("list_first")
+        state["list_direction"] = "prev"
+        state["list_page"] = max(1, state["list_page"] - 1)
+
+    def _goto_next_page():
+        state["list_cursor"] = state.get("list_last")
+        state["list_direction"] = "next"
+        state["list_page"] += 1
+
+    def _show_full_article(article_id):
+        state[f"full_{article_id}"] = True
+
+    total_articles = fetch_article_count(board_filter=board_selection)
+    total_pages = max(1, math.ceil(total_articles / page_size))
+    current_page = state["list_page"]
+    st.write(f"當前看板: {board_selection} | 約 {total_articles} 篇文章，每頁 {page_size} 篇，約 {total_pages} 頁。目前顯示第 {current_page} 頁。")
+
+    nav_first, nav_prev, nav_next = st.sidebar.columns(3)
+    nav_first.button("第一頁", on_click=_goto_first_page, disabled=current_page == 1)
+    nav_prev.button("上一頁", on_click=_goto_prev_page, disabled=current_page == 1)
+    nav_next.button("下一頁", on_click=_goto_next_page, disabled=len(df_articles) < page_size)
+
+    # 推文只先取數量；勾選「載入推文」的文章才在此一次查回當頁推文
     article_ids = df_articles["id"].tolist()
-    if article_ids:
-        engine = get_engine()
-        if len(article_ids) == 1:
-            id_tuple = f"({article_ids[0]})"
-        else:
-            id_tuple = tuple(article_ids)
-        q_push = f"""
-        SELECT article_id, push_tag, push_userid, push_content,
-               push_time, push_star_label
-        FROM push_comments
-        WHERE article_id IN {id_tuple}
-        """
-        df_push = pd.read_sql_query(q_push, engine)
-        engine.dispose()
-    else:
-        df_push = pd.DataFrame()
+    # 當頁最早的發文時間：推文查詢只需看此後爬取的分區
+    has_ts = bool(article_ids) and df_articles["timestamp"].notna().all()
+    since = pd.Timestamp(df_articles["timestamp"].min()).to_pydatetime() if has_ts else None
+    push_counts = fetch_push_counts(article_ids, since=since)
+    page_requests = {
+        aid: state.get(f"push_page_{aid}", 1)
+        for aid in article_ids
+        if state.get(f"push_show_{aid}")
+    }
+    pushes_by_article = fetch_push_pages(page_requests, since=since)
 
     if df_articles.empty:
         st.write("無文章資料。")
@@ -333,26 +264,41 @@ if menu == "文章列表":
                 star_html2 = color_star_label(row["content_star_label"])
                 st.markdown(f"【內文星等】 {star_html2}", unsafe_allow_html=True)
 
+            # 內文已在資料庫端截斷為前 LIST_CONTENT_CHARS 字，全文按需讀取
             c = row["content"] if row["content"] else ""
-            content_show = c[:1000] + ("..." if len(c) > 1000 else "")
+            content_len = int(row["content_len"]) if pd.notna(row["content_len"]) else 0
             st.write("內文：")
-            st.write(content_show)
+            if content_len > LIST_CONTENT_CHARS and state.get(f"full_{row['id']}"):
+                st.write(fetch_article_content(row["id"]))
+            else:
+                st.write(c + ("..." if content_len > LIST_CONTENT_CHARS else ""))
+                if content_len > LIST_CONTENT_CHARS:
+                    st.button("顯示全文", key=f"full_btn_{row['id']}",
+                              on_click=_show_full_article, args=(row["id"],))
 
             # 推文
-            art_push = df_push[df_push["article_id"] == row["id"]]
-            if art_push.empty:
+            aid = row["id"]
+            push_cnt = int(push_counts.get(aid, 0))
+            if push_cnt == 0:
                 st.write("無推文")
             else:
-                with st.expander(f"展開 {len(art_push)} 筆推文"):
-                    for _, pushrow in art_push.iterrows():
-                        push_text = f"{pushrow['push_tag']} {pushrow['push_userid']}: {pushrow['push_content']} ({pushrow['push_time']})"
-                        if pushrow.get("push_star_label"):
-                            star_html_p = color_star_label(pushrow["push_star_label"])
-                            push_text += f" | {star_html_p}"
-                        st.markdown(push_text, unsafe_allow_html=True)
+                with st.expander(f"展開 {push_cnt} 筆推文"):
+                    if st.checkbox("載入推文", key=f"push_show_{aid}"):
+                        push_pages = max(1, math.ceil(push_cnt / PUSH_PAGE_SIZE))
+                        if push_pages > 1:
+                            st.number_input(f"推文頁碼 (共 {push_pages} 頁)", min_value=1,
+                                            max_value=push_pages, step=1, key=f"push_page_{aid}")
+                        records = pushes_by_article.get(aid)
+                        if records is None:
+                            # 本次 rerun 才剛勾選，補查這一篇
+                            records = fetch_push_pages({aid: state.get(f"push_page_{aid}", 1)},
+                                                       since=since).get(aid, [])
+                        st.markdown(render_push_table(records), unsafe_allow_html=True)
             st.markdown("---")
 
 elif menu == "資料視覺化":
+    import plotly.express as px
+
     st.title("資料視覺化：星等分佈")
     st.write("改用星等(1~5) 來顯示分佈")
 
@@ -383,46 +329,162 @@ elif menu == "資料視覺化":
 elif menu == "文字雲":
     st.title("文字雲")
     board_selection = st.sidebar.selectbox("篩選看板", ["All", "Gossiping", "NBA", "Stock"])
-    df_articles = fetch_articles(board_filter=board_selection)
-    if df_articles.empty:
-        st.write("無文章可產生文字雲")
+    window = st.sidebar.selectbox("期間", list(WORDCLOUD_WINDOWS.keys()), index=2)
+    png = render_wordcloud_png(board_filter=board_selection, days=WORDCLOUD_WINDOWS[window])
+    if png is None:
+        st.write("無文章可產生文字雲 (若為首次使用，請先執行 python term_index.py 建立詞頻索引)")
     else:
-        # 將所有標題或內文合併
-        text_all = " ".join(df_articles["title"].fillna("").tolist())
-        # 產生文字雲，指定使用 Noto_Sans_TC 字體
-        wordcloud = generate_wordcloud(text_all, font_path="Noto_Sans_TC")
-        fig, ax = plt.subplots(figsize=(10,5))
-        ax.imshow(wordcloud, interpolation='bilinear')
-        ax.axis("off")
-        st.pyplot(fig)
+        st.image(png, use_column_width=True)
 
 elif menu == "時間序列":
+    import plotly.express as px
+
     st.title("時間序列：情緒星等 (1~5) vs 時間")
     board_selection = st.sidebar.selectbox("篩選看板", ["All", "Gossiping", "NBA", "Stock"])
-    df_time = fetch_time_series(board_filter=board_selection)
-    if df_time.empty:
+    bounds = fetch_time_bounds(board_filter=board_selection)
+    if bounds is None:
         st.write("無資料")
     else:
-        # 使用折線圖或散佈圖
-        # 這裡示範 scatter + line
-        # 我們可以顯示 title_int, content_int, push_mean 三條線
-        df_long = pd.melt(
-            df_time,
-            id_vars=["id","timestamp","board","article_id"],
-            value_vars=["title_int","content_int","push_mean"],
-            var_name="type",
-            value_name="star_value"
-        )
-        # Plotly line chart
-        fig_ts = px.line(
-            df_long,
-            x="timestamp",
-            y="star_value",
-            color="type",
-            title=f"{board_selection} - 時間序列情緒星等",
-            labels={"timestamp":"時間", "star_value":"星等(1~5)", "type":"種類"}
-        )
-        st.plotly_chart(fig_ts, use_container_width=True)
+        tmin, tmax = bounds
+        if tmax <= tmin:
+            tmax = tmin + timedelta(minutes=1)
+        # 拖曳縮小時間範圍後，會以更細的粒度重新向資料庫查詢
+        time_range = st.slider("時間範圍", min_value=tmin, max_value=tmax,
+                               value=(tmin, tmax), format="YYYY-MM-DD HH:mm")
+        res_choice = st.sidebar.selectbox("時間粒度", ["自動"] + RESOLUTIONS)
+        use_lttb = st.sidebar.checkbox("LTTB 降採樣", value=True)
+        max_points = st.sidebar.number_input("每條線最多點數", min_value=100, max_value=5000, value=1000, step=100)
+
+        resolution = pick_resolution(*time_range) if res_choice == "自動" else res_choice
+        df_time = fetch_time_series(board_filter=board_selection, start=time_range[0],
+                                    end=time_range[1], resolution=resolution)
+        if df_time.empty:
+            st.write("此時間範圍內無資料")
+        else:
+            # 三條線：title_int, content_int, push_mean (每桶平均)
+            df_long = pd.melt(
+                df_time,
+                id_vars=["timestamp", "article_count"],
+                value_vars=["title_int","content_int","push_mean"],
+                var_name="type",
+                value_name="star_value"
+            )
+            if use_lttb:
+                df_long = downsample_series(df_long, "timestamp", "star_value",
+                                            group_col="type", threshold=int(max_points))
+            st.write(f"粒度: {resolution} | 桶數: {len(df_time)} | 繪製點數: {len(df_long)}")
+            fig_ts = px.line(
+                df_long,
+                x="timestamp",
+                y="star_value",
+                color="type",
+                hover_data=["article_count"],
+                title=f"{board_selection} - 時間序列情緒星等 ({resolution})",
+                labels={"timestamp":"時間", "star_value":"星等(1~5)", "type":"種類", "article_count":"文章數"}
+            )
+            st.plotly_chart(fig_ts, use_container_width=True)
+
+        # 推文速率：依推文時間 (push_at) 分桶
+        st.subheader("推文速率與推文情緒")
+        df_rate = fetch_push_rate(board_filter=board_selection, start=time_range[0],
+                                  end=time_range[1], resolution=resolution)
+        if df_rate.empty:
+            st.write("此時間範圍內無推文時間資料 (舊資料請先執行 python push_time.py 回填)")
+        else:
+            if use_lttb:
+                df_rate_count = downsample_series(df_rate, "timestamp", "push_count", threshold=int(max_points))
+                df_rate_star = downsample_series(df_rate.dropna(subset=["push_star"]), "timestamp", "push_star",
+                                                 threshold=int(max_points))
+            else:
+                df_rate_count, df_rate_star = df_rate, df_rate
+            fig_rate = px.line(
+                df_rate_count, x="timestamp", y="push_count",
+                title=f"{board_selection} - 推文數 ({resolution})",
+                labels={"timestamp":"推文時間", "push_count":"推文數"}
+            )
+            st.plotly_chart(fig_rate, use_container_width=True)
+            fig_push_star = px.line(
+                df_rate_star, x="timestamp", y="push_star",
+                title=f"{board_selection} - 推文平均星等 ({resolution})",
+                labels={"timestamp":"推文時間", "push_star":"星等(1~5)"}
+            )
+            st.plotly_chart(fig_push_star, use_container_width=True)
+
+elif menu == "熱門話題":
+    import plotly.express as px
+    from trending import BUCKET_SEC, WINDOW_BUCKETS
+
+    st.title("熱門話題：近期爆量詞")
+    board_selection = st.sidebar.selectbox("篩選看板", ["All", "Gossiping", "NBA", "Stock"], index=3)
+    df_trend = fetch_trending(board_filter=board_selection)
+    window_min = BUCKET_SEC * WINDOW_BUCKETS // 60
+    st.write(f"最近 {window_min} 分鐘內標題詞的出現篇數，與長期基準相比的爆量分數 "
+             f"(視窗篇數 - 預期篇數) / sqrt(預期篇數 + 1)。")
+    if df_trend.empty:
+        st.write("尚無熱門話題資料 (由 crawler_auto.py 執行時每分鐘更新)")
+    else:
+        for board, df_board in df_trend.groupby("board", sort=True):
+            st.subheader(f"{board} (更新於 {df_board['updated_at'].iloc[0]})")
+            if int(df_board["baseline_buckets"].iloc[0]) < WINDOW_BUCKETS:
+                st.caption("基準仍在累積中，分數主要反映視窗內的出現篇數。")
+            fig_trend = px.bar(df_board.sort_values("score"), x="score", y="term", orientation="h",
+                               hover_data=["window_count", "expected"],
+                               labels={"score": "爆量分數", "term": "詞", "window_count": "視窗篇數",
+                                       "expected": "預期篇數"})
+            fig_trend.update_layout(height=max(300, 22 * len(df_board)))
+            st.plotly_chart(fig_trend, use_container_width=True)
+
+elif menu == "推文使用者":
+    import plotly.express as px
+
+    st.title("推文使用者：活躍度與情緒")
+    board_selection = st.sidebar.selectbox("篩選看板", ["All", "Gossiping", "NBA", "Stock"])
+    order_label = st.sidebar.radio("排序", ["推文最多", "最負面 (平均星等最低)"])
+    order = "negative" if order_label.startswith("最負面") else "pushes"
+    min_star_n = 20
+    if order == "negative":
+        min_star_n = st.sidebar.number_input("至少幾筆已分析推文", min_value=1, max_value=10000, value=20, step=10)
+
+    df_users = fetch_top_users(board_filter=board_selection, order=order, min_star_n=int(min_star_n))
+    if df_users.empty:
+        st.write("無推文使用者資料 (若為首次使用，請先執行 python user_index.py 建立使用者索引)")
+    else:
+        df_show = df_users.copy()
+        for col, name in (("up_cnt", "推%"), ("down_cnt", "噓%"), ("arrow_cnt", "→%")):
+            df_show[name] = (df_show[col] / df_show["push_cnt"] * 100).round(1)
+        # 尚無已分析推文時平均星等全為 NULL (object 欄位)，先轉成數值再取小數
+        df_show["mean_star"] = pd.to_numeric(df_show["mean_star"]).round(2)
+        st.dataframe(df_show[["userid", "push_cnt", "推%", "噓%", "→%", "mean_star", "star_n",
+                              "boards", "first_seen", "last_seen"]].rename(columns={
+            "userid": "使用者", "push_cnt": "推文數", "mean_star": "平均星等", "star_n": "已分析推文",
+            "boards": "看板數", "first_seen": "最早推文", "last_seen": "最近推文",
+        }), use_container_width=True)
+
+        # 單一使用者明細：各看板彙總 + 每日推文數 / 平均星等
+        st.subheader("使用者明細")
+        typed = st.text_input("輸入使用者 ID (留空則從上表選擇)").strip()
+        userid = typed or st.selectbox("選擇使用者", df_users["userid"].tolist())
+        df_boards = fetch_user_boards(userid)
+        if df_boards.empty:
+            st.write(f"找不到使用者 {userid} 的推文紀錄。")
+        else:
+            total_pushes = int(df_boards["push_cnt"].sum())
+            st.write(f"{userid}：{total_pushes} 則推文，出現在 {len(df_boards)} 個看板")
+            st.dataframe(df_boards.rename(columns={
+                "board": "看板", "push_cnt": "推文數", "up_cnt": "推", "down_cnt": "噓", "arrow_cnt": "→",
+                "mean_star": "平均星等", "star_n": "已分析推文", "first_seen": "最早推文", "last_seen": "最近推文",
+            }), use_container_width=True)
+            df_daily = fetch_user_daily(userid)
+            if not df_daily.empty:
+                fig_daily = px.bar(df_daily, x="day", y="push_cnt", title=f"{userid} - 每日推文數",
+                                   labels={"day": "日期", "push_cnt": "推文數"})
+                st.plotly_chart(fig_daily, use_container_width=True)
+                df_star = df_daily.dropna(subset=["mean_star"])
+                if not df_star.empty:
+                    fig_star = px.line(df_star, x="day", y="mean_star", markers=True,
+                                       title=f"{userid} - 每日推文平均星等",
+                                       labels={"day": "日期", "mean_star": "星等(1~5)"})
+                    st.plotly_chart(fig_star, use_container_width=True)
 
 else:  # "統計分析"
     st.title("統計分析 (星等)")
@@ -430,60 +492,118 @@ else:  # "統計分析"
 
     board_options = ["All", "Gossiping", "NBA", "Stock"]
     board_choice = st.selectbox("選擇看板做分析", board_options, index=0)
-    df_all = get_data_for_analysis(board_filter=board_choice)
-    st.write(f"看板: {board_choice}, 有效文章數: {len(df_all)} (同時有標題星等、內文星等、推文平均星等)")
+    exact_mode = st.checkbox("精確重算 (讀取全部資料；預設使用增量統計量)", value=False)
+
+    if not exact_mode:
+        # 由 board_stats 讀取充分統計量，所有檢定都是 O(1)
+        stats_by_board, hist_by_board = fetch_board_stats()
+        total, total_hist = combine_board_stats(stats_by_board, hist_by_board, board_choice)
+        st.write(f"看板: {board_choice}, 有效文章數: {total.n} (同時有標題星等、內文星等、推文平均星等；增量統計)")
+
+        if total.n < 4:
+            st.write("資料不足，無法進行統計分析。")
+        else:
+            # (A) 描述性統計
+            st.subheader("描述性統計")
+            st.write("標題星等：", total.describe(0))
+            st.write("內文星等：", total.describe(1))
+            st.write("推文平均星等：", total.describe(2))
+
+            # (B) 相關分析
+            st.subheader("相關分析 (Pearson, Spearman)")
+            pairs = [("標題 vs 內文", 0, 1), ("標題 vs 推文", 0, 2), ("內文 vs 推文", 1, 2)]
+            for label, i, j in pairs:
+                r, p = total.pearson(i, j)
+                st.write(f"皮爾森 - {label}: r={r:.3f}, p={p:.4g}")
+            for label, i, j in pairs:
+                r, p = spearman_from_hist(total_hist, i, j)
+                st.write(f"斯皮爾曼 (近似) - {label}: r={r:.3f}, p={p:.4g}")
+            st.write("斯皮爾曼以推文平均 0.1 分箱的次數表估計等級；需要精確值請勾選「精確重算」。")
+            st.write("若 p < 0.05，代表在統計上顯著 (樣本量大亦可使非常小的 r 也達顯著)")
+
+            # (C) 多元迴歸
+            st.subheader("多元迴歸 (OLS)")
+            res = total.ols()
+            st.write(f"push_mean ~ const + title_int + content_int | N={res['nobs']}, R²={res['rsquared']:.4f}")
+            st.dataframe(pd.DataFrame({
+                "coef": res["params"],
+                "std err": res["bse"],
+                "t": res["tvalues"],
+                "P>|t|": res["pvalues"],
+            }))
+
+        # (D) 多看板差異檢定 (ANOVA)
+        st.subheader("多看板差異檢定 (ANOVA)")
+        anova = anova_push_mean(stats_by_board)
+        if anova is None:
+            st.write("全看板資料不足或只有單一看板，無法做 ANOVA。")
+        else:
+            st.write("以下比較各看板之推文平均星等是否有顯著差異 (ANOVA):")
+            st.dataframe(pd.DataFrame(anova).T)
+            st.write("若 p < 0.05，表示至少有一個看板的平均分數與其他看板不同，建議進一步進行事後檢定。")
 
-    if len(df_all) < 2:
-        st.write("資料不足，無法進行統計分析。")
-    else:
-        # (A) 描述性統計
-        st.subheader("描述性統計")
-        desc_title = df_all['title_int'].describe()
-        desc_content = df_all['content_int'].describe()
-        desc_push = df_all['push_mean'].describe()
-
-        st.write("標題星等：", desc_title.to_dict())
-        st.write("內文星等：", desc_content.to_dict())
-        st.write("推文平均星等：", desc_push.to_dict())
-
-        # (B) 相關分析
-        st.subheader("相關分析 (Pearson, Spearman)")
-        r_tc, p_tc = pearsonr(df_all['title_int'], df_all['content_int'])
-        r_tp, p_tp = pearsonr(df_all['title_int'], df_all['push_mean'])
-        r_cp, p_cp = pearsonr(df_all['content_int'], df_all['push_mean'])
-
-        st.write(f"皮爾森 - 標題 vs 內文: r={r_tc:.3f}, p={p_tc:.4g}")
-        st.write(f"皮爾森 - 標題 vs 推文: r={r_tp:.3f}, p={p_tp:.4g}")
-        st.write(f"皮爾森 - 內文 vs 推文: r={r_cp:.3f}, p={p_cp:.4g}")
-
-        r_tc_sp, p_tc_sp = spearmanr(df_all['title_int'], df_all['content_int'])
-        r_tp_sp, p_tp_sp = spearmanr(df_all['title_int'], df_all['push_mean'])
-        r_cp_sp, p_cp_sp = spearmanr(df_all['content_int'], df_all['push_mean'])
-
-        st.write(f"斯皮爾曼 - 標題 vs 內文: r={r_tc_sp:.3f}, p={p_tc_sp:.4g}")
-        st.write(f"斯皮爾曼 - 標題 vs 推文: r={r_tp_sp:.3f}, p={p_tp_sp:.4g}")
-        st.write(f"斯皮爾曼 - 內文 vs 推文: r={r_cp_sp:.3f}, p={p_cp_sp:.4g}")
-
-        st.write("若 p < 0.05，代表在統計上顯著 (樣本量大亦可使非常小的 r 也達顯著)")
-
-        # (C) 多元迴歸
-        st.subheader("多元迴歸 (OLS)")
-        X = df_all[['title_int', 'content_int']]
-        X = sm.add_constant(X)
-        y = df_all['push_mean']
-        model = sm.OLS(y, X).fit()
-        st.text(model.summary())
-
-    # (D) 多看板差異檢定 (ANOVA)
-    st.subheader("多看板差異檢定 (ANOVA)")
-    df_allboards = get_data_for_analysis(board_filter=None)
-    if len(df_allboards) < 2 or df_allboards['board'].nunique() < 2:
-        st.write("全看板資料不足或只有單一看板，無法做 ANOVA。")
     else:
-        df_allboards = df_allboards.dropna(subset=["board"])
-        formula = 'push_mean ~ C(board)'
-        model_anova = ols(formula, data=df_allboards).fit()
-        anova_table = sm.stats.anova_lm(model_anova, typ=2)
-        st.write("以下比較各看板之推文平均星等是否有顯著差異 (ANOVA):")
-        st.dataframe(anova_table)
-        st.write("若 p < 0.05，表示至少有一個看板的平均分數與其他看板不同，建議進一步進行事後檢定。")
+        df_all = get_data_for_analysis(board_filter=board_choice)
+        st.write(f"看板: {board_choice}, 有效文章數: {len(df_all)} (同時有標題星等、內文星等、推文平均星等)")
+
+        if len(df_all) < 2:
+            st.write("資料不足，無法進行統計分析。")
+        else:
+            # (A) 描述性統計
+            st.subheader("描述性統計")
+            desc_title = df_all['title_int'].describe()
+            desc_content = df_all['content_int'].describe()
+            desc_push = df_all['push_mean'].describe()
+
+            st.write("標題星等：", desc_title.to_dict())
+            st.write("內文星等：", desc_content.to_dict())
+            st.write("推文平均星等：", desc_push.to_dict())
+
+            # (B) 相關分析
+            from scipy.stats import pearsonr, spearmanr
+
+            st.subheader("相關分析 (Pearson, Spearman)")
+            r_tc, p_tc = pearsonr(df_all['title_int'], df_all['content_int'])
+            r_tp, p_tp = pearsonr(df_all['title_int'], df_all['push_mean'])
+            r_cp, p_cp = pearsonr(df_all['content_int'], df_all['push_mean'])
+
+            st.write(f"皮爾森 - 標題 vs 內文: r={r_tc:.3f}, p={p_tc:.4g}")
+            st.write(f"皮爾森 - 標題 vs 推文: r={r_tp:.3f}, p={p_tp:.4g}")
+            st.write(f"皮爾森 - 內文 vs 推文: r={r_cp:.3f}, p={p_cp:.4g}")
+
+            r_tc_sp, p_tc_sp = spearmanr(df_all['title_int'], df_all['content_int'])
+            r_tp_sp, p_tp_sp = spearmanr(df_all['title_int'], df_all['push_mean'])
+            r_cp_sp, p_cp_sp = spearmanr(df_all['content_int'], df_all['push_mean'])
+
+            st.write(f"斯皮爾曼 - 標題 vs 內文: r={r_tc_sp:.3f}, p={p_tc_sp:.4g}")
+            st.write(f"斯皮爾曼 - 標題 vs 推文: r={r_tp_sp:.3f}, p={p_tp_sp:.4g}")
+            st.write(f"斯皮爾曼 - 內文 vs 推文: r={r_cp_sp:.3f}, p={p_cp_sp:.4g}")
+
+            st.write("若 p < 0.05，代表在統計上顯著 (樣本量大亦可使非常小的 r 也達顯著)")
+
+            # (C) 多元迴歸
+            import statsmodels.api as sm
+
+            st.subheader("多元迴歸 (OLS)")
+            X = df_all[['title_int', 'content_int']]
+            X = sm.add_constant(X)
+            y = df_all['push_mean']
+            model = sm.OLS(y, X).fit()
+            st.text(model.summary())
+
+        # (D) 多看板差異檢定 (ANOVA)
+        st.subheader("多看板差異檢定 (ANOVA)")
+        df_allboards = get_data_for_analysis(board_filter=None)
+        if len(df_allboards) < 2 or df_allboards['board'].nunique() < 2:
+            st.write("全看板資料不足或只有單一看板，無法做 ANOVA。")
+        else:
+            import statsmodels.api as sm
+            from statsmodels.formula.api import ols
+
+            df_allboards = df_allboards.dropna(subset=["board"])
+            formula = 'push_mean ~ C(board)'
+            model_anova = ols(formula, data=df_allboards).fit()
+            anova_table = sm.stats.anova_lm(model_anova, typ=2)
+            st.write("以下比較各看板之推文平均星等是否有顯著差異 (ANOVA):")
+            st.dataframe(anova_table)
+            st.write("若 p < 0.05，表示至少有一個看板的平均分數與其他看板不同，建議進一步進行事後檢定。")
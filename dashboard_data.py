@@ -0,0 +1,613 @@
+import os
+import logging
+import streamlit as st
+import pandas as pd
+
+from storage import get_backend
+from schema import ensure_schema
+from timeseries import RESOLUTIONS
+from stats_engine import load_board_stats
+from push_partitions import crawled_lower_bound
+from search_index import hits_subquery, COUNT_CAP
+from compact_storage import (decode_content_frame, push_star_sql, push_tag_sql, push_star_label_sql,
+                             push_labeled_sql)
+from metrics import DASHBOARD_QUERY_SECONDS, timed, start_metrics_server
+
+# 設定 PTT_SNAPSHOT_DIR 時，整表讀取的分析查詢改走 Parquet 快照
+USE_SNAPSHOT = bool(os.environ.get("PTT_SNAPSHOT_DIR"))
+# 設定 PTT_DASHBOARD_METRICS_PORT 時以 /metrics 提供各 loader 的查詢耗時 (只計快取未命中)
+if os.environ.get("PTT_DASHBOARD_METRICS_PORT"):
+    start_metrics_server(int(os.environ["PTT_DASHBOARD_METRICS_PORT"]))
+
+#############################
+# dashboard 資料存取層
+# 所有查詢集中於此，頁面只負責呈現；
+# 查詢只取畫面需要的欄位，長文字在資料庫端截斷
+#############################
+
+#############################
+# 儲存層 (PTT_DB_BACKEND=postgres|sqlite，見 storage.py)
+#############################
+backend = get_backend()
+
+#############################
+# 資料表結構 (見 schema.py)
+# 舊資料庫升級後若先開 dashboard，查詢用到的新欄位 (crawled_at / push_at / push_tag_code / content_z ...)
+# 也會先補齊；每個 streamlit 行程只執行一次
+#############################
+@st.cache_resource
+def ensure_dashboard_schema():
+    try:
+        ensure_schema(backend)
+    except Exception as e:
+        # 唯讀帳號 / 唯讀檔案無法補欄位，結構已是最新時仍可正常查詢
+        logging.warning(f"Schema update skipped: {e}")
+
+#############################
+# star_label -> 數字
+#############################
+def star_label_to_int(star_label: str):
+    if not star_label:
+        return None
+    try:
+        return int(star_label[0])  # "1 star" -> 1, "5 stars" -> 5
+    except:
+        return None
+
+#############################
+# 欄位投影 (只取需要的欄位，內文可在資料庫端截斷)
+#############################
+ARTICLE_COLUMNS = (
+    "id", "timestamp", "board", "title", "content", "link",
+    "title_star_label", "content_star_label",
+)
+LIST_COLUMNS = ("id", "timestamp", "board", "title", "content",
+                "title_star_label", "content_star_label")
+LIST_CONTENT_CHARS = 1000
+
+def article_select_list(columns, content_chars=None):
+    """
+    組出 SELECT 欄位清單。content_chars 有值時在資料庫端截斷 (LEFT / substr)，
+    並額外回傳 content_len 供頁面判斷是否需要「顯示全文」。
+    壓縮儲存的內文另取 content_z / content_dict，讀取後以 decode_content_frame 解碼
+    """
+    select = []
+    for col in columns:
+        if col not in ARTICLE_COLUMNS:
+            raise ValueError(f"Unknown article column: {col}")
+        if col == "content" and content_chars is not None:
+            select.append(f"{backend.left('content', content_chars)} AS content")
+            select.append("COALESCE(content_len, LENGTH(content)) AS content_len")
+        else:
+            select.append(col)
+        if col == "content":
+            select.extend(["content_z", "content_dict"])
+    return ", ".join(select)
+
+#############################
+# 讀取文章 (支援看板篩選)
+#############################
+@timed(DASHBOARD_QUERY_SECONDS, loader="fetch_articles")
+def fetch_articles(board_filter=None, columns=LIST_COLUMNS, content_chars=None):
+    params = {}
+    where = ""
+    if board_filter and board_filter != "All":
+        where = "WHERE board = %(board)s"
+        params["board"] = board_filter
+    sql = f"""
+    SELECT {article_select_list(columns, content_chars)}
+    FROM sentiments
+    {where}
+    ORDER BY timestamp DESC
+    """
+    df = backend.read_sql(sql, params)
+    return decode_content_frame(df, content_chars, backend)
+
+@timed(DASHBOARD_QUERY_SECONDS, loader="fetch_article_content")
+def fetch_article_content(article_id):
+    """
+    「顯示全文」時才讀取單篇完整內文
+    """
+    sql = "SELECT content, content_z, content_dict FROM sentiments WHERE id = %(id)s"
+    df = decode_content_frame(backend.read_sql(sql, {"id": int(article_id)}), backend=backend)
+    if df.empty or df["content"].iloc[0] is None:
+        return ""
+    return df["content"].iloc[0]
+
+#############################
+# 文章列表分頁 (keyset / cursor)
+#############################
+@timed(DASHBOARD_QUERY_SECONDS, loader="fetch_article_page")
+def fetch_article_page(board_filter=None, cursor=None, direction="next", page_size=10,
+                       columns=LIST_COLUMNS, content_chars=LIST_CONTENT_CHARS):
+    """
+    以 (timestamp, id) 為游標做 keyset 分頁，深頁與第一頁成本相同。
+    cursor: (timestamp, id)，None 表示第一頁
+    direction: "next" 取 cursor 之後 (較舊) 的文章，"prev" 取 cursor 之前 (較新) 的文章
+    columns / content_chars: 見 article_select_list
+    回傳依 timestamp DESC, id DESC 排序的 DataFrame
+    """
+    conditions = []
+    params = {"limit": page_size}
+    if board_filter and board_filter != "All":
+        conditions.append("board = %(board)s")
+        params["board"] = board_filter
+    if cursor is not None:
+        params["cur_ts"], params["cur_id"] = cursor
+        if direction == "prev":
+            conditions.append("(timestamp, id) > (%(cur_ts)s, %(cur_id)s)")
+        else:
+            conditions.append("(timestamp, id) < (%(cur_ts)s, %(cur_id)s)")
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    # 往前翻頁時反向掃描索引，取回後再轉回 DESC 順序
+    order = "ASC" if direction == "prev" and cursor is not None else "DESC"
+
+    sql = f"""
+    SELECT {article_select_list(columns, content_chars)}
+    FROM sentiments
+    {where}
+    ORDER BY timestamp {order}, id {order}
+    LIMIT %(limit)s
+    """
+    df = decode_content_frame(backend.read_sql(sql, params), content_chars, backend)
+    if order == "ASC":
+        df = df.iloc[::-1].reset_index(drop=True)
+    return df
+
+@st.cache_data(ttl=600)
+@timed(DASHBOARD_QUERY_SECONDS, loader="fetch_article_count")
+def fetch_article_count(board_filter=None):
+    """
+    文章總數：全站使用估計值 (PG: pg_class.reltuples，SQLite: MAX(rowid)，皆不掃表)，
+    單一看板走 (board, timestamp, id) 索引計數，並快取 10 分鐘
+    """
+    if board_filter and board_filter != "All":
+        sql = "SELECT COUNT(*) AS cnt FROM sentiments WHERE board = %(board)s"
+        df = backend.read_sql(sql, {"board": board_filter})
+    else:
+        df = backend.read_sql(backend.approx_count_sql("sentiments"))
+        # 尚未 ANALYZE 過的表 reltuples 為 -1 (或 0)、空表 MAX(rowid) 為 NULL，退回精確計數
+        if df.empty or pd.isna(df["cnt"].iloc[0]) or df["cnt"].iloc[0] <= 0:
+            df = backend.read_sql("SELECT COUNT(*) AS cnt FROM sentiments")
+    return int(df["cnt"].iloc[0])
+
+#############################
+# 全文檢索 (見 search_index.py)
+#############################
+@timed(DASHBOARD_QUERY_SECONDS, loader="fetch_search_results")
+def fetch_search_results(query, board_filter=None, page=1, page_size=10,
+                         columns=LIST_COLUMNS, content_chars=LIST_CONTENT_CHARS):
+    """
+    依相關度排序的一頁結果 (OFFSET 分頁，搜尋結果通常只翻前幾頁)
+    回傳 (DataFrame, 命中數)；命中數最多只數到 COUNT_CAP + 1
+    """
+    hits_sql, params = hits_subquery(query, backend)
+    if hits_sql is None:
+        return pd.DataFrame(columns=list(columns) + ["score"]), 0
+    where = ""
+    if board_filter and board_filter != "All":
+        where = "WHERE board = %(board)s"
+        params["board"] = board_filter
+
+    count_sql = f"""
+    SELECT COUNT(*) AS cnt FROM (
+        SELECT 1 FROM ({hits_sql}) AS hits
+        JOIN sentiments ON sentiments.id = hits.hit_id
+        {where}
+        LIMIT {COUNT_CAP + 1}
+    ) AS capped
+    """
+    total = int(backend.read_sql(count_sql, params)["cnt"].iloc[0])
+
+    sql = f"""
+    SELECT {article_select_list(columns, content_chars)}, hits.score
+    FROM ({hits_sql}) AS hits
+    JOIN sentiments ON sentiments.id = hits.hit_id
+    {where}
+    ORDER BY hits.score, sentiments.id DESC
+    LIMIT %(limit)s OFFSET %(offset)s
+    """
+    params.update({"limit": page_size, "offset": (max(1, page) - 1) * page_size})
+    return decode_content_frame(backend.read_sql(sql, params), content_chars, backend), total
+
+#############################
+# 推文：先取數量，展開後才分頁載入
+#############################
+PUSH_PAGE_SIZE = 50
+
+def crawled_filter(since, params, column="crawled_at"):
+    """
+    since: 文章時間下界；轉成推文 crawled_at 條件，PG 只掃描相關分區、SQLite 略過舊分片
+    """
+    if since is None:
+        return ""
+    params["crawled_from"] = crawled_lower_bound(since)
+    return f" AND {column} >= %(crawled_from)s"
+
+@timed(DASHBOARD_QUERY_SECONDS, loader="fetch_push_counts")
+def fetch_push_counts(article_ids, since=None):
+    """
+    只查每篇文章的推文數 (走 push_comments.article_id 索引)，回傳 {article_id: cnt}
+    since: 這些文章中最早的發文時間 (可省略)
+    """
+    if not article_ids:
+        return {}
+    in_ids, params = backend.in_list("article_id", [int(i) for i in article_ids], "ids")
+    sql = f"""
+    SELECT article_id, COUNT(*) AS cnt
+    FROM push_comments
+    WHERE {in_ids}{crawled_filter(since, params)}
+    GROUP BY article_id
+    """
+    df = backend.read_sql(sql, params)
+    return dict(zip(df["article_id"], df["cnt"]))
+
+def group_pushes_by_article(df_push):
+    """
+    一次把推文 DataFrame 分組成 {article_id: [record, ...]}，避免逐篇文章重新過濾整張表
+    """
+    if df_push.empty:
+        return {}
+    return {
+        article_id: grp.drop(columns="article_id").to_dict("records")
+        for article_id, grp in df_push.groupby("article_id", sort=False)
+    }
+
+@timed(DASHBOARD_QUERY_SECONDS, loader="fetch_push_pages")
+def fetch_push_pages(page_requests, page_size=PUSH_PAGE_SIZE, since=None):
+    """
+    page_requests: {article_id: page_no (1 起算)}
+    以單一 UNION ALL 查詢取回各文章指定頁的推文，回傳 {article_id: [record, ...]}
+    """
+    if not page_requests:
+        return {}
+    parts = []
+    params = {"limit": page_size}
+    crawled = crawled_filter(since, params)
+    for i, (article_id, page_no) in enumerate(page_requests.items()):
+        params[f"aid{i}"] = int(article_id)
+        params[f"off{i}"] = (max(1, int(page_no)) - 1) * page_size
+        parts.append(f"""
+        SELECT * FROM (
+            SELECT id, article_id, {push_tag_sql()} AS push_tag, push_userid, push_content,
+                   push_time, {push_star_label_sql()} AS push_star_label
+            FROM push_comments
+            WHERE article_id = %(aid{i})s{crawled}
+            ORDER BY id
+            LIMIT %(limit)s OFFSET %(off{i})s
+        ) AS p{i}
+        """)
+    sql = " UNION ALL ".join(parts)
+    df = backend.read_sql(sql, params)
+    return group_pushes_by_article(df.sort_values(["article_id", "id"]))
+
+@timed(DASHBOARD_QUERY_SECONDS, loader="fetch_top_terms")
+def fetch_top_terms(board_filter=None, days=None, k=200):
+    """
+    合併 term_daily 中指定看板 / 期間的詞頻，回傳前 k 名 {term: cnt}
+    """
+    conditions = []
+    params = {"k": k}
+    if board_filter and board_filter != "All":
+        conditions.append("board = %(board)s")
+        params["board"] = board_filter
+    if days is not None:
+        conditions.append(f"day > {backend.days_ago('days')}")
+        params["days"] = days
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    sql = f"""
+    SELECT term, SUM(cnt) AS cnt
+    FROM term_daily
+    {where}
+    GROUP BY term
+    ORDER BY cnt DESC
+    LIMIT %(k)s
+    """
+    df = backend.read_sql(sql, params)
+    return dict(zip(df["term"], df["cnt"].astype(int)))
+
+#############################
+# 熱門話題 (crawler_auto.py 每分鐘覆寫 trending_terms，見 trending.py)
+#############################
+@st.cache_data(ttl=60)
+@timed(DASHBOARD_QUERY_SECONDS, loader="fetch_trending")
+def fetch_trending(board_filter=None):
+    params = {}
+    where = ""
+    if board_filter and board_filter != "All":
+        where = "WHERE board = %(board)s"
+        params["board"] = board_filter
+    sql = f"""
+    SELECT board, rank, term, window_count, expected, score, baseline_buckets, updated_at
+    FROM trending_terms
+    {where}
+    ORDER BY board, rank
+    """
+    return backend.read_sql(sql, params)
+
+#############################
+# 推文使用者 (由 user_index.py 維護的 user_stats / user_daily 查詢，不掃描推文)
+#############################
+USER_MEAN_STAR = "CAST(SUM(star_sum) AS DOUBLE PRECISION) / NULLIF(SUM(star_n), 0)"
+
+@st.cache_data(ttl=300)
+@timed(DASHBOARD_QUERY_SECONDS, loader="fetch_top_users")
+def fetch_top_users(board_filter=None, order="pushes", min_star_n=20, limit=50):
+    """
+    order: "pushes" 依推文數排序；"negative" 依平均星等由低到高 (至少 min_star_n 筆已分析推文)
+    """
+    params = {"limit": limit}
+    where = ""
+    if board_filter and board_filter != "All":
+        where = "WHERE board = %(board)s"
+        params["board"] = board_filter
+    if order == "negative":
+        having = "HAVING SUM(star_n) >= %(min_star_n)s"
+        params["min_star_n"] = min_star_n
+        order_by = "mean_star ASC, push_cnt DESC"
+    else:
+        having = ""
+        order_by = "push_cnt DESC"
+    sql = f"""
+    SELECT userid, SUM(push_cnt) AS push_cnt, SUM(up_cnt) AS up_cnt, SUM(down_cnt) AS down_cnt,
+           SUM(arrow_cnt) AS arrow_cnt, {USER_MEAN_STAR} AS mean_star, SUM(star_n) AS star_n,
+           COUNT(*) AS boards, MIN(first_seen) AS first_seen, MAX(last_seen) AS last_seen
+    FROM user_stats
+    {where}
+    GROUP BY userid
+    {having}
+    ORDER BY {order_by}
+    LIMIT %(limit)s
+    """
+    return backend.read_sql(sql, params)
+
+@timed(DASHBOARD_QUERY_SECONDS, loader="fetch_user_boards")
+def fetch_user_boards(userid):
+    """
+    單一使用者在各看板的推文數、推噓比、平均星等 (主鍵範圍查詢)
+    """
+    sql = """
+    SELECT board, push_cnt, up_cnt, down_cnt, arrow_cnt,
+           CAST(star_sum AS DOUBLE PRECISION) / NULLIF(star_n, 0) AS mean_star, star_n,
+           first_seen, last_seen
+    FROM user_stats
+    WHERE userid = %(userid)s
+    ORDER BY push_cnt DESC
+    """
+    return backend.read_sql(sql, {"userid": userid})
+
+@timed(DASHBOARD_QUERY_SECONDS, loader="fetch_user_daily")
+def fetch_user_daily(userid):
+    sql = """
+    SELECT day, push_cnt, CAST(star_sum AS DOUBLE PRECISION) / NULLIF(star_n, 0) AS mean_star
+    FROM user_daily
+    WHERE userid = %(userid)s
+    ORDER BY day
+    """
+    df = backend.read_sql(sql, {"userid": userid})
+    df["day"] = pd.to_datetime(df["day"])
+    return df
+
+#############################
+# 星等分佈 (1~5)
+#############################
+@timed(DASHBOARD_QUERY_SECONDS, loader="fetch_star_distribution")
+def fetch_star_distribution(board_filter=None):
+    """
+    讀取 title_star_label, content_star_label, push_star_label 分佈
+    """
+    params = {}
+    board_cond = ""
+    push_cond = ""
+    if board_filter and board_filter != "All":
+        params["board"] = board_filter
+        board_cond = "AND board = %(board)s"
+        push_cond = "AND article_id IN (SELECT id FROM sentiments WHERE board = %(board)s)"
+    sql_title = f"""
+    SELECT title_star_label AS star_label, COUNT(*) AS cnt
+    FROM sentiments
+    WHERE title_star_label IS NOT NULL {board_cond}
+    GROUP BY title_star_label
+    """
+    sql_content = f"""
+    SELECT content_star_label AS star_label, COUNT(*) AS cnt
+    FROM sentiments
+    WHERE content_star_label IS NOT NULL {board_cond}
+    GROUP BY content_star_label
+    """
+    sql_push = f"""
+    SELECT {push_star_label_sql()} AS star_label, COUNT(*) AS cnt
+    FROM push_comments
+    WHERE {push_labeled_sql()} {push_cond}
+    GROUP BY {push_star_label_sql()}
+    """
+
+    df_title = backend.read_sql(sql_title, params)
+    df_content = backend.read_sql(sql_content, params)
+    df_push = backend.read_sql(sql_push, params)
+
+    # star_label -> int
+    df_title["star_int"] = df_title["star_label"].apply(star_label_to_int)
+    df_content["star_int"] = df_content["star_label"].apply(star_label_to_int)
+    df_push["star_int"] = df_push["star_label"].apply(star_label_to_int)
+
+    return df_title, df_content, df_push
+
+#############################
+# 時間序列 (timestamp vs star_int)
+#############################
+@st.cache_data(ttl=300)
+@timed(DASHBOARD_QUERY_SECONDS, loader="fetch_time_bounds")
+def fetch_time_bounds(board_filter=None):
+    """
+    讀取最早 / 最晚發文時間 (走 timestamp 索引)，作為時間範圍選擇的上下界
+    """
+    params = {}
+    where = ""
+    if board_filter and board_filter != "All":
+        where = "WHERE board = %(board)s"
+        params["board"] = board_filter
+    sql = f"SELECT MIN(timestamp) AS tmin, MAX(timestamp) AS tmax FROM sentiments {where}"
+    df = backend.read_sql(sql, params)
+    tmin, tmax = df["tmin"].iloc[0], df["tmax"].iloc[0]
+    if pd.isna(tmin) or pd.isna(tmax):
+        return None
+    return pd.Timestamp(tmin).to_pydatetime(), pd.Timestamp(tmax).to_pydatetime()
+
+@st.cache_data(ttl=300)
+@timed(DASHBOARD_QUERY_SECONDS, loader="fetch_time_series")
+def fetch_time_series(board_filter=None, start=None, end=None, resolution="hour"):
+    """
+    在資料庫端依 resolution (minute / hour / day) 分桶，
+    回傳每桶的 title_int, content_int, push_mean 平均與文章數 (article_count)。
+    只計入同時有標題星等、內文星等、推文平均星等的文章
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution: {resolution}")
+    conditions = [
+        "s.title_star_label IS NOT NULL",
+        "s.content_star_label IS NOT NULL",
+    ]
+    params = {}
+    if board_filter and board_filter != "All":
+        conditions.append("s.board = %(board)s")
+        params["board"] = board_filter
+    if start is not None:
+        conditions.append("s.timestamp >= %(start)s")
+        params["start"] = start
+    if end is not None:
+        conditions.append("s.timestamp <= %(end)s")
+        params["end"] = end
+    where = " AND ".join(conditions)
+
+    sql = f"""
+    WITH art AS (
+        SELECT s.id,
+               {backend.time_bucket("s.timestamp", resolution)} AS bucket,
+               {backend.star_int("s.title_star_label")} AS title_int,
+               {backend.star_int("s.content_star_label")} AS content_int
+        FROM sentiments s
+        WHERE {where}
+    ),
+    pm AS (
+        SELECT p.article_id, AVG({push_star_sql(backend, "p")}) AS push_mean
+        FROM push_comments p
+        JOIN art ON art.id = p.article_id
+        WHERE {push_labeled_sql("p")}{crawled_filter(start, params, "p.crawled_at")}
+        GROUP BY p.article_id
+    )
+    SELECT art.bucket AS timestamp,
+           AVG(art.title_int) AS title_int,
+           AVG(art.content_int) AS content_int,
+           AVG(pm.push_mean) AS push_mean,
+           COUNT(*) AS article_count
+    FROM art
+    JOIN pm ON pm.article_id = art.id
+    GROUP BY art.bucket
+    ORDER BY art.bucket
+    """
+    df = backend.read_sql(sql, params)
+    # SQLite 的分桶結果為字串
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return df
+
+@st.cache_data(ttl=300)
+@timed(DASHBOARD_QUERY_SECONDS, loader="fetch_push_rate")
+def fetch_push_rate(board_filter=None, start=None, end=None, resolution="minute"):
+    """
+    依推文時間 push_at 分桶，回傳每桶推文數 (push_count) 與推文平均星等 (push_star)。
+    push_at 範圍走索引；推文必定在發出後才被爬取，同一下界也套用在 crawled_at 以略過舊分區
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution: {resolution}")
+    conditions = ["p.push_at IS NOT NULL"]
+    params = {}
+    join = ""
+    if board_filter and board_filter != "All":
+        join = "JOIN sentiments s ON s.id = p.article_id"
+        conditions.append("s.board = %(board)s")
+        params["board"] = board_filter
+    if start is not None:
+        conditions.append("p.push_at >= %(start)s")
+        params["start"] = start
+    if end is not None:
+        conditions.append("p.push_at <= %(end)s")
+        params["end"] = end
+    where = " AND ".join(conditions) + crawled_filter(start, params, "p.crawled_at")
+
+    sql = f"""
+    SELECT {backend.time_bucket("p.push_at", resolution)} AS timestamp,
+           COUNT(*) AS push_count,
+           AVG({push_star_sql(backend, "p")}) AS push_star
+    FROM push_comments p
+    {join}
+    WHERE {where}
+    GROUP BY {backend.time_bucket("p.push_at", resolution)}
+    ORDER BY 1
+    """
+    df = backend.read_sql(sql, params)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return df
+
+#############################
+# 統計分析: 取 sentiments & push 平均
+#############################
+@timed(DASHBOARD_QUERY_SECONDS, loader="get_data_for_analysis")
+def get_data_for_analysis(board_filter=None):
+    # 設定 PTT_SNAPSHOT_DIR 且已匯出快照時，改讀 Parquet 快照 (只讀需要的欄位)，不查線上資料庫
+    # snapshot 匯入 pyarrow，未設定 PTT_SNAPSHOT_DIR 時不載入
+    if USE_SNAPSHOT:
+        from snapshot import load_snapshot, snapshot_exists
+    if USE_SNAPSHOT and snapshot_exists("sentiments") and snapshot_exists("push_comments"):
+        filters = None
+        if board_filter and board_filter != "All":
+            filters = [("board", "=", board_filter)]
+        df_sent = load_snapshot("sentiments", columns=["id", "title_star_label", "content_star_label", "board"],
+                                filters=filters)
+        df_push = load_snapshot("push_comments", columns=["article_id", "push_star_label"], filters=filters)
+    else:
+        params = {}
+        where = ""
+        if board_filter and board_filter != "All":
+            where = "WHERE board = %(board)s"
+            params["board"] = board_filter
+        sql_sent = f"""
+        SELECT id, title_star_label, content_star_label, board
+        FROM sentiments
+        {where}
+        """
+        df_sent = backend.read_sql(sql_sent, params)
+
+        sql_push = f"""
+        SELECT article_id, {push_star_label_sql()} AS push_star_label
+        FROM push_comments
+        """
+        df_push = backend.read_sql(sql_push)
+
+    df_sent['title_int'] = df_sent['title_star_label'].apply(star_label_to_int)
+    df_sent['content_int'] = df_sent['content_star_label'].apply(star_label_to_int)
+
+    df_push['push_int'] = df_push['push_star_label'].apply(star_label_to_int)
+    df_push_mean = df_push.groupby('article_id', as_index=False)['push_int'].mean().rename(columns={'push_int':'push_mean'})
+
+    df_all = pd.merge(df_sent, df_push_mean, left_on='id', right_on='article_id', how='left')
+    df_all = df_all.dropna(subset=['title_int','content_int','push_mean'])
+    return df_all
+
+#############################
+# 統計分析: 增量統計量 (board_stats)
+#############################
+@st.cache_data(ttl=60)
+@timed(DASHBOARD_QUERY_SECONDS, loader="fetch_board_stats")
+def fetch_board_stats():
+    """
+    回傳 ({board: SufficientStats}, {board: 聯合次數表})，由 post_sentiment.py 增量維護
+    """
+    conn = backend.connect(readonly=True)
+    try:
+        cur = conn.cursor()
+        stats, hist = load_board_stats(cur)
+        cur.close()
+    finally:
+        conn.close()
+    return stats, hist
@@ -0,0 +1,163 @@
+import re
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ----------------------------
+# 本機測試用的假 PTT 站台
+# 依看板與頁碼產生固定內容的列表頁 / 文章頁 (結構與 ptt.cc 相同，可直接給爬蟲解析)，
+# 可注入 5xx 失敗與延遲、調整每篇推文數，/stats 回報總請求數與每秒最高請求數 (驗證全域速率預算)。
+#   python fake_ptt_server.py --port 8808 --fail-rate 0.05
+#   PTT_BASE_URL=http://127.0.0.1:8808 python crawl_tasks.py worker
+# benchmark.py 以 start_server() 在同一行程內啟動
+# ----------------------------
+
+ARTICLES_PER_PAGE = 20
+PUSHES_PER_ARTICLE = 5
+LATEST_PAGE = 10000
+BASE_EPOCH = 1700000000
+PTT_TZ = timezone(timedelta(hours=8))
+
+INDEX_RE = re.compile(r"^/bbs/(\w+)/index(\d*)\.html$")
+ARTICLE_RE = re.compile(r"^/bbs/(\w+)/M\.(\d+)\.A\.([0-9A-F]+)\.html$")
+
+def article_epoch(page, i):
+    return BASE_EPOCH + page * 3600 + i * 60
+
+def render_index(board, page):
+    rows = []
+    for i in range(ARTICLES_PER_PAGE):
+        epoch = article_epoch(page, i)
+        rows.append(f"""
+        <div class="r-ent">
+          <div class="title"><a href="/bbs/{board}/M.{epoch}.A.{(page * ARTICLES_PER_PAGE + i) % 4096:03X}.html">
+            [測試] {board} 第 {page} 頁 第 {i} 篇</a></div>
+        </div>""")
+    return f"""<html><body>
+    <div class="btn-group-paging"><a class="btn wide" href="/bbs/{board}/index{page - 1}.html">‹ 上頁</a></div>
+    {''.join(rows)}
+    </body></html>"""
+
+def render_article(board, epoch, push_count=PUSHES_PER_ARTICLE):
+    posted = datetime.fromtimestamp(epoch, tz=PTT_TZ)
+    pushes = []
+    for j in range(push_count):
+        at = posted + timedelta(minutes=5 * (j + 1))
+        tag = ["推", "噓", "→"][j % 3]
+        pushes.append(f"""
+        <div class="push"><span class="push-tag">{tag} </span><span class="push-userid">user{j}</span>
+        <span class="push-content">: 測試推文 {j}</span>
+        <span class="push-ipdatetime"> 10.0.{j // 250}.{j % 250 + 1} {at:%m/%d %H:%M}</span></div>""")
+    return f"""<html><body><div id="main-content">
+    <div class="article-metaline"><span class="article-meta-tag">作者</span><span class="article-meta-value">tester</span></div>
+    <div class="article-metaline"><span class="article-meta-tag">標題</span><span class="article-meta-value">[測試] {board}</span></div>
+    <div class="article-metaline"><span class="article-meta-tag">時間</span><span class="article-meta-value">{posted:%a %b %d %H:%M:%S %Y}</span></div>
+    測試內文 {board} {epoch}
+    {''.join(pushes)}
+    </div></body></html>"""
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total = 0
+        self.failed = 0
+        self.per_second = {}
+
+    def hit(self, failed=False):
+        second = int(time.time())
+        with self.lock:
+            self.total += 1
+            self.failed += int(failed)
+            self.per_second[second] = self.per_second.get(second, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "requests": self.total,
+                "failed": self.failed,
+                "max_rps": max(self.per_second.values(), default=0),
+                "active_seconds": len(self.per_second),
+            }
+
+def make_handler(stats, fail_rate, delay, push_count=PUSHES_PER_ARTICLE):
+    class Handler(BaseHTTPRequestHandler):
+        def send_body(self, status, body, content_type="text/html; charset=utf-8"):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self.send_body(200, json.dumps(stats.snapshot()), "application/json")
+                return
+            if delay:
+                time.sleep(delay)
+            if random.random() < fail_rate:
+                stats.hit(failed=True)
+                self.send_body(503, "Service Unavailable")
+                return
+            stats.hit()
+            m = INDEX_RE.match(self.path)
+            if m:
+                page = int(m.group(2)) if m.group(2) else LATEST_PAGE
+                self.send_body(200, render_index(m.group(1), page))
+                return
+            m = ARTICLE_RE.match(self.path)
+            if m:
+                self.send_body(200, render_article(m.group(1), int(m.group(2)), push_count))
+                return
+            self.send_body(404, "Not Found")
+
+        def log_message(self, format, *args):
+            logging.debug(format % args)
+
+    return Handler
+
+def start_server(host="127.0.0.1", port=0, fail_rate=0.0, delay=0.0, push_count=PUSHES_PER_ARTICLE):
+    """
+    在背景執行緒啟動伺服器 (port=0 由系統挑選)，回傳 (server, stats, base_url)；
+    結束時呼叫 server.shutdown() 與 server.server_close()
+    """
+    stats = Stats()
+    server = ThreadingHTTPServer((host, port), make_handler(stats, fail_rate, delay, push_count))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="fake-ptt", daemon=True)
+    thread.start()
+    return server, stats, f"http://{host}:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake PTT server for local crawler tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--pushes", type=int, default=PUSHES_PER_ARTICLE, help="push comments per article")
+    args = parser.parse_args()
+
+    stats = Stats()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(stats, args.fail_rate, args.delay, args.pushes))
+    logging.info(f"Fake PTT server on http://{args.host}:{args.port} (fail rate {args.fail_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logging.info(f"Served: {stats.snapshot()}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    try:
+        main()
+    except Exception as e:
+        logging.error(f"Fake server error: {e}")
+        sys.exit(1)
@@ -0,0 +1,148 @@
+import os
+import gzip
+import json
+import time
+import queue
+import atexit
+import shutil
+import logging
+import logging.handlers
+
+# ----------------------------
+# 共用 logging 設定
+# 主迴圈只把記錄放進佇列 (QueueHandler)，由背景執行緒 (QueueListener) 寫檔，寫檔不再拖慢爬取 / 寫回；
+# 檔案超過 LOG_MAX_BYTES 即輪替並以 gzip 壓縮舊檔，最多保留 LOG_BACKUPS 份。
+#   PTT_LOG_LEVEL=DEBUG   顯示逐頁 / 逐篇細節
+#   PTT_LOG_JSON=1        每行輸出一個 JSON 物件 (進度欄位另存為 progress)
+# 進度改用 ProgressReporter：依時間間隔回報完成數、速度與預估剩餘時間，而不是每 N 筆一行
+# ----------------------------
+
+LOG_FORMAT = '%(asctime)s - %(message)s'
+LOG_LEVEL = os.environ.get("PTT_LOG_LEVEL", "INFO").upper()
+LOG_JSON = os.environ.get("PTT_LOG_JSON") == "1"
+LOG_MAX_BYTES = 20 * 1024 * 1024
+LOG_BACKUPS = 5
+PROGRESS_INTERVAL_SEC = 30
+
+_listener = None
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        progress = getattr(record, "progress", None)
+        if progress is not None:
+            entry["progress"] = progress
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+def gzip_rotator(source, dest):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+def rotating_file_handler(log_file, fresh=False):
+    """
+    fresh=True (原本的 filemode='w')：啟動時先把上一次的記錄輪替成壓縮檔，而不是直接覆寫
+    """
+    handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES,
+                                                   backupCount=LOG_BACKUPS, encoding="utf-8")
+    handler.namer = lambda name: name + ".gz"
+    handler.rotator = gzip_rotator
+    if fresh and os.path.getsize(log_file) > 0:
+        handler.doRollover()
+    return handler
+
+def setup_logging(log_file=None, filemode="a", level=LOG_LEVEL):
+    """
+    root logger 已有 handler 時 (例如 benchmark.py 先設定) 不做任何事，與 logging.basicConfig 相同
+    log_file 為 None 時寫到 stderr；檔案無法開啟時也退回 stderr
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return
+    global _listener
+    try:
+        target = rotating_file_handler(log_file, fresh=filemode == "w") if log_file \
+            else logging.StreamHandler()
+    except Exception as e:
+        print(f"Logging init error: {e}")
+        target = logging.StreamHandler()
+    target.setFormatter(JsonFormatter() if LOG_JSON else logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(log_queue, target, respect_handler_level=True)
+    _listener.start()
+    # 結束前把佇列中剩下的記錄寫完
+    atexit.register(stop_logging)
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+# ----------------------------
+# 進度回報
+# ----------------------------
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+class ProgressReporter:
+    """
+    每 interval 秒最多記錄一行：完成數 / 總數、百分比、速度、預估剩餘時間
+    update() 只做加法與時間比較，可放在逐筆迴圈中
+    """
+    def __init__(self, label, total=None, unit="rows", interval=PROGRESS_INTERVAL_SEC):
+        self.label = label
+        self.total = total
+        self.unit = unit
+        self.interval = interval
+        self.done = 0
+        self.start = time.monotonic()
+        self.next_report = self.start + interval
+
+    def update(self, n=1):
+        self.done += n
+        now = time.monotonic()
+        if now >= self.next_report:
+            self.next_report = now + self.interval
+            self.report(now)
+
+    def snapshot(self, now=None):
+        elapsed = (now or time.monotonic()) - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        progress = {"label": self.label, "done": self.done, "total": self.total, "unit": self.unit,
+                    "elapsed_sec": round(elapsed, 1), "rate_per_sec": round(rate, 2)}
+        if self.total:
+            progress["eta_sec"] = round((self.total - self.done) / rate, 1) if rate > 0 else None
+        return progress
+
+    def report(self, now=None, final=False):
+        p = self.snapshot(now)
+        if self.total:
+            message = f"{self.label}: {p['done']}/{p['total']} {self.unit} ({p['done'] / p['total']:.1%})"
+        else:
+            message = f"{self.label}: {p['done']} {self.unit}"
+        message += f", {p['rate_per_sec']:.1f} {self.unit}/s"
+        if final:
+            message += f", took {format_duration(p['elapsed_sec'])}"
+        elif p.get("eta_sec") is not None:
+            message += f", ETA {format_duration(p['eta_sec'])}"
+        logging.info(message, extra={"progress": p})
+
+    def finish(self):
+        self.report(final=True)
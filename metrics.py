@@ -0,0 +1,270 @@
+import os
+import time
+import logging
+import threading
+from functools import wraps
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ----------------------------
+# Prometheus 格式的計數器 / 量表 / 直方圖 (只用標準函式庫)
+# 長駐程式 (crawler_auto.py) 以 start_metrics_server() 提供 /metrics；
+# 批次程式 (crawler_multi / crawler_gossi / post_sentiment) 結束時以 log_summary() 輸出各階段耗時摘要。
+#   PTT_METRICS_PORT=9108 python crawler_auto.py
+#   curl http://127.0.0.1:9108/metrics
+# dashboard 設定 PTT_DASHBOARD_METRICS_PORT 時也會提供 /metrics (各 loader 查詢耗時)
+# ----------------------------
+
+METRICS_PORT = int(os.environ.get("PTT_METRICS_PORT", "9108"))
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label(v)}"' for k, v in pairs) + "}"
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def label_pairs(self, key):
+        return list(zip(self.labelnames, key))
+
+    def items(self):
+        with self.lock:
+            return sorted(self.values.items())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self.items():
+            lines.append(f"{self.name}{format_labels(self.label_pairs(key))} {value}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self.lock:
+            return self.values.get(self.key(labels), 0)
+
+    def total(self):
+        with self.lock:
+            return sum(self.values.values())
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                # [各桶次數 (不累計)..., +Inf 桶], 總和, 次數
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            i = 0
+            while i < len(self.buckets) and value > self.buckets[i]:
+                i += 1
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def items(self):
+        with self.lock:
+            return sorted((k, (list(v[0]), v[1], v[2])) for k, v in self.values.items())
+
+    def quantile(self, q, counts, count):
+        """
+        由各桶次數估計分位數 (桶內線性內插，落在 +Inf 桶時回傳最大有限邊界)
+        """
+        rank = q * count
+        seen = 0
+        lower = 0.0
+        for upper, n in zip(self.buckets, counts):
+            if n and seen + n >= rank:
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+            lower = upper
+        return self.buckets[-1]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in self.items():
+            pairs = self.label_pairs(key)
+            cumulative = 0
+            for upper, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{format_labels(pairs + [('le', upper)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(pairs + [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{format_labels(pairs)} {total}")
+            lines.append(f"{self.name}_count{format_labels(pairs)} {count}")
+        return lines
+
+# ----------------------------
+# 全域登錄表
+# 同名指標只建立一次 (streamlit 重新執行頁面時會重複 import)
+# ----------------------------
+REGISTRY = {}
+REGISTRY_LOCK = threading.Lock()
+
+def register(cls, name, help_text, labelnames=(), **kwargs):
+    with REGISTRY_LOCK:
+        metric = REGISTRY.get(name)
+        if metric is None:
+            metric = REGISTRY[name] = cls(name, help_text, labelnames, **kwargs)
+        return metric
+
+def counter(name, help_text, labelnames=()):
+    return register(Counter, name, help_text, labelnames)
+
+def gauge(name, help_text, labelnames=()):
+    return register(Gauge, name, help_text, labelnames)
+
+def histogram(name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return register(Histogram, name, help_text, labelnames, buckets=buckets)
+
+def render():
+    with REGISTRY_LOCK:
+        metrics = list(REGISTRY.values())
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def timed(hist, **labels):
+    """
+    裝飾器：記錄函式耗時到 hist
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with hist.time(**labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ----------------------------
+# 管線共用指標
+# ----------------------------
+HTTP_SECONDS = histogram("ptt_http_request_seconds", "PTT HTTP request latency", ["kind"])
+FETCH_ERRORS = counter("ptt_fetch_errors_total", "Failed PTT page fetches (network, HTTP status or parse)", ["kind"])
+PARSE_SECONDS = histogram("ptt_parse_seconds", "HTML parse and extraction time", ["kind"])
+DB_WRITE_SECONDS = histogram("ptt_db_write_seconds", "Database write transaction time", ["table"])
+ARTICLES = counter("ptt_articles_total", "Articles handled by the crawlers", ["result"])
+PUSHES_SAVED = counter("ptt_pushes_saved_total", "Push comments written")
+RETRY_QUEUE_DEPTH = gauge("ptt_retry_queue_depth", "Pending items in fetch_retry_queue")
+INFERENCE_BATCH_SECONDS = histogram("ptt_inference_batch_seconds", "Sentiment model latency per batch",
+                                    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+INFERENCE_TEXTS = counter("ptt_inference_texts_total", "Texts run through the sentiment model")
+DASHBOARD_QUERY_SECONDS = histogram("ptt_dashboard_query_seconds", "Dashboard loader query time (cache misses)",
+                                    ["loader"])
+
+# ----------------------------
+# /metrics HTTP 端點
+# ----------------------------
+_server = None
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+def start_metrics_server(port=METRICS_PORT, host="0.0.0.0"):
+    """
+    在背景執行緒提供 /metrics；同一行程只啟動一次，埠被占用時記錄錯誤並繼續執行
+    """
+    global _server
+    if _server is not None:
+        return _server
+    try:
+        _server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        logging.error(f"Metrics server could not bind port {port}: {e}")
+        return None
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    logging.info(f"Metrics available at http://{host}:{port}/metrics")
+    return _server
+
+# ----------------------------
+# 批次結束時的摘要
+# ----------------------------
+def summary_lines():
+    with REGISTRY_LOCK:
+        metrics = list(REGISTRY.values())
+    lines = []
+    for metric in metrics:
+        for key, value in metric.items():
+            name = metric.name + format_labels(metric.label_pairs(key))
+            if isinstance(metric, Histogram):
+                counts, total, count = value
+                if not count:
+                    continue
+                lines.append(f"{name}: n={count} total={total:.2f}s avg={total / count * 1000:.1f}ms "
+                             f"p50={metric.quantile(0.5, counts, count) * 1000:.1f}ms "
+                             f"p95={metric.quantile(0.95, counts, count) * 1000:.1f}ms")
+            else:
+                lines.append(f"{name}: {value}")
+    # 衍生指標
+    saved, duplicate = ARTICLES.value(result="saved"), ARTICLES.value(result="duplicate")
+    if saved + duplicate:
+        lines.append(f"dedup hit rate: {duplicate / (saved + duplicate):.1%}")
+    infer_seconds = sum(v[1] for _, v in INFERENCE_BATCH_SECONDS.items())
+    if infer_seconds:
+        lines.append(f"inference throughput: {INFERENCE_TEXTS.total() / infer_seconds:.1f} texts/s")
+    return lines
+
+def log_summary(title="Metrics summary"):
+    lines = summary_lines()
+    if not lines:
+        return
+    logging.info(f"{title}:\n  " + "\n  ".join(lines))
@@ -1,62 +1,60 @@
-from datetime import datetime
-import requests
-from bs4 import BeautifulSoup
-import re
-import time
 import logging
-import psycopg2
+import argparse
 import sys
 
+from storage import get_backend
+from stats_engine import refresh_articles
+from user_index import add_push_stars
+from sentiment_alerts import SentimentAlerts
+from schema import ensure_schema, SENTIMENT_COLUMNS, PUSH_COLUMNS
+from compact_storage import (compact_enabled, decode_content_rows, push_tag_sql,
+                             push_pending_sql)
+from log_setup import setup_logging, ProgressReporter
+from profiling import add_profile_argument, profiled
+from metrics import INFERENCE_BATCH_SECONDS, INFERENCE_TEXTS, DB_WRITE_SECONDS, log_summary
+
 # ----------------------------
 # Logging 設定
 # ----------------------------
-try:
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(message)s',
-        filename="post_sentiment.log",
-        filemode='a',  # 使用追加模式，保留之前的 log
-        encoding='utf-8'
-    )
-    logging.info("Logging initialized (post-sentiment, batch mode)")
-except Exception as e:
-    print(f"Logging init error: {e}")
-    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+# 使用追加模式，保留之前的 log；佇列式非同步寫檔 + 壓縮輪替 (見 log_setup.py)
+setup_logging("post_sentiment.log", filemode='a')
+logging.info("Logging initialized (post-sentiment, batch mode)")
 
 # ----------------------------
-# PostgreSQL 連線參數
+# 儲存層 (PTT_DB_BACKEND=postgres|sqlite，見 storage.py)
 # ----------------------------
-PG_HOST = "localhost"
-PG_PORT = 5432
-PG_DBNAME = "ptt_db"
-PG_USER = "ptt_user"
-PG_PASSWORD = "ptt_password"
+backend = get_backend()
+
+# 每批寫回的筆數：標籤與看板統計量在同一交易中更新
+UPDATE_CHUNK = 1000
+
+# 情緒欄位 SENTIMENT_COLUMNS / PUSH_COLUMNS 定義於 schema.py
+# 已遷移到壓縮儲存時只寫星等整數，標籤與情緒由星等推得 (見 compact_storage.py)
+COMPACT_PUSH_COLUMNS = ["push_star", "push_score"]
 
 # ----------------------------
-# 初始化情緒分析模型 (使用 GPU, 可改 device=-1 用 CPU)
+# 情緒分析模型 (使用 GPU, 可改 device=-1 用 CPU)
+# 第一次需要推論時才匯入 transformers 並載入模型；沒有待分析資料時不載入
 # ----------------------------
-from transformers import pipeline
-try:
-    sentiment_analyzer = pipeline(
-        "sentiment-analysis",
-        model="nlptown/bert-base-multilingual-uncased-sentiment",
-        device=0,
-        truncation=True,
-        max_length=512
-    )
-    logging.info("Sentiment analyzer initialized (GPU, batch mode)")
-except Exception as e:
-    logging.error(f"Model initialization failed: {e}")
-    sys.exit(1)
+sentiment_analyzer = None
 
-def get_pg_connection():
-    return psycopg2.connect(
-        host=PG_HOST,
-        port=PG_PORT,
-        dbname=PG_DBNAME,
-        user=PG_USER,
-        password=PG_PASSWORD
-    )
+def get_sentiment_analyzer():
+    global sentiment_analyzer
+    if sentiment_analyzer is None:
+        from transformers import pipeline
+        try:
+            sentiment_analyzer = pipeline(
+                "sentiment-analysis",
+                model="nlptown/bert-base-multilingual-uncased-sentiment",
+                device=0,
+                truncation=True,
+                max_length=512
+            )
+            logging.info("Sentiment analyzer initialized (GPU, batch mode)")
+        except Exception as e:
+            logging.error(f"Model initialization failed: {e}")
+            sys.exit(1)
+    return sentiment_analyzer
 
 # ----------------------------
 # star_label 轉換為情緒
@@ -70,80 +68,54 @@ def star_label_to_sentiment(star_label: str) -> str:
     else:
         return "POSITIVE"
 
+def star_label_to_int(star_label: str):
+    if not star_label or not star_label[0].isdigit():
+        return None
+    return int(star_label[0])  # "1 star" -> 1, "5 stars" -> 5
+
 # ----------------------------
 # 確保需要的欄位已存在
 # ----------------------------
 def ensure_db_columns():
-    conn = get_pg_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("ALTER TABLE sentiments ADD COLUMN title_star_label TEXT")
-    except psycopg2.errors.DuplicateColumn:
-        conn.rollback()
-    try:
-        cur.execute("ALTER TABLE sentiments ADD COLUMN title_sentiment TEXT")
-    except psycopg2.errors.DuplicateColumn:
-        conn.rollback()
-    try:
-        cur.execute("ALTER TABLE sentiments ADD COLUMN title_score DOUBLE PRECISION")
-    except psycopg2.errors.DuplicateColumn:
-        conn.rollback()
-    try:
-        cur.execute("ALTER TABLE sentiments ADD COLUMN content_star_label TEXT")
-    except psycopg2.errors.DuplicateColumn:
-        conn.rollback()
-    try:
-        cur.execute("ALTER TABLE sentiments ADD COLUMN content_sentiment TEXT")
-    except psycopg2.errors.DuplicateColumn:
-        conn.rollback()
-    try:
-        cur.execute("ALTER TABLE sentiments ADD COLUMN content_score DOUBLE PRECISION")
-    except psycopg2.errors.DuplicateColumn:
-        conn.rollback()
-    try:
-        cur.execute("ALTER TABLE push_comments ADD COLUMN push_star_label TEXT")
-    except psycopg2.errors.DuplicateColumn:
-        conn.rollback()
-    try:
-        cur.execute("ALTER TABLE push_comments ADD COLUMN push_sentiment TEXT")
-    except psycopg2.errors.DuplicateColumn:
-        conn.rollback()
-    try:
-        cur.execute("ALTER TABLE push_comments ADD COLUMN push_score DOUBLE PRECISION")
-    except psycopg2.errors.DuplicateColumn:
-        conn.rollback()
-    conn.commit()
-    cur.close()
-    conn.close()
+    # 與爬蟲、dashboard 共用同一份冪等的建表 / 補欄位 (含推文時間欄位)，見 schema.py
+    ensure_schema(backend)
 
 # ----------------------------
 # 批次推論
 # ----------------------------
-def batch_inference(texts, batch_size=16):
+def batch_inference(texts, batch_size=16, label="Inference"):
+    sentiment_analyzer = get_sentiment_analyzer()
+    # 依時間間隔回報進度 (texts/s、預估剩餘時間)
+    progress = ProgressReporter(label, len(texts), unit="texts")
     results = []
     for i in range(0, len(texts), batch_size):
         batch = texts[i : i + batch_size]
-        batch_out = sentiment_analyzer(
-            batch,
-            truncation=True,
-            max_length=512
-        )
+        with INFERENCE_BATCH_SECONDS.time():
+            batch_out = sentiment_analyzer(
+                batch,
+                truncation=True,
+                max_length=512
+            )
+        INFERENCE_TEXTS.inc(len(batch))
+        progress.update(len(batch))
         for out in batch_out:
             star_label = out["label"]
             confidence = out["score"]
             sentiment_label = star_label_to_sentiment(star_label)
             results.append((star_label, sentiment_label, confidence))
+    progress.finish()
     return results
 
 # ----------------------------
 # 分析 sentiments (title, content) in batch
 # ----------------------------
 def analyze_sentiments_main():
-    conn = get_pg_connection()
+    conn = backend.connect()
     cur = conn.cursor()
     # 只取尚未更新情緒的文章，避免重複分析
-    cur.execute("SELECT id, title, content FROM sentiments WHERE title_star_label IS NULL OR content_star_label IS NULL ORDER BY id ASC")
-    rows = cur.fetchall()
+    cur.execute("SELECT id, title, content, content_z, content_dict FROM sentiments WHERE title_star_label IS NULL OR content_star_label IS NULL ORDER BY id ASC")
+    # 壓縮儲存的內文先解碼
+    _, rows = decode_content_rows([d[0] for d in cur.description], cur.fetchall(), backend)
     total = len(rows)
     logging.info(f"Found {total} articles to analyze (title & content) that haven't been updated.")
     if total == 0:
@@ -156,44 +128,30 @@ def analyze_sentiments_main():
     content_texts = []
     article_ids = []
 
-    for idx, r in enumerate(rows):
-        article_id, title, content = r
+    for article_id, title, content in rows:
         article_ids.append(article_id)
         title_texts.append(title if title else "")
         content_texts.append(content if content else "")
-        # 每處理 100 筆 log 一次進度
-        if (idx+1) % 100 == 0:
-            logging.info(f"Prepared {idx+1}/{total} articles for analysis.")
 
-    logging.info("Start batch inference for titles...")
-    title_results = batch_inference(title_texts, batch_size=16)
-    logging.info("Start batch inference for contents...")
-    content_results = batch_inference(content_texts, batch_size=16)
+    title_results = batch_inference(title_texts, batch_size=16, label="Title inference")
+    content_results = batch_inference(content_texts, batch_size=16, label="Content inference")
 
-    for i, article_id in enumerate(article_ids):
-        title_star, title_sent, title_score = title_results[i]
-        cont_star, cont_sent, cont_score = content_results[i]
+    rows = [
+        (article_id,) + title_results[i] + content_results[i]
+        for i, article_id in enumerate(article_ids)
+    ]
+    progress = ProgressReporter("Updating articles", total, unit="rows")
+    for start in range(0, total, UPDATE_CHUNK):
+        chunk = rows[start:start + UPDATE_CHUNK]
         try:
-            update_sql = """
-            UPDATE sentiments
-            SET title_star_label=%s,
-                title_sentiment=%s,
-                title_score=%s,
-                content_star_label=%s,
-                content_sentiment=%s,
-                content_score=%s
-            WHERE id=%s
-            """
-            cur.execute(update_sql, (
-                title_star, title_sent, title_score,
-                cont_star, cont_sent, cont_score,
-                article_id
-            ))
+            with DB_WRITE_SECONDS.time(table="sentiments"), backend.transaction(conn) as wcur:
+                backend.bulk_update(wcur, "sentiments", "id", SENTIMENT_COLUMNS, chunk)
+                # 與標籤同一交易更新看板統計量
+                refresh_articles(wcur, [r[0] for r in chunk], backend)
         except Exception as e:
-            logging.error(f"Update sentiments failed for id={article_id}: {e}")
-        if (i+1) % 100 == 0:
-            logging.info(f"Updated {i+1}/{total} articles.")
-    conn.commit()
+            logging.error(f"Update sentiments failed for ids {chunk[0][0]}..{chunk[-1][0]}: {e}")
+        progress.update(len(chunk))
+    progress.finish()
     cur.close()
     conn.close()
     logging.info("Done updating sentiments (title & content).")
@@ -202,10 +160,16 @@ def analyze_sentiments_main():
 # 分析 push_comments in batch
 # ----------------------------
 def analyze_push_comments():
-    conn = get_pg_connection()
+    conn = backend.connect()
     cur = conn.cursor()
-    # 只選擇尚未更新推文情緒的資料
-    cur.execute("SELECT id, push_content FROM push_comments WHERE push_star_label IS NULL ORDER BY id ASC")
+    # 只選擇尚未更新推文情緒的資料 (看板 / 推噓 / 推文時間供情緒異常偵測使用)
+    cur.execute(f"""
+    SELECT p.id, p.article_id, p.push_content, s.board, {push_tag_sql("p")}, p.push_at
+    FROM push_comments p
+    LEFT JOIN sentiments s ON s.id = p.article_id
+    WHERE {push_pending_sql("p")}
+    ORDER BY p.id ASC
+    """)
     rows = cur.fetchall()
     total = len(rows)
     logging.info(f"Found {total} push comments to analyze.")
@@ -216,32 +180,48 @@ def analyze_push_comments():
         return
 
     push_ids = []
+    push_articles = []
     push_texts = []
-    for idx, (push_id, push_content) in enumerate(rows):
+    push_events = []
+    for push_id, article_id, push_content, board, push_tag, push_at in rows:
         push_ids.append(push_id)
+        push_articles.append(article_id)
         push_texts.append(push_content if push_content else "")
-        if (idx+1) % 100 == 0:
-            logging.info(f"Prepared {idx+1}/{total} push comments for analysis.")
+        push_events.append((board, push_tag, push_at))
 
-    logging.info("Start batch inference for push_comments...")
-    push_results = batch_inference(push_texts, batch_size=16)
+    push_results = batch_inference(push_texts, batch_size=16, label="Push inference")
 
-    for i, push_id in enumerate(push_ids):
-        star_label, sentiment_label, score = push_results[i]
+    if compact_enabled(cur, backend):
+        push_columns = COMPACT_PUSH_COLUMNS
+        rows = [(push_id, star_label_to_int(push_results[i][0]), push_results[i][2])
+                for i, push_id in enumerate(push_ids)]
+    else:
+        push_columns = PUSH_COLUMNS
+        rows = [(push_id,) + push_results[i] for i, push_id in enumerate(push_ids)]
+    # 推文情緒異常偵測 (見 sentiment_alerts.py)：狀態與星等同一交易寫入
+    alerts = SentimentAlerts(backend)
+    progress = ProgressReporter("Updating push comments", total, unit="rows")
+    for start in range(0, total, UPDATE_CHUNK):
+        chunk = rows[start:start + UPDATE_CHUNK]
+        # 推文平均星等改變的文章，重新計入看板統計量
+        touched = {a for a in push_articles[start:start + UPDATE_CHUNK] if a is not None}
         try:
-            update_sql = """
-            UPDATE push_comments
-            SET push_star_label=%s,
-                push_sentiment=%s,
-                push_score=%s
-            WHERE id=%s
-            """
-            cur.execute(update_sql, (star_label, sentiment_label, score, push_id))
+            with DB_WRITE_SECONDS.time(table="push_comments"), backend.transaction(conn) as wcur:
+                backend.bulk_update(wcur, "push_comments", "id", push_columns, chunk)
+                refresh_articles(wcur, touched, backend)
+                # 推文使用者索引的星等總和
+                add_push_stars(wcur, [r[0] for r in chunk], backend)
+                alerts.process(wcur, [
+                    (board, star_label_to_int(push_results[i][0]), push_tag, push_at)
+                    for i, (board, push_tag, push_at) in enumerate(push_events[start:start + UPDATE_CHUNK], start)
+                ])
         except Exception as e:
-            logging.error(f"Update push_comments failed for id={push_id}: {e}")
-        if (i+1) % 100 == 0:
-            logging.info(f"Updated {i+1}/{total} push comments.")
-    conn.commit()
+            alerts.rollback()
+            logging.error(f"Update push_comments failed for ids {chunk[0][0]}..{chunk[-1][0]}: {e}")
+        else:
+            alerts.commit()
+        progress.update(len(chunk))
+    progress.finish()
     cur.close()
     conn.close()
     logging.info("Done updating push_comments.")
@@ -250,11 +230,18 @@ def main():
     ensure_db_columns()
     analyze_sentiments_main()
     analyze_push_comments()
+    # 推論批次延遲、texts/s 與寫回耗時摘要
+    log_summary()
     logging.info("Post-sentiment batch analysis done.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch sentiment analysis of articles and push comments")
+    add_profile_argument(parser)
+    args = parser.parse_args()
     try:
-        main()
+        # --profile：熱點分析 (見 profiling.py)
+        with profiled(args.profile):
+            main()
     except Exception as e:
         logging.error(f"Main error: {e}")
         sys.exit(1)
@@ -0,0 +1,176 @@
+import os
+import io
+import sys
+import time
+import pstats
+import cProfile
+import logging
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+
+# ----------------------------
+# 爬蟲 / 推論熱點分析
+# 各入口程式支援 --profile (或環境變數 PTT_PROFILE)：
+#   cprofile  決定性分析，輸出 .prof (snakeviz / flameprof / python -m pstats 可讀) 與 top-N 報告
+#   sample    每 SAMPLE_INTERVAL 秒取樣呼叫堆疊，輸出 .folded
+#             (flamegraph.pl / speedscope / inferno 可直接讀) 與 top-N 報告
+#   always    低頻取樣 (ALWAYS_ON_INTERVAL) 並定期覆寫輸出，給長駐的正式環境使用
+#   python crawler_multi.py --profile
+#   python crawler_auto.py --profile always
+#   flamegraph.pl profiles/crawler_auto-*.folded > crawl.svg
+# 輸出目錄 PTT_PROFILE_DIR (預設 profiles/)；取樣預設只看進入 profiled() 的執行緒，
+# PTT_PROFILE_ALL_THREADS=1 時取樣所有執行緒 (閒置等待的執行緒會占去大部分取樣)
+# ----------------------------
+
+PROFILE_DIR = os.environ.get("PTT_PROFILE_DIR", "profiles")
+PROFILE_MODES = ["cprofile", "sample", "always"]
+SAMPLE_INTERVAL = 0.005
+ALWAYS_ON_INTERVAL = float(os.environ.get("PTT_PROFILE_INTERVAL", "0.1"))
+ALWAYS_ON_FLUSH_SEC = 600
+ALL_THREADS = os.environ.get("PTT_PROFILE_ALL_THREADS") == "1"
+TOP_N = 30
+
+def add_profile_argument(parser):
+    parser.add_argument("--profile", nargs="?", const="cprofile", default=os.environ.get("PTT_PROFILE"),
+                        choices=PROFILE_MODES, help="profile the run (default mode: cprofile)")
+
+def output_prefix(name):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    return os.path.join(PROFILE_DIR, f"{name}-{datetime.now():%Y%m%d-%H%M%S}")
+
+def frame_label(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+# ----------------------------
+# 取樣式分析
+# ----------------------------
+class SamplingProfiler:
+    """
+    背景執行緒定期讀取 sys._current_frames()，以折疊堆疊 ("a;b;c" -> 次數) 累計
+    成本與取樣頻率成正比，與被測程式的呼叫次數無關
+    """
+    def __init__(self, prefix, interval=SAMPLE_INTERVAL, flush_sec=None, thread_id=None):
+        self.prefix = prefix
+        # None 表示取樣所有執行緒
+        self.thread_id = thread_id
+        self.interval = interval
+        self.flush_sec = flush_sec
+        self.stacks = {}
+        self.samples = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="profiler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.write()
+
+    def sample(self):
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me or (self.thread_id is not None and ident != self.thread_id):
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.append(names.get(ident, "thread"))
+            stack = ";".join(reversed(labels))
+            with self.lock:
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        with self.lock:
+            self.samples += 1
+
+    def run(self):
+        last_flush = time.monotonic()
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+            if self.flush_sec and time.monotonic() - last_flush >= self.flush_sec:
+                self.write()
+                last_flush = time.monotonic()
+
+    def report(self, top_n=TOP_N):
+        """
+        self：堆疊最上層為該函式的取樣數；total：堆疊中含該函式的取樣數
+        """
+        with self.lock:
+            stacks = dict(self.stacks)
+        total = sum(stacks.values()) or 1
+        own, inclusive = {}, {}
+        for stack, count in stacks.items():
+            frames = stack.split(";")[1:]  # 去掉執行緒名稱
+            if not frames:
+                continue
+            own[frames[-1]] = own.get(frames[-1], 0) + count
+            for label in set(frames):
+                inclusive[label] = inclusive.get(label, 0) + count
+        lines = [f"{self.samples} samples every {self.interval * 1000:.0f}ms, {total} thread stacks",
+                 f"{'self%':>7}{'total%':>8}  function"]
+        for label, count in sorted(own.items(), key=lambda kv: -kv[1])[:top_n]:
+            lines.append(f"{count / total:>7.1%}{inclusive[label] / total:>8.1%}  {label}")
+        return "\n".join(lines)
+
+    def write(self):
+        with self.lock:
+            stacks = dict(self.stacks)
+        with open(self.prefix + ".folded", "w", encoding="utf-8") as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f"{stack} {count}\n")
+        with open(self.prefix + ".txt", "w", encoding="utf-8") as f:
+            f.write(self.report() + "\n")
+
+# ----------------------------
+# 決定性分析 (cProfile)
+# ----------------------------
+def cprofile_report(profiler, top_n=TOP_N):
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.strip_dirs()
+    out.write("== by cumulative time ==\n")
+    stats.sort_stats("cumulative").print_stats(top_n)
+    out.write("== by own time ==\n")
+    stats.sort_stats("tottime").print_stats(top_n)
+    return out.getvalue()
+
+@contextmanager
+def profiled(mode, name=None):
+    """
+    包住入口程式的主迴圈；mode 為 None 時不做任何事
+    中斷 (Ctrl-C) 時仍會寫出結果
+    """
+    if not mode:
+        yield
+        return
+    name = name or os.path.splitext(os.path.basename(sys.argv[0]))[0]
+    prefix = output_prefix(name)
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(prefix + ".prof")
+            report = cprofile_report(profiler)
+            with open(prefix + ".txt", "w", encoding="utf-8") as f:
+                f.write(report)
+            logging.info(f"Profile written to {prefix}.prof / {prefix}.txt")
+        return
+    thread_id = None if ALL_THREADS else threading.get_ident()
+    if mode == "always":
+        sampler = SamplingProfiler(prefix, ALWAYS_ON_INTERVAL, ALWAYS_ON_FLUSH_SEC, thread_id)
+    else:
+        sampler = SamplingProfiler(prefix, SAMPLE_INTERVAL, thread_id=thread_id)
+    sampler.start()
+    logging.info(f"Sampling profiler started ({mode}, every {sampler.interval * 1000:.0f}ms) -> {prefix}.folded")
+    try:
+        yield
+    finally:
+        sampler.stop()
+        logging.info(f"Profile written to {prefix}.folded / {prefix}.txt\n{sampler.report(10)}")
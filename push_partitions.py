@@ -0,0 +1,436 @@
+import os
+import sys
+import logging
+import argparse
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+from storage import get_backend
+from sqlite_db import push_shard_path, list_push_shards, write_transaction
+from compact_storage import push_pending_sql
+
+# ----------------------------
+# push_comments 依爬取月份分區 + 保留期限
+# PostgreSQL: push_comments 為 PARTITION BY RANGE (crawled_at) 的分區表，每月一個分區
+#   (push_comments_YYYYMM)；查詢帶 crawled_at 範圍時 planner 只掃描相關分區，
+#   過期分區以 DETACH PARTITION CONCURRENTLY 卸離後整個 DROP，不必逐列 DELETE。
+# SQLite: 主檔只保留最近月份的推文，已結束月份搬到 <db>_push_shards/ 下的月分片檔，
+#   讀取端自動 ATTACH 並以同名 view 合併 (見 sqlite_db.attach_push_shards)；
+#   過期月份直接刪除分片檔。
+# 卸離 / 刪除前都先把推文匯出到 Parquet 快照 (snapshot.py) 並確認已涵蓋該分區。
+#   python push_partitions.py migrate                # PG: 既有一般表轉成分區表 (一次性)
+#   python push_partitions.py ensure                 # PG: 預先建立本月與下個月分區
+#   python push_partitions.py compact                # SQLite: 已結束月份搬到分片檔
+#   python push_partitions.py retain --keep-months 6 # 歸檔並移除 6 個月前的分區 / 分片
+# ----------------------------
+
+RETENTION_MONTHS = 6
+PREMAKE_MONTHS = 1          # PG 預先建立的未來分區數
+SQLITE_HOT_MONTHS = 1       # SQLite 主檔保留本月 + 前 N 個月
+COMPACT_BATCH = 5000        # SQLite 每個寫入交易搬移的推文數，避免長時間持有寫鎖
+# 推文一定在文章發表後才被爬取；文章時間與爬取時鐘可能有誤差，下界再往前放寬
+CRAWL_LAG_SLACK = timedelta(days=1)
+
+PUSH_INDEXES = [
+    # 推文依文章查詢 / 計數
+    "CREATE INDEX IF NOT EXISTS idx_push_comments_article_id ON push_comments (article_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_push_comments_crawled_at ON push_comments (crawled_at)",
+    # 推文時間範圍查詢 (推文速率 / 每分鐘情緒)
+    "CREATE INDEX IF NOT EXISTS idx_push_comments_push_at ON push_comments (push_at)",
+]
+# 建表後才加入的欄位 (舊表以 ADD COLUMN 補上)
+PUSH_TIME_COLUMNS = [("push_ip", "TEXT"), ("push_at", "TIMESTAMP")]
+
+# ----------------------------
+# 月份工具
+# ----------------------------
+def month_start(ts):
+    return datetime(ts.year, ts.month, 1)
+
+def add_months(ts, n):
+    month = ts.month - 1 + n
+    return datetime(ts.year + month // 12, month % 12 + 1, 1)
+
+def partition_name(month):
+    return f"push_comments_{month:%Y%m}"
+
+def crawled_lower_bound(ts):
+    """
+    文章時間下界 -> 推文 crawled_at 下界，讓查詢能略過較舊的分區 / 分片
+    """
+    if ts is None:
+        return None
+    return ts - CRAWL_LAG_SLACK
+
+# ----------------------------
+# 建表 (由 schema.ensure_schema 呼叫)
+# ----------------------------
+def pg_table_kind(cur):
+    """
+    'p' = 分區表, 'r' = 一般表, None = 不存在
+    """
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('push_comments')")
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def init_push_comments(cur, backend=None):
+    backend = backend or get_backend()
+    if backend.name == "postgres":
+        kind = pg_table_kind(cur)
+        if kind is None:
+            cur.execute("""
+            CREATE TABLE push_comments (
+                id SERIAL,
+                article_id INT,
+                push_tag TEXT,
+                push_userid TEXT,
+                push_content TEXT,
+                push_time TEXT,
+                push_ip TEXT,
+                push_at TIMESTAMP,
+                crawled_at TIMESTAMP NOT NULL DEFAULT LOCALTIMESTAMP(0),
+                PRIMARY KEY (id, crawled_at),
+                CONSTRAINT fk_article FOREIGN KEY(article_id)
+                   REFERENCES sentiments(id) ON DELETE CASCADE
+            ) PARTITION BY RANGE (crawled_at);
+            """)
+            kind = "p"
+        if kind == "p":
+            ensure_partitions(cur)
+        else:
+            # 舊版一般表：先補上欄位讓爬蟲可寫入，分區轉換需另外執行 migrate
+            backend.add_column(cur, "push_comments", "crawled_at", "TIMESTAMP")
+            logging.warning("push_comments is not partitioned yet; run `python push_partitions.py migrate`.")
+    else:
+        cur.execute(backend.ddl("""
+        CREATE TABLE IF NOT EXISTS push_comments (
+            id SERIAL PRIMARY KEY,
+            article_id INT,
+            push_tag TEXT,
+            push_userid TEXT,
+            push_content TEXT,
+            push_time TEXT,
+            push_ip TEXT,
+            push_at TIMESTAMP,
+            crawled_at TIMESTAMP,
+            CONSTRAINT fk_article FOREIGN KEY(article_id)
+               REFERENCES sentiments(id) ON DELETE CASCADE
+        );
+        """))
+        backend.add_column(cur, "push_comments", "crawled_at", "TIMESTAMP")
+    for column, coltype in PUSH_TIME_COLUMNS:
+        backend.add_column(cur, "push_comments", column, coltype)
+    for statement in PUSH_INDEXES:
+        cur.execute(statement)
+    if backend.name != "postgres":
+        # 舊資料沒有爬取時間，以文章發表時間代替 (走 crawled_at 索引，補過後不再掃描)
+        cur.execute("""
+        UPDATE push_comments
+        SET crawled_at = (SELECT s.timestamp FROM sentiments s WHERE s.id = push_comments.article_id)
+        WHERE crawled_at IS NULL
+        """)
+
+# ----------------------------
+# PostgreSQL 分區
+# ----------------------------
+def ensure_partitions(cur, start=None, end=None, months_ahead=PREMAKE_MONTHS):
+    """
+    建立 start 所在月份到 max(end, 本月 + months_ahead) 的月分區 (已存在則略過)
+    """
+    now = datetime.now()
+    month = month_start(start or now)
+    last = add_months(month_start(now), months_ahead)
+    if end is not None:
+        last = max(last, month_start(end))
+    while month <= last:
+        cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF push_comments
+        FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')
+        """)
+        month = add_months(month, 1)
+
+def ensure_push_partitions(backend=None):
+    """
+    長駐爬蟲每輪呼叫，跨月時也一定有可寫入的分區
+    """
+    backend = backend or get_backend()
+    if backend.name != "postgres":
+        return
+    conn = backend.connect()
+    try:
+        with backend.transaction(conn) as cur:
+            if pg_table_kind(cur) == "p":
+                ensure_partitions(cur)
+    finally:
+        conn.close()
+
+def list_partitions(cur):
+    """
+    回傳 [(月份起點, 分區名稱), ...]，依月份排序
+    """
+    cur.execute("""
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = to_regclass('push_comments')
+    """)
+    parts = []
+    for (name,) in cur.fetchall():
+        try:
+            parts.append((datetime.strptime(name.rsplit("_", 1)[-1], "%Y%m"), name))
+        except ValueError:
+            continue
+    return sorted(parts)
+
+def migrate_pg(backend, keep_legacy=False):
+    """
+    既有的一般表轉為分區表。整個轉換在單一交易中完成，期間擋住寫入 (讀取不受影響)
+    """
+    conn = backend.connect()
+    try:
+        with backend.transaction(conn) as cur:
+            kind = pg_table_kind(cur)
+            if kind != "r":
+                logging.info("push_comments is already partitioned (or missing); nothing to migrate.")
+                return
+            cur.execute("LOCK TABLE push_comments IN SHARE ROW EXCLUSIVE MODE")
+            backend.add_column(cur, "push_comments", "crawled_at", "TIMESTAMP")
+            cur.execute("""
+            UPDATE push_comments p
+            SET crawled_at = COALESCE(s.timestamp, LOCALTIMESTAMP(0))
+            FROM sentiments s
+            WHERE s.id = p.article_id AND p.crawled_at IS NULL
+            """)
+            cur.execute("UPDATE push_comments SET crawled_at = LOCALTIMESTAMP(0) WHERE crawled_at IS NULL")
+
+            # 舊表改名 (連同索引，讓新表可沿用原本的索引名稱)
+            cur.execute("ALTER TABLE push_comments RENAME TO push_comments_legacy")
+            cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'push_comments_legacy'")
+            for (index_name,) in cur.fetchall():
+                cur.execute(f"ALTER INDEX {index_name} RENAME TO {index_name}_legacy")
+            cur.execute("SELECT pg_get_serial_sequence('push_comments_legacy', 'id')")
+            sequence = cur.fetchone()[0]
+
+            cur.execute("""
+            CREATE TABLE push_comments (LIKE push_comments_legacy INCLUDING DEFAULTS)
+            PARTITION BY RANGE (crawled_at)
+            """)
+            cur.execute("""
+            ALTER TABLE push_comments
+                ALTER COLUMN crawled_at SET NOT NULL,
+                ALTER COLUMN crawled_at SET DEFAULT LOCALTIMESTAMP(0)
+            """)
+            cur.execute("ALTER TABLE push_comments ADD PRIMARY KEY (id, crawled_at)")
+            cur.execute("""
+            ALTER TABLE push_comments ADD CONSTRAINT fk_article FOREIGN KEY(article_id)
+                REFERENCES sentiments(id) ON DELETE CASCADE
+            """)
+            cur.execute("SELECT MIN(crawled_at), MAX(crawled_at) FROM push_comments_legacy")
+            first, last = cur.fetchone()
+            ensure_partitions(cur, start=first, end=last)
+            cur.execute("INSERT INTO push_comments SELECT * FROM push_comments_legacy")
+            migrated = cur.rowcount
+            for statement in PUSH_INDEXES:
+                cur.execute(statement)
+            # id 序列改由新表擁有，刪除舊表時才不會一併被刪
+            if sequence:
+                cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY push_comments.id")
+            if not keep_legacy:
+                cur.execute("DROP TABLE push_comments_legacy")
+        logging.info(f"Migrated {migrated} push comments into monthly partitions.")
+    finally:
+        conn.close()
+
+# ----------------------------
+# SQLite 月分片
+# ----------------------------
+def compact_sqlite(backend, hot_months=SQLITE_HOT_MONTHS, batch_size=COMPACT_BATCH):
+    """
+    已結束月份的推文搬到分片檔。只搬整篇文章 (標題 / 內文 / 全部推文) 都已標籤完成的推文，
+    之後 post_sentiment 與統計量更新不會再寫到分片；最大 id 的推文留在主檔，避免 id 被重複使用
+    """
+    cutoff = add_months(month_start(datetime.now()), -hot_months)
+    conn = backend.connect()
+    try:
+        columns = [r[1] for r in conn.execute("PRAGMA main.table_info(push_comments)")]
+        col_defs = ", ".join(
+            "id INTEGER PRIMARY KEY" if name == "id" else f"{name} {coltype}"
+            for _, name, coltype, *_ in conn.execute("PRAGMA main.table_info(push_comments)")
+        )
+        months = [r[0] for r in conn.execute(
+            "SELECT DISTINCT strftime('%Y%m', crawled_at) FROM push_comments WHERE crawled_at < ?",
+            (cutoff,)
+        ) if r[0]]
+        moved_total = 0
+        for month in months:
+            lo = datetime.strptime(month, "%Y%m")
+            hi = add_months(lo, 1)
+            shard_path = push_shard_path(month, backend.path)
+            os.makedirs(os.path.dirname(shard_path), exist_ok=True)
+            conn.execute("ATTACH DATABASE ? AS shard", (shard_path,))
+            try:
+                conn.execute("PRAGMA shard.journal_mode=WAL")
+                conn.execute(f"CREATE TABLE IF NOT EXISTS shard.push_comments ({col_defs})")
+                # 分片建立後主表才新增的欄位
+                shard_cols = {r[1] for r in conn.execute("PRAGMA shard.table_info(push_comments)")}
+                for _, name, coltype, *_ in conn.execute("PRAGMA main.table_info(push_comments)").fetchall():
+                    if name not in shard_cols:
+                        conn.execute(f"ALTER TABLE shard.push_comments ADD COLUMN {name} {coltype}")
+                conn.execute("CREATE INDEX IF NOT EXISTS shard.idx_push_comments_article_id "
+                             "ON push_comments (article_id, id)")
+                conn.execute("CREATE INDEX IF NOT EXISTS shard.idx_push_comments_crawled_at "
+                             "ON push_comments (crawled_at)")
+                conn.execute("CREATE INDEX IF NOT EXISTS shard.idx_push_comments_push_at "
+                             "ON push_comments (push_at)")
+                select_ids = f"""
+                SELECT p.id FROM main.push_comments p
+                JOIN main.sentiments s ON s.id = p.article_id
+                WHERE p.crawled_at >= :lo AND p.crawled_at < :hi
+                  AND s.title_star_label IS NOT NULL AND s.content_star_label IS NOT NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM main.push_comments q
+                      WHERE q.article_id = p.article_id AND {push_pending_sql("q")}
+                  )
+                  AND p.id < (SELECT MAX(id) FROM main.push_comments)
+                ORDER BY p.id
+                LIMIT :batch
+                """
+                params = {"lo": lo, "hi": hi, "batch": batch_size}
+                moved = 0
+                while True:
+                    # 每批一個短交易，爬蟲與 post_sentiment 可在批次之間寫入
+                    with write_transaction(conn):
+                        cur = conn.execute(f"""
+                        INSERT OR REPLACE INTO shard.push_comments ({', '.join(columns)})
+                        SELECT {', '.join(columns)} FROM main.push_comments
+                        WHERE id IN ({select_ids})
+                        """, params)
+                        if cur.rowcount <= 0:
+                            break
+                        conn.execute(f"DELETE FROM main.push_comments WHERE id IN ({select_ids})", params)
+                        moved += cur.rowcount
+                logging.info(f"Compacted {moved} push comments of {month} into {shard_path}.")
+                moved_total += moved
+            finally:
+                conn.execute("DETACH DATABASE shard")
+        return moved_total
+    finally:
+        conn.close()
+
+# ----------------------------
+# 保留期限：先歸檔到 Parquet 快照，再移除過期分區 / 分片
+# ----------------------------
+def archived_push_id():
+    from snapshot import load_state
+
+    return load_state().get("push_comments", {}).get("last_id", 0)
+
+def archive_pushes(backend):
+    from snapshot import export_snapshot
+
+    export_snapshot(tables=("push_comments",), backend=backend)
+    return archived_push_id()
+
+def retain_pg(backend, keep_months=RETENTION_MONTHS, archive=True, dry_run=False):
+    cutoff = add_months(month_start(datetime.now()), -keep_months)
+    conn = backend.connect()
+    try:
+        with backend.transaction(conn) as cur:
+            expired = [name for month, name in list_partitions(cur) if add_months(month, 1) <= cutoff]
+        if not expired:
+            logging.info(f"No push partitions older than {cutoff:%Y-%m}.")
+            return []
+        archived_id = archive_pushes(backend) if archive and not dry_run else None
+
+        # DETACH ... CONCURRENTLY 不能在交易區塊內執行
+        conn.autocommit = True
+        cur = conn.cursor()
+        dropped = []
+        for name in expired:
+            cur.execute(f"SELECT MAX(id) FROM {name}")
+            max_id = cur.fetchone()[0]
+            if archived_id is not None and max_id is not None and max_id > archived_id:
+                logging.error(f"{name}: snapshot only covers id <= {archived_id} (partition max {max_id}), keeping it.")
+                continue
+            if dry_run:
+                logging.info(f"[dry-run] would detach and drop {name} (max id {max_id}).")
+                continue
+            # 只對父表取 SHARE UPDATE EXCLUSIVE 鎖，查詢與寫入可繼續進行
+            cur.execute(f"ALTER TABLE push_comments DETACH PARTITION {name} CONCURRENTLY")
+            cur.execute(f"DROP TABLE {name}")
+            dropped.append(name)
+            logging.info(f"Detached and dropped partition {name}.")
+        cur.close()
+        return dropped
+    finally:
+        conn.close()
+
+def retain_sqlite(backend, keep_months=RETENTION_MONTHS, archive=True, dry_run=False):
+    cutoff = f"{add_months(month_start(datetime.now()), -keep_months):%Y%m}"
+    expired = [(month, path) for month, path in list_push_shards(backend.path) if month < cutoff]
+    if not expired:
+        logging.info(f"No push shards older than {cutoff}.")
+        return []
+    archived_id = archive_pushes(backend) if archive and not dry_run else None
+    removed = []
+    for month, path in expired:
+        conn = backend.connect(readonly=True, attach_shards=False)
+        try:
+            conn.execute("ATTACH DATABASE ? AS shard", (f"file:{quote(os.path.abspath(path))}?mode=ro",))
+            max_id = conn.execute("SELECT MAX(id) FROM shard.push_comments").fetchone()[0]
+        finally:
+            conn.close()
+        if archived_id is not None and max_id is not None and max_id > archived_id:
+            logging.error(f"{path}: snapshot only covers id <= {archived_id} (shard max {max_id}), keeping it.")
+            continue
+        if dry_run:
+            logging.info(f"[dry-run] would remove {path} (max id {max_id}).")
+            continue
+        # 已開啟的讀取端仍持有檔案，下次連線起就不再附加
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        removed.append(month)
+        logging.info(f"Removed push shard {path}.")
+    return removed
+
+# ----------------------------
+# CLI
+# ----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="push_comments partition maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_migrate = sub.add_parser("migrate", help="PostgreSQL: convert push_comments into a partitioned table")
+    p_migrate.add_argument("--keep-legacy", action="store_true", help="keep push_comments_legacy after copying")
+    sub.add_parser("ensure", help="PostgreSQL: create the current and upcoming monthly partitions")
+    p_compact = sub.add_parser("compact", help="SQLite: move closed months into shard files")
+    p_compact.add_argument("--hot-months", type=int, default=SQLITE_HOT_MONTHS)
+    p_compact.add_argument("--batch-size", type=int, default=COMPACT_BATCH)
+    p_retain = sub.add_parser("retain", help="archive to Parquet and drop old partitions / shards")
+    p_retain.add_argument("--keep-months", type=int, default=RETENTION_MONTHS)
+    p_retain.add_argument("--no-archive", action="store_true", help="skip the Parquet export and coverage check")
+    p_retain.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    backend = get_backend()
+    if args.command == "migrate":
+        if backend.name != "postgres":
+            parser.error("migrate only applies to PostgreSQL; use compact for SQLite")
+        migrate_pg(backend, keep_legacy=args.keep_legacy)
+    elif args.command == "ensure":
+        ensure_push_partitions(backend)
+    elif args.command == "compact":
+        if backend.name != "sqlite":
+            parser.error("compact only applies to SQLite; PostgreSQL partitions by month natively")
+        compact_sqlite(backend, hot_months=args.hot_months, batch_size=args.batch_size)
+    else:
+        retain = retain_pg if backend.name == "postgres" else retain_sqlite
+        retain(backend, keep_months=args.keep_months, archive=not args.no_archive, dry_run=args.dry_run)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    try:
+        main()
+    except Exception as e:
+        logging.error(f"Partition maintenance error: {e}")
+        sys.exit(1)
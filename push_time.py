@@ -0,0 +1,132 @@
+import re
+import sys
+import logging
+from datetime import datetime, timedelta
+
+from storage import get_backend
+from sqlite_db import list_push_shards
+
+# ----------------------------
+# 推文時間解析
+# push-ipdatetime 原文為 "1.2.3.4 03/10 21:55" (IP 可能省略、舊文章可能只有日期)，
+# 拆成 push_ip (TEXT) 與 push_at (TIMESTAMP) 兩欄，push_at 有索引可做時間範圍查詢。
+# 原始 push_time 字串仍保留。
+#   python push_time.py                    # 回填既有推文的 push_ip / push_at
+#   python push_time.py --batch-size 20000
+# ----------------------------
+
+PUSH_TIME_RE = re.compile(
+    r"(?:(?P<ip>\d{1,3}(?:\.\d{1,3}){3})\s+)?"
+    r"(?P<month>\d{1,2})/(?P<day>\d{1,2})"
+    r"(?:\s+(?P<hour>\d{1,2}):(?P<minute>\d{2}))?"
+)
+# 推文時間只到分鐘，且可能與文章時間有些微時鐘誤差；早於文章這麼多才視為跨年
+ROLLOVER_SLACK = timedelta(days=1)
+BACKFILL_BATCH = 5000
+
+def parse_push_time(raw, article_ts=None):
+    """
+    回傳 (push_ip, push_at)，無法解析的部分為 None。
+    推文只有月/日，年份由文章時間推算；比文章時間早者為跨年後 (例如 12/31 的文章、01/02 的推文)。
+    沒有文章時間時以現在時間推算，晚於現在者視為去年
+    """
+    if not raw:
+        return None, None
+    m = PUSH_TIME_RE.search(raw)
+    if not m:
+        return None, None
+    ip = m.group("ip")
+    month, day = int(m.group("month")), int(m.group("day"))
+    hour = int(m.group("hour")) if m.group("hour") else 0
+    minute = int(m.group("minute")) if m.group("minute") else 0
+
+    if not isinstance(article_ts, datetime):
+        # 文章時間缺漏 (或 SQLite 中無法轉型的舊字串)
+        article_ts = None
+    reference = article_ts or datetime.now()
+    # 由早到晚取第一個不早於文章時間的年份 (文章 01/01 00:10、推文 12/31 23:59 為前一年的時鐘誤差)
+    candidates = (reference.year - 1, reference.year, reference.year + 1) if article_ts \
+        else (reference.year, reference.year - 1)
+    for year in candidates:
+        try:
+            push_at = datetime(year, month, day, hour, minute)
+        except ValueError:
+            # 02/29 只存在於閏年，或月日本身不合法
+            continue
+        if article_ts and push_at < article_ts - ROLLOVER_SLACK:
+            continue
+        if not article_ts and push_at > reference + ROLLOVER_SLACK:
+            continue
+        return ip, push_at
+    return ip, None
+
+# ----------------------------
+# 回填既有推文
+# ----------------------------
+def backfill_table(conn, table, backend, batch_size=BACKFILL_BATCH):
+    """
+    依 id 遞增逐批處理 push_at 仍為 NULL 的推文，每批一個交易
+    """
+    last_id = 0
+    total = 0
+    while True:
+        with backend.transaction(conn) as cur:
+            backend.execute(cur, f"""
+            SELECT p.id, p.push_time, s.timestamp
+            FROM {table} p
+            LEFT JOIN sentiments s ON s.id = p.article_id
+            WHERE p.id > %s AND p.push_at IS NULL AND p.push_time IS NOT NULL
+            ORDER BY p.id
+            LIMIT %s
+            """, (last_id, batch_size))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            updates = []
+            for push_id, raw, article_ts in rows:
+                ip, push_at = parse_push_time(raw, article_ts)
+                if push_at is not None:
+                    updates.append((push_id, ip, push_at))
+            backend.bulk_update(cur, table, "id", ["push_ip", "push_at"], updates)
+        last_id = rows[-1][0]
+        total += len(updates)
+        logging.info(f"{table}: parsed {total} push times (up to id {last_id}).")
+    return total
+
+def backfill_push_times(batch_size=BACKFILL_BATCH, backend=None):
+    backend = backend or get_backend()
+    conn = backend.connect()
+    try:
+        tables = ["push_comments"]
+        if backend.name == "sqlite":
+            # 已搬到月分片的推文也一併回填
+            for month, shard_path in list_push_shards(backend.path):
+                alias = f"push_{month}"
+                conn.execute(f"ATTACH DATABASE ? AS {alias}", (shard_path,))
+                tables.append(f"{alias}.push_comments")
+        with backend.transaction(conn) as cur:
+            for table in tables:
+                backend.add_column(cur, table, "push_ip", "TEXT")
+                backend.add_column(cur, table, "push_at", "TIMESTAMP")
+                if "." in table:
+                    schema = table.split(".")[0]
+                    cur.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_push_comments_push_at "
+                                "ON push_comments (push_at)")
+        total = sum(backfill_table(conn, table, backend, batch_size) for table in tables)
+    finally:
+        conn.close()
+    logging.info(f"Push time backfill done: {total} rows updated.")
+    return total
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Backfill push_ip / push_at from the raw push_time text")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH)
+    args = parser.parse_args()
+    try:
+        backfill_push_times(batch_size=args.batch_size)
+    except Exception as e:
+        logging.error(f"Push time backfill error: {e}")
+        sys.exit(1)
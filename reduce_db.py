@@ -0,0 +1,183 @@
+import os
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+
+from sqlite_db import list_push_shards
+
+# ----------------------------
+# 縮減版 SQLite 資料庫產生器 (取代 test2.py 的整表 pandas 抽樣)
+# 全部在 SQLite 內完成：
+#   1. ATTACH 原始資料庫
+#   2. sentiments 依 (board, 日期) 分層，層內以 id 的雜湊排序取前 ceil(n * fraction) 篇
+#   3. push_comments 以 JOIN 已抽出的文章串流複製，再以 id 雜湊抽 push_fraction；
+#      已搬到推文月分片 (<db>_push_shards/，見 push_partitions.py) 的推文逐一 ATTACH 分片後同樣複製
+# 抽樣結果只由 seed 決定，可重現；記憶體用量與資料量無關 (排序走 temp 檔)
+# ----------------------------
+
+SOURCE_DB = "ptt_data.db"
+TARGET_DB = "ptt_data_reduced.db"
+
+# Knuth multiplicative hash，映射到 [0, 2^32)
+HASH_MULT = 2654435761
+HASH_MOD = 4294967296
+TABLES = ("sentiments", "push_comments")
+
+def id_hash_sql(col, seed_param=":seed"):
+    return f"((({col}) + {seed_param}) * {HASH_MULT}) % {HASH_MOD}"
+
+def table_columns(conn, schema, table):
+    return [r[1] for r in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+def select_list(columns, alias, truncate, available=None):
+    """
+    truncate: {欄位: 保留字數}，在 SQL 端以 substr 截斷
+    available: 來源實際有的欄位 (分片建立後主表才新增的欄位以 NULL 補齊)
+    """
+    items = []
+    for col in columns:
+        if available is not None and col not in available:
+            items.append(f"NULL AS {col}")
+        elif truncate.get(col):
+            items.append(f"substr({alias}.{col}, 1, {int(truncate[col])}) AS {col}")
+        else:
+            items.append(f"{alias}.{col}")
+    return ", ".join(items)
+
+def copy_pushes(conn, schema, push_cols, push_chars, params):
+    """
+    schema: 推文來源 (src 主檔或 ATTACH 的分片)
+    """
+    push_select = select_list(push_cols, "p", {"push_content": push_chars},
+                              set(table_columns(conn, schema, "push_comments")))
+    conn.execute(f"""
+    INSERT INTO main.push_comments ({", ".join(push_cols)})
+    SELECT {push_select}
+    FROM {schema}.push_comments p
+    JOIN main.sentiments s ON s.id = p.article_id
+    WHERE {id_hash_sql("p.id")} < :push_threshold
+    """, params)
+    conn.commit()
+
+def build_reduced_db(source=SOURCE_DB, target=TARGET_DB, fraction=1 / 3, push_fraction=1 / 3,
+                     content_chars=100, push_chars=50, seed=42, vacuum=False):
+    """
+    回傳 (文章數, 推文數)
+    """
+    if not os.path.exists(source):
+        raise FileNotFoundError(source)
+    if os.path.exists(target):
+        os.remove(target)
+
+    start = time.time()
+    conn = sqlite3.connect(target)
+    # 新建的目標檔失敗就重跑，不需要 journal；排序用的暫存放在檔案以限制記憶體
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA temp_store=FILE")
+    conn.execute("PRAGMA cache_size=-65536")
+    conn.execute("ATTACH DATABASE ? AS src", (source,))
+
+    # 沿用原始資料表結構
+    for table in TABLES:
+        row = conn.execute(
+            "SELECT sql FROM src.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        if row is None:
+            raise RuntimeError(f"Source database has no table {table}")
+        conn.execute(row[0])
+
+    params = {"seed": seed, "fraction": fraction, "push_threshold": int(push_fraction * HASH_MOD)}
+
+    # (1) 文章：分層 + 雜湊排序，每層保留 ceil(cnt * fraction) 篇
+    sent_cols = table_columns(conn, "src", "sentiments")
+    sent_select = select_list(sent_cols, "t", {"content": content_chars})
+    conn.execute(f"""
+    INSERT INTO main.sentiments ({", ".join(sent_cols)})
+    SELECT {sent_select}
+    FROM (
+        SELECT s.*,
+               ROW_NUMBER() OVER (
+                   PARTITION BY s.board, date(s.timestamp)
+                   ORDER BY {id_hash_sql("s.id")}, s.id
+               ) AS _rn,
+               COUNT(*) OVER (PARTITION BY s.board, date(s.timestamp)) AS _cnt
+        FROM src.sentiments s
+    ) t
+    WHERE t._rn - 1 < t._cnt * :fraction
+    """, params)
+    conn.commit()
+    n_articles = conn.execute("SELECT COUNT(*) FROM main.sentiments").fetchone()[0]
+    logging.info(f"Sampled {n_articles} articles ({time.time() - start:.1f}s).")
+
+    # (2) 推文：掃描原始推文 (主檔 + 各月分片) 並以主鍵查找已抽出的文章，逐列寫入
+    push_cols = table_columns(conn, "src", "push_comments")
+    copy_pushes(conn, "src", push_cols, push_chars, params)
+    # 一次只 ATTACH 一個分片，不受 ATTACH 數量上限限制
+    for month, shard_path in list_push_shards(source):
+        conn.execute("ATTACH DATABASE ? AS shard", (shard_path,))
+        try:
+            copy_pushes(conn, "shard", push_cols, push_chars, params)
+        finally:
+            conn.execute("DETACH DATABASE shard")
+        logging.info(f"Copied push comments from shard {month}.")
+    n_pushes = conn.execute("SELECT COUNT(*) FROM main.push_comments").fetchone()[0]
+    logging.info(f"Sampled {n_pushes} push comments ({time.time() - start:.1f}s).")
+
+    # 壓縮儲存 (compact_storage.py) 的內文無法在 SQL 端截斷，原樣複製並帶上解碼用的字典
+    row = conn.execute("SELECT sql FROM src.sqlite_master WHERE type = 'table' AND name = 'content_dicts'").fetchone()
+    if row is not None:
+        conn.execute(row[0])
+        conn.execute("INSERT INTO main.content_dicts SELECT * FROM src.content_dicts")
+        conn.commit()
+
+    # (3) 資料載入後才建索引
+    indexes = conn.execute("""
+    SELECT sql FROM src.sqlite_master
+    WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN (?, ?)
+    """, TABLES).fetchall()
+    for (sql,) in indexes:
+        conn.execute(sql)
+    conn.commit()
+    conn.execute("DETACH DATABASE src")
+
+    # 目標檔是新建且只有 INSERT，通常沒有空頁可回收；需要時再 VACUUM
+    if vacuum:
+        conn.execute("VACUUM")
+    conn.close()
+    logging.info(f"Reduced database written to {target} in {time.time() - start:.1f}s.")
+    return n_articles, n_pushes
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a reduced, deterministic sample of ptt_data.db")
+    parser.add_argument("--source", default=SOURCE_DB)
+    parser.add_argument("--target", default=TARGET_DB)
+    parser.add_argument("--fraction", type=float, default=1 / 3, help="fraction of articles per (board, date)")
+    parser.add_argument("--push-fraction", type=float, default=1 / 3, help="fraction of pushes of sampled articles")
+    parser.add_argument("--content-chars", type=int, default=100, help="truncate content (0 = keep full text)")
+    parser.add_argument("--push-chars", type=int, default=50, help="truncate push_content (0 = keep full text)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--vacuum", action="store_true")
+    args = parser.parse_args()
+
+    n_articles, n_pushes = build_reduced_db(
+        source=args.source,
+        target=args.target,
+        fraction=args.fraction,
+        push_fraction=args.push_fraction,
+        content_chars=args.content_chars,
+        push_chars=args.push_chars,
+        seed=args.seed,
+        vacuum=args.vacuum,
+    )
+    print(f"已生成減少後的資料庫 {args.target}，sentiments 記錄數: {n_articles}, push_comments 記錄數: {n_pushes}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    try:
+        main()
+    except Exception as e:
+        logging.error(f"Reduce DB error: {e}")
+        sys.exit(1)
@@ -0,0 +1,237 @@
+import sys
+import random
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import requests
+
+from storage import get_backend
+from metrics import RETRY_QUEUE_DEPTH
+
+# ----------------------------
+# 文章抓取失敗的重試佇列
+# 抓取內文失敗 (逾時、5xx) 時不寫入空文章，改記錄到 fetch_retry_queue，
+# 以指數退避安排下次重試；重試 worker 與一般爬取同時執行 (背景執行緒)。
+# 404 / 410 (文章已刪除) 不再重試，保留紀錄供查閱。
+#   python retry_queue.py            # 佇列狀態
+#   python retry_queue.py --drain    # 立即處理所有到期項目
+# ----------------------------
+
+RETRY_BASE_DELAY = timedelta(minutes=1)
+RETRY_MAX_DELAY = timedelta(hours=6)
+MAX_ATTEMPTS = 8
+RETRY_BATCH = 50
+RETRY_POLL_SEC = 30        # 佇列為空時的輪詢間隔
+RETRY_FETCH_SEC = 1        # 兩次重試抓取之間的間隔，避免對 PTT 造成額外負擔
+PERMANENT_STATUS = {404, 410}
+
+def init_retry_queue(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS fetch_retry_queue (
+        link TEXT PRIMARY KEY,
+        board TEXT,
+        title TEXT,
+        attempts INT NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMP,
+        last_error TEXT,
+        first_failed_at TIMESTAMP
+    );
+    """)
+    # next_attempt_at 為 NULL 表示已放棄
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_fetch_retry_queue_next ON fetch_retry_queue (next_attempt_at)")
+
+def is_permanent_error(error):
+    response = getattr(error, "response", None)
+    return isinstance(error, requests.HTTPError) and response is not None \
+        and response.status_code in PERMANENT_STATUS
+
+def backoff_delay(attempts):
+    """
+    第 n 次失敗後等待 base * 2^(n-1)，上限 RETRY_MAX_DELAY，加上 ±20% 抖動避免同時重試
+    """
+    delay = min(RETRY_BASE_DELAY * (2 ** (attempts - 1)), RETRY_MAX_DELAY)
+    return delay * random.uniform(0.8, 1.2)
+
+def record_failure(link, board, title, error, backend=None, keep_schedule=False):
+    """
+    記錄一次抓取失敗並安排下次重試；回傳目前的失敗次數
+    keep_schedule: 一般爬取遇到已在佇列中等待重試的連結時只更新錯誤訊息，
+    不累加次數也不重設下次重試時間 (退避排程由重試 worker 負責)
+    """
+    backend = backend or get_backend()
+    now = datetime.now().replace(microsecond=0)
+    conn = backend.connect()
+    try:
+        with backend.transaction(conn) as cur:
+            backend.execute(cur, "SELECT attempts, next_attempt_at FROM fetch_retry_queue WHERE link = %s", (link,))
+            row = cur.fetchone()
+            if keep_schedule and row and row[1] is not None:
+                backend.execute(cur, "UPDATE fetch_retry_queue SET last_error = %s WHERE link = %s",
+                                (str(error)[:500], link))
+                logging.debug(f"{link} already queued for retry #{row[0] + 1} at {row[1]}.")
+                return row[0]
+            attempts = (row[0] if row else 0) + 1
+            if is_permanent_error(error) or attempts >= MAX_ATTEMPTS:
+                next_at = None
+            else:
+                next_at = (now + backoff_delay(attempts)).replace(microsecond=0)
+            backend.upsert(
+                cur, "fetch_retry_queue",
+                ["link", "board", "title", "attempts", "next_attempt_at", "last_error", "first_failed_at"],
+                ["link"],
+                [(link, board, title, attempts, next_at, str(error)[:500], now)],
+                update="attempts = EXCLUDED.attempts, next_attempt_at = EXCLUDED.next_attempt_at, "
+                       "last_error = EXCLUDED.last_error"
+            )
+    finally:
+        conn.close()
+    if next_at is None:
+        logging.warning(f"Giving up on {link} after {attempts} attempts: {error}")
+    else:
+        logging.info(f"Queued {link} for retry #{attempts} at {next_at}.")
+    return attempts
+
+def due_retries(limit=RETRY_BATCH, backend=None):
+    """
+    回傳到期的 [(link, board, title, attempts), ...]
+    """
+    backend = backend or get_backend()
+    conn = backend.connect()
+    try:
+        cur = conn.cursor()
+        backend.execute(cur, """
+        SELECT link, board, title, attempts FROM fetch_retry_queue
+        WHERE next_attempt_at IS NOT NULL AND next_attempt_at <= %s
+        ORDER BY next_attempt_at
+        LIMIT %s
+        """, (datetime.now(), limit))
+        rows = cur.fetchall()
+        cur.close()
+        return rows
+    finally:
+        conn.close()
+
+def queue_depth(backend=None):
+    """
+    尚未放棄的項目數 (含未到期)
+    """
+    backend = backend or get_backend()
+    df = backend.read_sql("SELECT COUNT(*) AS cnt FROM fetch_retry_queue WHERE next_attempt_at IS NOT NULL")
+    return int(df["cnt"].iloc[0])
+
+def discard_retry(cur, link, backend=None):
+    """
+    在呼叫端的交易內移出佇列 (爬蟲寫入文章時一併執行，連結不在佇列中也只是一次主鍵查詢)
+    """
+    backend = backend or get_backend()
+    backend.execute(cur, "DELETE FROM fetch_retry_queue WHERE link = %s", (link,))
+
+def remove_retry(link, backend=None):
+    backend = backend or get_backend()
+    conn = backend.connect()
+    try:
+        with backend.transaction(conn) as cur:
+            discard_retry(cur, link, backend)
+    finally:
+        conn.close()
+
+# ----------------------------
+# 重試 worker
+# fetch(link) -> (post_time, content, push_list)，失敗時丟出例外
+# save(post_time, board, title, content, link, push_list) -> "saved" / "duplicate" / "failed"
+#   回傳 "saved" 時 save 已在文章交易內以 discard_retry 移出佇列
+# ----------------------------
+def drain_once(fetch, save, stop_event=None, backend=None):
+    """
+    處理目前到期的項目，回傳處理筆數
+    """
+    backend = backend or get_backend()
+    items = due_retries(backend=backend)
+    for link, board, title, attempts in items:
+        if stop_event is not None and stop_event.is_set():
+            break
+        try:
+            post_time, content, push_list = fetch(link)
+        except Exception as e:
+            record_failure(link, board, title, e, backend)
+        else:
+            # 一般爬取可能已先寫入同一篇，save 會以重複文章略過；寫入失敗時留在佇列繼續退避
+            status = save(post_time, board, title, content, link, push_list)
+            if status == "failed":
+                record_failure(link, board, title, RuntimeError("saving article failed"), backend)
+            else:
+                if status == "duplicate":
+                    remove_retry(link, backend)
+                logging.info(f"Retry succeeded after {attempts} failed attempts: {link}")
+        if stop_event is not None:
+            stop_event.wait(RETRY_FETCH_SEC)
+    return len(items)
+
+def run_retry_worker(fetch, save, stop_event, backend=None):
+    backend = backend or get_backend()
+    logging.info("Retry worker started.")
+    while not stop_event.is_set():
+        try:
+            RETRY_QUEUE_DEPTH.set(queue_depth(backend))
+            processed = drain_once(fetch, save, stop_event, backend)
+        except Exception as e:
+            logging.error(f"Retry worker error: {e}")
+            processed = 0
+        if not processed:
+            stop_event.wait(RETRY_POLL_SEC)
+    logging.info("Retry worker stopped.")
+
+def start_retry_worker(fetch, save, backend=None):
+    """
+    以背景執行緒啟動 worker，回傳 (thread, stop_event)
+    """
+    stop_event = threading.Event()
+    thread = threading.Thread(target=run_retry_worker, args=(fetch, save, stop_event, backend),
+                              name="retry-worker", daemon=True)
+    thread.start()
+    return thread, stop_event
+
+# ----------------------------
+# CLI
+# ----------------------------
+def print_status(backend):
+    df = backend.read_sql("""
+    SELECT CASE WHEN next_attempt_at IS NULL THEN 'gave_up' ELSE 'pending' END AS state,
+           COUNT(*) AS cnt, MIN(next_attempt_at) AS next_due, MAX(attempts) AS max_attempts
+    FROM fetch_retry_queue
+    GROUP BY CASE WHEN next_attempt_at IS NULL THEN 'gave_up' ELSE 'pending' END
+    """)
+    print(df.to_string(index=False) if not df.empty else "Retry queue is empty.")
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Failed article fetch retry queue")
+    parser.add_argument("--drain", action="store_true", help="retry every due item now")
+    args = parser.parse_args()
+
+    backend = get_backend()
+    conn = backend.connect()
+    with backend.transaction(conn) as cur:
+        init_retry_queue(cur)
+    conn.close()
+    if args.drain:
+        from crawler_auto import fetch_content_and_push, save_article_and_push
+
+        total = 0
+        while True:
+            processed = drain_once(fetch_content_and_push, save_article_and_push, threading.Event(), backend)
+            total += processed
+            if processed < RETRY_BATCH:
+                break
+        logging.info(f"Drained {total} due retries.")
+    print_status(backend)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    try:
+        main()
+    except Exception as e:
+        logging.error(f"Retry queue error: {e}")
+        sys.exit(1)
@@ -0,0 +1,81 @@
+import sys
+import logging
+
+from storage import get_backend
+from push_partitions import init_push_comments
+from term_index import init_term_index
+from search_index import init_search_index
+from user_index import init_user_index
+from compact_storage import init_compact_storage
+from stats_engine import init_stats_tables
+from sentiment_alerts import init_alert_tables
+from trending import init_trending
+from retry_queue import init_retry_queue
+
+# ----------------------------
+# 資料表結構
+# 爬蟲 (init_db)、post_sentiment (ensure_db_columns) 與 dashboard 啟動時都呼叫 ensure_schema，
+# 建表 / 補欄位皆為冪等；舊資料庫升級後不論先啟動哪個程式都會補齊新欄位
+# ----------------------------
+
+# post_sentiment 寫回的情緒欄位
+SENTIMENT_COLUMNS = [
+    "title_star_label", "title_sentiment", "title_score",
+    "content_star_label", "content_sentiment", "content_score",
+]
+PUSH_COLUMNS = ["push_star_label", "push_sentiment", "push_score"]
+
+def label_column_type(col):
+    return "DOUBLE PRECISION" if col.endswith("_score") else "TEXT"
+
+def init_sentiments(cur, backend=None):
+    backend = backend or get_backend()
+    cur.execute(backend.ddl("""
+    CREATE TABLE IF NOT EXISTS sentiments (
+        id SERIAL PRIMARY KEY,
+        timestamp TIMESTAMP,
+        board TEXT,
+        title TEXT,
+        content TEXT,
+        link TEXT UNIQUE
+    );
+    """))
+    # dashboard 文章列表以 (timestamp, id) 做 keyset 分頁
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sentiments_ts_id ON sentiments (timestamp DESC, id DESC)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sentiments_board_ts_id ON sentiments (board, timestamp DESC, id DESC)")
+
+def init_schema(cur, backend=None):
+    backend = backend or get_backend()
+    init_sentiments(cur, backend)
+    # 推文表依爬取月份分區 (PG) / 月分片 (SQLite)，含 push_ip / push_at / crawled_at，見 push_partitions.py
+    init_push_comments(cur, backend)
+    for col in SENTIMENT_COLUMNS:
+        backend.add_column(cur, "sentiments", col, label_column_type(col))
+    for col in PUSH_COLUMNS:
+        backend.add_column(cur, "push_comments", col, label_column_type(col))
+    init_term_index(cur)
+    init_search_index(cur, backend)
+    init_user_index(cur)
+    init_compact_storage(cur, backend)
+    init_stats_tables(cur)
+    init_alert_tables(cur, backend)
+    init_trending(cur)
+    init_retry_queue(cur)
+
+def ensure_schema(backend=None):
+    backend = backend or get_backend()
+    conn = backend.connect()
+    try:
+        with backend.transaction(conn) as cur:
+            init_schema(cur, backend)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    try:
+        ensure_schema()
+        logging.info("Schema is up to date.")
+    except Exception as e:
+        logging.error(f"Schema update failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,263 @@
+import re
+import sys
+import html
+import logging
+import argparse
+
+from storage import get_backend
+from compact_storage import decode_content_rows
+
+# ----------------------------
+# 全文檢索索引 (標題 / 內文 / 推文)
+# 中文沒有空白分詞，寫入與查詢都先轉成「中文雙字詞 (bigram) + 英數單字」的詞串，
+# 再交給各引擎原生的全文索引：
+#   SQLite: FTS5 contentless 虛擬表 article_fts (rowid = 文章 id)，bm25 排序
+#   PG:     article_search.doc tsvector ('simple' 設定，標題 / 內文 / 推文分別加權 A / B / C)
+#           + GIN 索引，ts_rank_cd 排序
+# 查詢的每個詞轉成相鄰 bigram 的片語 (phrase)，多個詞之間為 AND；單一中文字以前綴比對。
+# 爬蟲寫入文章時在同一交易內呼叫 index_article()，不需要另外排程重建。
+#   python search_index.py rebuild          # 首次導入或調整斷詞規則後全量重建
+#   python search_index.py query 台積電 外資
+# ----------------------------
+
+CJK_RUN_RE = re.compile(r"[一-鿿㐀-䶿]+")
+WORD_RE = re.compile(r"[a-z0-9]+")
+TOKEN_RE = re.compile(r"[一-鿿㐀-䶿]+|[a-z0-9]+")
+# bm25 / setweight 欄位權重：標題 > 內文 > 推文
+SQLITE_WEIGHTS = (3.0, 1.0, 0.5)
+REBUILD_BATCH = 2000
+# 結果總數只數到此值，超過時顯示「超過 N 筆」，避免熱門詞每次都掃完所有命中
+COUNT_CAP = 1000
+
+# ----------------------------
+# 斷詞
+# ----------------------------
+def tokenize(text):
+    """
+    中文連續字串 -> 重疊 bigram (單字則保留單字)；英數字轉小寫後整詞保留
+    """
+    if not text:
+        return []
+    tokens = []
+    for run in TOKEN_RE.findall(text.lower()):
+        if CJK_RUN_RE.fullmatch(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+def token_text(text):
+    return " ".join(tokenize(text))
+
+def query_terms(query):
+    """
+    使用者輸入 -> 詞列表 (每個詞為 bigram 列表，單一中文字另標記為前綴)
+    """
+    terms = []
+    for run in TOKEN_RE.findall((query or "").lower()):
+        tokens = tokenize(run)
+        if tokens:
+            terms.append((tokens, len(run) == 1 and bool(CJK_RUN_RE.fullmatch(run))))
+    return terms
+
+def fts5_query(query):
+    parts = []
+    for tokens, prefix in query_terms(query):
+        if prefix:
+            parts.append(f'"{tokens[0]}"*')
+        else:
+            parts.append('"' + " ".join(tokens) + '"')
+    return " AND ".join(parts)
+
+def tsquery(query):
+    parts = []
+    for tokens, prefix in query_terms(query):
+        if prefix:
+            parts.append(f"'{tokens[0]}':*")
+        else:
+            parts.append("(" + " <-> ".join(f"'{t}'" for t in tokens) + ")")
+    return " & ".join(parts)
+
+# ----------------------------
+# 建表 (由 schema.ensure_schema 呼叫)
+# ----------------------------
+def init_search_index(cur, backend=None):
+    backend = backend or get_backend()
+    if backend.name == "postgres":
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS article_search (
+            article_id INT PRIMARY KEY REFERENCES sentiments(id) ON DELETE CASCADE,
+            doc TSVECTOR NOT NULL
+        );
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_article_search_doc ON article_search USING GIN (doc)")
+    else:
+        # contentless：只存倒排索引，原文由 sentiments / push_comments 提供
+        cur.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS article_fts
+        USING fts5(title, content, pushes, content='', tokenize='unicode61')
+        """)
+
+# ----------------------------
+# 寫入單篇 (與文章 INSERT 同一交易)
+# ----------------------------
+PG_DOC_SQL = """
+setweight(to_tsvector('simple', %s), 'A')
+|| setweight(to_tsvector('simple', %s), 'B')
+|| setweight(to_tsvector('simple', %s), 'C')
+"""
+
+def index_rows(cur, rows, backend=None):
+    """
+    rows: [(article_id, title, content, push_texts), ...]
+    """
+    backend = backend or get_backend()
+    docs = [(article_id, token_text(title), token_text(content), token_text(" ".join(push_texts)))
+            for article_id, title, content, push_texts in rows]
+    if not docs:
+        return 0
+    if backend.name == "postgres":
+        from psycopg2.extras import execute_values
+
+        execute_values(cur, f"""
+        INSERT INTO article_search (article_id, doc)
+        SELECT v.id, {PG_DOC_SQL % ("v.t", "v.c", "v.p")}
+        FROM (VALUES %s) AS v(id, t, c, p)
+        ON CONFLICT (article_id) DO UPDATE SET doc = EXCLUDED.doc
+        """, docs, page_size=500)
+    else:
+        cur.executemany("INSERT INTO article_fts(rowid, title, content, pushes) VALUES (?, ?, ?, ?)", docs)
+    return len(docs)
+
+def index_article(cur, article_id, title, content, push_texts, backend=None):
+    index_rows(cur, [(article_id, title, content, push_texts)], backend)
+
+# ----------------------------
+# 查詢
+# ----------------------------
+def hits_subquery(query, backend=None):
+    """
+    回傳 (sql, params)：子查詢輸出 (hit_id, score)，score 越小越相關；
+    查詢字串沒有可用的詞時回傳 (None, {})
+    """
+    backend = backend or get_backend()
+    if backend.name == "postgres":
+        q = tsquery(query)
+        if not q:
+            return None, {}
+        sql = """
+        SELECT article_id AS hit_id, -ts_rank_cd(doc, to_tsquery('simple', %(q)s)) AS score
+        FROM article_search
+        WHERE doc @@ to_tsquery('simple', %(q)s)
+        """
+    else:
+        q = fts5_query(query)
+        if not q:
+            return None, {}
+        weights = ", ".join(str(w) for w in SQLITE_WEIGHTS)
+        sql = f"""
+        SELECT rowid AS hit_id, bm25(article_fts, {weights}) AS score
+        FROM article_fts
+        WHERE article_fts MATCH %(q)s
+        """
+    return sql, {"q": q}
+
+def highlight(text, query, width=None):
+    """
+    HTML 跳脫後以 <mark> 標示查詢詞 (不分大小寫)；
+    width 有值時只取第一個命中附近約 width 字的片段
+    """
+    text = text or ""
+    words = sorted({w for w in TOKEN_RE.findall((query or "").lower())}, key=len, reverse=True)
+    pattern = re.compile("|".join(re.escape(w) for w in words), re.IGNORECASE) if words else None
+    if width is not None and len(text) > width:
+        m = pattern.search(text) if pattern else None
+        start = max(0, (m.start() if m else 0) - width // 4)
+        end = start + width
+        text = ("..." if start > 0 else "") + text[start:end] + ("..." if end < len(text) else "")
+    if pattern is None:
+        return html.escape(text)
+    out, last = [], 0
+    for m in pattern.finditer(text):
+        out.append(html.escape(text[last:m.start()]))
+        out.append(f"<mark>{html.escape(m.group(0))}</mark>")
+        last = m.end()
+    out.append(html.escape(text[last:]))
+    return "".join(out)
+
+# ----------------------------
+# 由 sentiments + push_comments 全量重建
+# ----------------------------
+def rebuild_search_index(batch_size=REBUILD_BATCH, backend=None):
+    backend = backend or get_backend()
+    # 讀取端附加推文月分片；寫入另開連線，每批一個交易
+    reader = backend.connect(readonly=True, attach_shards=True)
+    writer = backend.connect()
+    with backend.transaction(writer) as cur:
+        init_search_index(cur, backend)
+        if backend.name == "postgres":
+            backend.truncate(cur, ["article_search"])
+        else:
+            cur.execute("INSERT INTO article_fts(article_fts) VALUES ('delete-all')")
+
+    n_articles = 0
+    scan = "SELECT id, title, content, content_z, content_dict FROM sentiments ORDER BY id"
+    for columns, rows in backend.stream(reader, scan, batch_size=batch_size):
+        _, rows = decode_content_rows(columns, rows, backend)
+        where, params = backend.in_list("article_id", [r[0] for r in rows], "aid")
+        pushes = {}
+        cur = reader.cursor()
+        try:
+            cur.execute(backend.sql(f"SELECT article_id, push_content FROM push_comments WHERE {where}"), params)
+            for article_id, push_content in cur.fetchall():
+                pushes.setdefault(article_id, []).append(push_content or "")
+        finally:
+            cur.close()
+        with backend.transaction(writer) as cur:
+            n_articles += index_rows(cur, [(aid, title, content, pushes.get(aid, []))
+                                           for aid, title, content in rows], backend)
+        logging.info(f"Indexed {n_articles} articles...")
+
+    if backend.name == "sqlite":
+        with backend.transaction(writer) as cur:
+            cur.execute("INSERT INTO article_fts(article_fts) VALUES ('optimize')")
+    reader.close()
+    writer.close()
+    logging.info(f"Search index rebuilt from {n_articles} articles.")
+
+def print_query(query, limit=20, backend=None):
+    backend = backend or get_backend()
+    sql, params = hits_subquery(query, backend)
+    if sql is None:
+        print("Empty query.")
+        return
+    df = backend.read_sql(f"""
+    SELECT s.id, s.timestamp, s.board, s.title, hits.score
+    FROM ({sql}) AS hits
+    JOIN sentiments s ON s.id = hits.hit_id
+    ORDER BY hits.score
+    LIMIT %(limit)s
+    """, {**params, "limit": limit})
+    print(df.to_string(index=False))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Full-text search index over titles, content and pushes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_rebuild = sub.add_parser("rebuild", help="rebuild the index from sentiments and push_comments")
+    p_rebuild.add_argument("--batch-size", type=int, default=REBUILD_BATCH)
+    p_query = sub.add_parser("query", help="print the top matches for a query")
+    p_query.add_argument("words", nargs="+")
+    p_query.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+    try:
+        if args.command == "rebuild":
+            rebuild_search_index(args.batch_size)
+        else:
+            print_query(" ".join(args.words), args.limit)
+    except Exception as e:
+        logging.error(f"Search index error: {e}")
+        sys.exit(1)
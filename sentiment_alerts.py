@@ -0,0 +1,270 @@
+import os
+import sys
+import json
+import copy
+import math
+import logging
+import argparse
+import urllib.request
+from datetime import datetime
+
+from storage import get_backend
+
+# ----------------------------
+# 推文情緒異常告警 (每看板)
+# post_sentiment.py 寫回推文星等時，依處理順序把每則推文餵給該看板的偵測器 (每則 O(1))：
+#   每 WINDOW_PUSHES 則推文結算一個視窗：平均星等、噓文比例
+#   與 EWMA 基準 (平均 / 變異數) 比較，z 分數超過門檻且變化量夠大時告警 (只看變差的方向)
+#   同一指標連續異常只在第一次告警，回到正常後才會再次告警
+# 偵測器狀態存在 sentiment_alert_state，與星等寫回同一交易更新，批次程式重跑也能接續。
+# 告警寫入 sentiment_alerts，交易成功後再送到 sink：
+#   PTT_ALERT_SINKS=stdout,webhook   (預設 stdout)
+#   PTT_ALERT_WEBHOOK=http://127.0.0.1:9000/alerts   (以 JSON POST)
+#   python sentiment_alerts.py list --board Stock
+# ----------------------------
+
+WINDOW_PUSHES = 200
+EWMA_ALPHA = 0.1                # 約等於最近 10 個視窗
+WARMUP_WINDOWS = 5              # 基準累積滿這麼多個視窗後才開始告警
+Z_THRESHOLD = 3.0
+# 變化量與標準差下限：避免基準很平穩時，微小波動也被判定為異常
+METRICS = {
+    # 指標: (變差的方向, 最小變化量, 標準差下限)
+    "push_star_mean": (-1, 0.2, 0.05),
+    "boo_ratio": (1, 0.05, 0.01),
+}
+ALERT_SINKS = [s.strip() for s in os.environ.get("PTT_ALERT_SINKS", "stdout").split(",") if s.strip()]
+ALERT_WEBHOOK = os.environ.get("PTT_ALERT_WEBHOOK")
+WEBHOOK_TIMEOUT = 5
+
+STATE_COLUMNS = [
+    "n_windows", "star_mean", "star_var", "boo_mean", "boo_var", "star_alerting", "boo_alerting",
+    "cur_n", "cur_star_sum", "cur_boo", "cur_first_at", "cur_last_at",
+]
+
+# ----------------------------
+# 建表
+# ----------------------------
+def init_alert_tables(cur, backend=None):
+    backend = backend or get_backend()
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS sentiment_alert_state (
+        board TEXT PRIMARY KEY,
+        n_windows INT NOT NULL,
+        star_mean DOUBLE PRECISION NOT NULL,
+        star_var DOUBLE PRECISION NOT NULL,
+        boo_mean DOUBLE PRECISION NOT NULL,
+        boo_var DOUBLE PRECISION NOT NULL,
+        star_alerting INT NOT NULL,
+        boo_alerting INT NOT NULL,
+        cur_n INT NOT NULL,
+        cur_star_sum INT NOT NULL,
+        cur_boo INT NOT NULL,
+        cur_first_at TIMESTAMP,
+        cur_last_at TIMESTAMP
+    );
+    """)
+    cur.execute(backend.ddl("""
+    CREATE TABLE IF NOT EXISTS sentiment_alerts (
+        id SERIAL PRIMARY KEY,
+        created_at TIMESTAMP NOT NULL,
+        board TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        value DOUBLE PRECISION NOT NULL,
+        baseline DOUBLE PRECISION NOT NULL,
+        zscore DOUBLE PRECISION NOT NULL,
+        window_pushes INT NOT NULL,
+        window_start TIMESTAMP,
+        window_end TIMESTAMP,
+        message TEXT
+    );
+    """))
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sentiment_alerts_board_created ON sentiment_alerts (board, created_at)")
+
+# ----------------------------
+# 單一看板的偵測器
+# ----------------------------
+class BoardDetector:
+    def __init__(self, board, row=None):
+        self.board = board
+        if row is None:
+            row = (0, 0.0, 0.0, 0.0, 0.0, 0, 0, 0, 0, 0, None, None)
+        (self.n_windows, self.star_mean, self.star_var, self.boo_mean, self.boo_var,
+         star_alerting, boo_alerting, self.cur_n, self.cur_star_sum, self.cur_boo,
+         self.cur_first_at, self.cur_last_at) = row
+        self.alerting = {"push_star_mean": bool(star_alerting), "boo_ratio": bool(boo_alerting)}
+
+    def to_row(self):
+        return (self.board, self.n_windows, self.star_mean, self.star_var, self.boo_mean, self.boo_var,
+                int(self.alerting["push_star_mean"]), int(self.alerting["boo_ratio"]),
+                self.cur_n, self.cur_star_sum, self.cur_boo, self.cur_first_at, self.cur_last_at)
+
+    def update(self, star, is_boo, push_at=None):
+        """
+        累加一則推文；視窗滿時結算並回傳告警列表
+        """
+        self.cur_n += 1
+        self.cur_star_sum += star
+        self.cur_boo += int(is_boo)
+        if push_at is not None:
+            if self.cur_first_at is None or push_at < self.cur_first_at:
+                self.cur_first_at = push_at
+            if self.cur_last_at is None or push_at > self.cur_last_at:
+                self.cur_last_at = push_at
+        if self.cur_n < WINDOW_PUSHES:
+            return []
+        return self.close_window()
+
+    def close_window(self):
+        values = {"push_star_mean": self.cur_star_sum / self.cur_n, "boo_ratio": self.cur_boo / self.cur_n}
+        baselines = {"push_star_mean": (self.star_mean, self.star_var), "boo_ratio": (self.boo_mean, self.boo_var)}
+        alerts = []
+        for metric, (direction, min_delta, sigma_floor) in METRICS.items():
+            value = values[metric]
+            mean, var = baselines[metric]
+            if self.n_windows < WARMUP_WINDOWS:
+                continue
+            delta = (value - mean) * direction
+            z = delta / max(math.sqrt(var), sigma_floor)
+            anomalous = z >= Z_THRESHOLD and delta >= min_delta
+            if anomalous and not self.alerting[metric]:
+                alerts.append({
+                    "board": self.board, "metric": metric, "value": round(value, 4),
+                    "baseline": round(mean, 4), "zscore": round(z * direction, 2),
+                    "window_pushes": self.cur_n, "window_start": self.cur_first_at,
+                    "window_end": self.cur_last_at,
+                })
+            self.alerting[metric] = anomalous
+
+        # 併入 EWMA 基準 (第一個視窗直接當作初值)
+        if self.n_windows == 0:
+            self.star_mean, self.boo_mean = values["push_star_mean"], values["boo_ratio"]
+        else:
+            for metric, attr in (("push_star_mean", "star"), ("boo_ratio", "boo")):
+                mean, var = getattr(self, f"{attr}_mean"), getattr(self, f"{attr}_var")
+                diff = values[metric] - mean
+                setattr(self, f"{attr}_mean", mean + EWMA_ALPHA * diff)
+                setattr(self, f"{attr}_var", (1 - EWMA_ALPHA) * (var + EWMA_ALPHA * diff * diff))
+        self.n_windows += 1
+        self.cur_n = self.cur_star_sum = self.cur_boo = 0
+        self.cur_first_at = self.cur_last_at = None
+        return alerts
+
+def alert_message(alert):
+    names = {"push_star_mean": "推文平均星等", "boo_ratio": "噓文比例"}
+    return (f"[{alert['board']}] {names[alert['metric']]} {alert['value']} "
+            f"(基準 {alert['baseline']}, z={alert['zscore']}, 最近 {alert['window_pushes']} 則推文"
+            f"{', ' + str(alert['window_start']) + ' ~ ' + str(alert['window_end']) if alert['window_start'] else ''})")
+
+# ----------------------------
+# 全看板偵測器 (狀態與告警隨星等寫回的交易一起寫入)
+# ----------------------------
+class SentimentAlerts:
+    """
+    用法：
+        alerts = SentimentAlerts(backend)
+        with backend.transaction(conn) as cur:
+            ... 寫回星等 ...
+            alerts.process(cur, events)
+        alerts.commit()      # 交易失敗時改呼叫 alerts.rollback()
+    """
+    def __init__(self, backend=None):
+        self.backend = backend or get_backend()
+        self.boards = None
+        self.saved = None
+        self.pending = []
+
+    def load(self, cur):
+        self.backend.execute(cur, f"SELECT board, {', '.join(STATE_COLUMNS)} FROM sentiment_alert_state")
+        self.boards = {row[0]: BoardDetector(row[0], row[1:]) for row in cur.fetchall()}
+        self.saved = copy.deepcopy(self.boards)
+
+    def process(self, cur, events):
+        """
+        events: [(board, star_int, push_tag, push_at), ...]，依處理順序
+        """
+        if self.boards is None:
+            self.load(cur)
+        touched = set()
+        new_alerts = []
+        created_at = datetime.now().replace(microsecond=0)
+        for board, star, tag, push_at in events:
+            if not board or star is None:
+                continue
+            detector = self.boards.get(board)
+            if detector is None:
+                detector = self.boards[board] = BoardDetector(board)
+            touched.add(board)
+            for alert in detector.update(star, tag == "噓", push_at):
+                alert["created_at"] = created_at
+                alert["message"] = alert_message(alert)
+                new_alerts.append(alert)
+        if not touched:
+            return
+        self.backend.upsert(cur, "sentiment_alert_state", ["board"] + STATE_COLUMNS, ["board"],
+                            [self.boards[b].to_row() for b in sorted(touched)],
+                            update=", ".join(f"{c} = EXCLUDED.{c}" for c in STATE_COLUMNS))
+        columns = ["created_at", "board", "metric", "value", "baseline", "zscore", "window_pushes",
+                   "window_start", "window_end", "message"]
+        self.backend.bulk_insert(cur, "sentiment_alerts", columns,
+                                 [tuple(a[c] for c in columns) for a in new_alerts])
+        self.pending.extend(new_alerts)
+
+    def commit(self):
+        self.saved = copy.deepcopy(self.boards)
+        pending, self.pending = self.pending, []
+        for alert in pending:
+            emit(alert)
+
+    def rollback(self):
+        self.boards = copy.deepcopy(self.saved)
+        self.pending = []
+
+# ----------------------------
+# Sink
+# ----------------------------
+def emit(alert):
+    logging.warning(f"Sentiment alert: {alert['message']}")
+    payload = {k: (str(v) if isinstance(v, datetime) else v) for k, v in alert.items()}
+    if "stdout" in ALERT_SINKS:
+        print(json.dumps(payload, ensure_ascii=False), flush=True)
+    if "webhook" in ALERT_SINKS and ALERT_WEBHOOK:
+        request = urllib.request.Request(ALERT_WEBHOOK, data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=WEBHOOK_TIMEOUT) as resp:
+                resp.read()
+        except Exception as e:
+            logging.error(f"Alert webhook failed: {e}")
+
+# ----------------------------
+# 檢視最近的告警
+# ----------------------------
+def print_alerts(board=None, limit=20, backend=None):
+    backend = backend or get_backend()
+    params = {"limit": limit}
+    where = ""
+    if board:
+        where = "WHERE board = %(board)s"
+        params["board"] = board
+    df = backend.read_sql(f"""
+    SELECT created_at, board, metric, value, baseline, zscore, window_start, window_end
+    FROM sentiment_alerts {where}
+    ORDER BY id DESC
+    LIMIT %(limit)s
+    """, params)
+    print(df.to_string(index=False))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Per-board push sentiment anomaly alerts")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_list = sub.add_parser("list", help="print recent alerts")
+    p_list.add_argument("--board")
+    p_list.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+    try:
+        print_alerts(args.board, args.limit)
+    except Exception as e:
+        logging.error(f"Sentiment alerts error: {e}")
+        sys.exit(1)
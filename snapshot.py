@@ -0,0 +1,270 @@
+import os
+import sys
+import json
+import logging
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from storage import get_backend
+from compact_storage import (decode_content_rows, push_tag_sql, push_star_label_sql, push_sentiment_sql,
+                             push_pending_sql)
+
+# ----------------------------
+# 欄式快照 (Parquet)
+# 將 sentiments / push_comments 依 board=/date= 分區匯出成 Parquet，
+# 每次只追加新增的 id 與上次匯出後才補上標籤的列 (狀態檔記錄確切的未標籤 id 區間)；
+# 分析端以 load_snapshot() 讀取指定欄位 (memory-map + Arrow)，不必查詢線上資料庫。
+# 同一 id 可能出現在多次匯出中，讀取時以 _seq (匯出序號) 最大者為準。
+# ----------------------------
+
+SNAPSHOT_DIR = os.environ.get("PTT_SNAPSHOT_DIR", "snapshots")
+STATE_FILE = "_state.json"
+FETCH_BATCH = 50000
+PENDING_RANGE_CHUNK = 500       # 每個查詢最多帶入的未標籤 id 區間數
+
+# 各表匯出欄位與「尚未完成標籤」的判斷條件
+TABLES = {
+    "sentiments": {
+        "sql": """
+        SELECT s.id, s.timestamp, s.board, s.title, s.content, s.content_z, s.content_dict, s.link,
+               s.title_star_label, s.title_sentiment, s.title_score,
+               s.content_star_label, s.content_sentiment, s.content_score,
+               {date} AS date
+        FROM sentiments s
+        WHERE {where}
+        ORDER BY s.id
+        """,
+        "pending": "(s.title_star_label IS NULL OR s.content_star_label IS NULL)",
+        "alias": "s",
+    },
+    "push_comments": {
+        # 推文欄位以壓縮儲存前的文字格式匯出 (見 compact_storage.py)
+        "sql": f"""
+        SELECT p.id, p.article_id, {push_tag_sql("p")} AS push_tag, p.push_userid, p.push_content,
+               p.push_time, {push_star_label_sql("p")} AS push_star_label,
+               {push_sentiment_sql("p")} AS push_sentiment, p.push_score,
+               s.board, {{date}} AS date
+        FROM push_comments p
+        JOIN sentiments s ON s.id = p.article_id
+        WHERE {{where}}
+        ORDER BY p.id
+        """,
+        "pending": push_pending_sql("p"),
+        "alias": "p",
+    },
+}
+PARTITION_COLS = ["board", "date"]
+
+# 固定 schema，避免某批欄位全為 NULL 時推斷成 null 型別而與其他檔案不相容
+SCHEMAS = {
+    "sentiments": pa.schema([
+        ("id", pa.int64()), ("timestamp", pa.timestamp("us")), ("board", pa.string()),
+        ("title", pa.string()), ("content", pa.string()), ("link", pa.string()),
+        ("title_star_label", pa.string()), ("title_sentiment", pa.string()), ("title_score", pa.float64()),
+        ("content_star_label", pa.string()), ("content_sentiment", pa.string()), ("content_score", pa.float64()),
+        ("date", pa.string()), ("_seq", pa.int32()),
+    ]),
+    "push_comments": pa.schema([
+        ("id", pa.int64()), ("article_id", pa.int64()), ("push_tag", pa.string()),
+        ("push_userid", pa.string()), ("push_content", pa.string()), ("push_time", pa.string()),
+        ("push_star_label", pa.string()), ("push_sentiment", pa.string()), ("push_score", pa.float64()),
+        ("board", pa.string()), ("date", pa.string()), ("_seq", pa.int32()),
+    ]),
+}
+
+# ----------------------------
+# 匯出狀態 (每表: last_id, pending, seq)
+# pending: 上次匯出時仍未標籤的 id，壓成 [[lo, hi], ...] 區間
+# ----------------------------
+def load_state(snapshot_dir=SNAPSHOT_DIR):
+    path = os.path.join(snapshot_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_state(state, snapshot_dir=SNAPSHOT_DIR):
+    os.makedirs(snapshot_dir, exist_ok=True)
+    path = os.path.join(snapshot_dir, STATE_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+def write_batch(table_name, columns, rows, seq, batch_no, snapshot_dir=SNAPSHOT_DIR):
+    """
+    rows: DB-API 取回的 tuple 列；附上 _seq 後依 board/date 分區寫入
+    """
+    data = {col: [r[i] for r in rows] for i, col in enumerate(columns)}
+    # PG 回傳 date 物件，SQLite 的 date() 回傳字串
+    data["date"] = [d.isoformat() if hasattr(d, "isoformat") else d for d in data["date"]]
+    data["_seq"] = [seq] * len(rows)
+    table = pa.table(data, schema=SCHEMAS[table_name])
+    pq.write_to_dataset(
+        table,
+        root_path=os.path.join(snapshot_dir, table_name),
+        partition_cols=PARTITION_COLS,
+        basename_template=f"part-{seq:06d}-{batch_no:05d}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+# ----------------------------
+# 增量匯出
+# ----------------------------
+def add_id_range(ranges, id_):
+    """
+    依遞增順序加入 id，連續的 id 併成同一個 [lo, hi] 區間
+    """
+    if ranges and id_ == ranges[-1][1] + 1:
+        ranges[-1][1] = id_
+    else:
+        ranges.append([id_, id_])
+
+def ranges_condition(column, ranges, params):
+    parts = []
+    for i, (lo, hi) in enumerate(ranges):
+        params[f"r{i}_lo"], params[f"r{i}_hi"] = lo, hi
+        parts.append(f"{column} BETWEEN %(r{i}_lo)s AND %(r{i}_hi)s")
+    return "(" + " OR ".join(parts) + ")"
+
+def id_conditions(alias, last_id, pending):
+    """
+    產生 (條件, 參數)：先是上次仍未標籤的區間 (每 PENDING_RANGE_CHUNK 個一組)，最後是 id > last_id 的新列
+    """
+    for start in range(0, len(pending), PENDING_RANGE_CHUNK):
+        params = {}
+        yield ranges_condition(f"{alias}.id", pending[start:start + PENDING_RANGE_CHUNK], params), params, False
+    yield f"{alias}.id > %(last_id)s", {"last_id": last_id}, True
+
+def export_table(conn, table_name, state, snapshot_dir=SNAPSHOT_DIR, backend=None):
+    """
+    匯出新列 (id > last_id) 與上次匯出時未標籤、現在已標籤的列。
+    新的未標籤集合與匯出在同一個讀取快照中決定，兩者之間被標籤的列不會漏掉
+    """
+    backend = backend or get_backend()
+    conf = TABLES[table_name]
+    alias = conf["alias"]
+    tstate = state.get(table_name, {"last_id": 0, "pending": [], "seq": 0})
+    last_id = tstate["last_id"]
+    pending = tstate.get("pending")
+    if pending is None:
+        # 舊版狀態只記錄 pending_from：把整段視為未標籤 (只會多匯出這一次)
+        pending = [[tstate["pending_from"], last_id]] if tstate.get("pending_from") is not None else []
+    seq = tstate["seq"] + 1
+    date = backend.to_date("s.timestamp")
+
+    batch_no = 0
+    exported = 0
+    max_id = last_id
+    new_pending = []
+    with backend.read_snapshot(conn):
+        # 先在快照中決定新的未標籤集合 (只可能是上次的未標籤列或新列)
+        for cond, params, _ in id_conditions(alias, last_id, pending):
+            scan = f"""
+            SELECT {alias}.id FROM {table_name} {alias}
+            WHERE {cond} AND {conf['pending']}
+            ORDER BY {alias}.id
+            """
+            for _, rows in backend.stream(conn, scan, params, batch_size=FETCH_BATCH):
+                for (id_,) in rows:
+                    add_id_range(new_pending, id_)
+
+        # 變更列：上次未標籤、現在已標籤；新列：全部匯出 (未標籤者下次標籤後再匯出一次)
+        for cond, params, is_new in id_conditions(alias, last_id, pending):
+            where = cond if is_new else f"{cond} AND NOT {conf['pending']}"
+            sql = conf["sql"].format(where=where, date=date)
+            for columns, rows in backend.stream(conn, sql, params, batch_size=FETCH_BATCH):
+                # 壓縮儲存的內文解碼後再匯出
+                columns, rows = decode_content_rows(columns, rows, backend)
+                write_batch(table_name, columns, rows, seq, batch_no, snapshot_dir)
+                batch_no += 1
+                exported += len(rows)
+                if is_new:
+                    max_id = max(max_id, rows[-1][0])
+
+    state[table_name] = {
+        "last_id": max_id,
+        "pending": new_pending,
+        "seq": seq if exported else tstate["seq"],
+        "exported_at": datetime.now().replace(microsecond=0).isoformat(),
+    }
+    n_pending = sum(hi - lo + 1 for lo, hi in new_pending)
+    logging.info(f"Snapshot {table_name}: exported {exported} rows (last_id={max_id}, {n_pending} pending ids "
+                 f"in {len(new_pending)} ranges).")
+    return exported
+
+def export_snapshot(snapshot_dir=SNAPSHOT_DIR, tables=("sentiments", "push_comments"), backend=None):
+    backend = backend or get_backend()
+    state = load_state(snapshot_dir)
+    conn = backend.connect(readonly=True)
+    try:
+        for table_name in tables:
+            export_table(conn, table_name, state, snapshot_dir, backend)
+            save_state(state, snapshot_dir)
+    finally:
+        conn.close()
+
+# ----------------------------
+# 讀取 (分析端)
+# ----------------------------
+def load_snapshot(table_name, columns=None, filters=None, snapshot_dir=SNAPSHOT_DIR, as_arrow=False):
+    """
+    columns: 只讀取這些欄位 (可含分區欄位 board / date)
+    filters: pyarrow 篩選條件，如 [("board", "=", "Stock")]，分區欄位會直接略過不相關目錄
+    回傳去重後 (每個 id 取最新 _seq) 的 DataFrame，或 as_arrow=True 時回傳 pyarrow.Table
+    """
+    path = os.path.join(snapshot_dir, table_name)
+    read_cols = None
+    if columns is not None:
+        read_cols = list(dict.fromkeys(["id", "_seq"] + list(columns)))
+    table = pq.read_table(path, columns=read_cols, filters=filters,
+                          memory_map=True, partitioning="hive")
+
+    # 只有在真的有重複 id 時才做去重
+    if table.num_rows and pc.count_distinct(table["id"]).as_py() != table.num_rows:
+        latest = table.group_by("id").aggregate([("_seq", "max")])
+        table = table.join(latest, keys=["id", "_seq"], right_keys=["id", "_seq_max"], join_type="inner")
+
+    if columns is not None:
+        table = table.select(list(columns))
+    return table if as_arrow else table.to_pandas()
+
+def snapshot_exists(table_name, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.isdir(os.path.join(snapshot_dir, table_name))
+
+# ----------------------------
+# 壓實：每個分區改寫成單一去重後檔案
+# ----------------------------
+def compact_snapshot(table_name, snapshot_dir=SNAPSHOT_DIR):
+    root = os.path.join(snapshot_dir, table_name)
+    for dirpath, _, filenames in os.walk(root):
+        parts = sorted(f for f in filenames if f.endswith(".parquet"))
+        if len(parts) <= 1:
+            continue
+        table = pq.read_table([os.path.join(dirpath, f) for f in parts], memory_map=True)
+        latest = table.group_by("id").aggregate([("_seq", "max")])
+        table = table.join(latest, keys=["id", "_seq"], right_keys=["id", "_seq_max"], join_type="inner")
+        table = table.sort_by("id")
+        seq = max(table["_seq"].to_pylist())
+        out = os.path.join(dirpath, f"compact-{seq:06d}.parquet")
+        pq.write_table(table, out + ".tmp")
+        os.replace(out + ".tmp", out)
+        for f in parts:
+            if os.path.join(dirpath, f) != out:
+                os.remove(os.path.join(dirpath, f))
+    logging.info(f"Snapshot {table_name} compacted.")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    try:
+        if "--compact" in sys.argv[1:]:
+            for name in TABLES:
+                compact_snapshot(name)
+        else:
+            export_snapshot()
+    except Exception as e:
+        logging.error(f"Snapshot error: {e}")
+        sys.exit(1)
@@ -0,0 +1,160 @@
+import os
+import re
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from urllib.parse import quote
+
+# ----------------------------
+# SQLite 連線工廠
+# WAL 模式下讀取不會被寫入阻擋：post_s_sqlite.py 寫回推論結果時，
+# dashboard2.py 仍可同時讀取。寫入端以 BEGIN IMMEDIATE 先取得寫鎖，
+# 並在 busy_timeout 內等待其他寫入者，不再出現 "database is locked"。
+# ----------------------------
+
+SQLITE_DB_PATH = os.environ.get("PTT_SQLITE_PATH", "ptt_data.db")
+BUSY_TIMEOUT_MS = 30000
+
+# 每條連線都套用的 PRAGMA
+CONNECTION_PRAGMAS = {
+    "synchronous": "NORMAL",      # WAL 下 NORMAL 仍保證一致性，只在斷電時可能遺失最後幾筆交易
+    "cache_size": -65536,         # 64 MB page cache (負值單位為 KiB)
+    "mmap_size": 268435456,       # 256 MB memory-mapped I/O
+    "temp_store": "MEMORY",
+    "busy_timeout": BUSY_TIMEOUT_MS,
+}
+# 只有寫入端需要設定 (journal_mode 會持久化在資料庫檔)
+WRITER_PRAGMAS = {
+    "journal_mode": "WAL",
+    "journal_size_limit": 67108864,  # checkpoint 後把 -wal 檔截到 64 MB 以內
+}
+
+# datetime / date 以 ISO 字串存放，宣告為 TIMESTAMP / DATE 的欄位讀回時轉回 Python 物件
+# (取代 Python 3.12 起已棄用的預設 adapter / converter)
+def _convert_timestamp(value):
+    try:
+        return datetime.fromisoformat(value.decode())
+    except ValueError:
+        return value.decode()
+
+def _convert_date(value):
+    try:
+        return date.fromisoformat(value.decode())
+    except ValueError:
+        return value.decode()
+
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_converter("TIMESTAMP", _convert_timestamp)
+sqlite3.register_converter("DATE", _convert_date)
+
+# 同一行程內的寫入者排隊，避免多執行緒搶寫鎖時反覆 busy-wait
+_writer_lock = threading.Lock()
+
+def apply_pragmas(conn, pragmas):
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name}={value}")
+
+def get_sqlite_connection(path=SQLITE_DB_PATH, readonly=False, attach_shards=None):
+    """
+    readonly=True 以 mode=ro 開啟，供 dashboard / 分析腳本等讀取端使用
+    attach_shards: 是否附加 push_comments 月分片 (預設只有讀取端附加)；
+    附加後 push_comments 變成唯讀的合併 view，寫入端只在不寫推文時才可附加
+    """
+    if readonly:
+        uri = f"file:{quote(os.path.abspath(path))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT_MS / 1000,
+                               detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, detect_types=sqlite3.PARSE_DECLTYPES)
+        apply_pragmas(conn, WRITER_PRAGMAS)
+    apply_pragmas(conn, CONNECTION_PRAGMAS)
+    if attach_shards is None:
+        attach_shards = readonly
+    if attach_shards:
+        attach_push_shards(conn, path, readonly=readonly)
+    return conn
+
+@contextmanager
+def write_transaction(conn):
+    """
+    以 BEGIN IMMEDIATE 開始寫入交易：一開始就取得寫鎖，
+    避免 deferred 交易在讀轉寫時才發現衝突而失敗
+    """
+    with _writer_lock:
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+
+# ----------------------------
+# push_comments 月分片 (由 push_partitions.py 產生)
+# 已結束月份的推文搬到 <db>_push_shards/push_comments_YYYYMM.db，
+# 讀取端 ATTACH 後以同名 TEMP VIEW 合併主檔與各分片 (temp 物件優先於 main)；
+# 各分片有 crawled_at 索引，crawled_at 範圍條件會推入 UNION ALL 各分支，不相關的分片只做一次索引探查
+# ----------------------------
+SHARD_FILE_RE = re.compile(r"^push_comments_(\d{6})\.db$")
+MAX_ATTACHED_SHARDS = 9  # SQLite 預設最多 ATTACH 10 個資料庫
+
+def push_shard_dir(path=SQLITE_DB_PATH):
+    return os.path.splitext(path)[0] + "_push_shards"
+
+def push_shard_path(month, path=SQLITE_DB_PATH):
+    """
+    month: "YYYYMM"
+    """
+    return os.path.join(push_shard_dir(path), f"push_comments_{month}.db")
+
+def list_push_shards(path=SQLITE_DB_PATH):
+    """
+    回傳 [(YYYYMM, 檔案路徑), ...]，依月份排序
+    """
+    shard_dir = push_shard_dir(path)
+    if not os.path.isdir(shard_dir):
+        return []
+    shards = []
+    for name in sorted(os.listdir(shard_dir)):
+        m = SHARD_FILE_RE.match(name)
+        if m:
+            shards.append((m.group(1), os.path.join(shard_dir, name)))
+    return shards
+
+def attach_push_shards(conn, path=SQLITE_DB_PATH, readonly=True):
+    shards = list_push_shards(path)
+    columns = [r[1] for r in conn.execute("PRAGMA main.table_info(push_comments)")]
+    if not shards or not columns:
+        return []
+    if len(shards) > MAX_ATTACHED_SHARDS:
+        logging.warning(f"{len(shards)} push shards found, attaching only the newest {MAX_ATTACHED_SHARDS}; "
+                        f"run push_partitions.py retain to archive older months.")
+        shards = shards[-MAX_ATTACHED_SHARDS:]
+    selects = [f"SELECT {', '.join(columns)} FROM main.push_comments"]
+    for month, shard_path in shards:
+        alias = f"push_{month}"
+        target = f"file:{quote(os.path.abspath(shard_path))}?mode=ro" if readonly else shard_path
+        conn.execute(f"ATTACH DATABASE ? AS {alias}", (target,))
+        # 分片建立後主表才新增的欄位以 NULL 補齊
+        shard_cols = {r[1] for r in conn.execute(f"PRAGMA {alias}.table_info(push_comments)")}
+        items = [c if c in shard_cols else f"NULL AS {c}" for c in columns]
+        selects.append(f"SELECT {', '.join(items)} FROM {alias}.push_comments")
+    conn.execute(f"CREATE TEMP VIEW push_comments AS {' UNION ALL '.join(selects)}")
+    return [month for month, _ in shards]
+
+def get_sqlite_engine(path=SQLITE_DB_PATH, readonly=True):
+    """
+    SQLAlchemy engine，連線一律經過 get_sqlite_connection 以套用相同 PRAGMA。
+    不保留連線池：SQLite 開連線很便宜，且每次查詢都能看到新搬出的推文分片
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import NullPool
+
+    return create_engine("sqlite://", creator=lambda: get_sqlite_connection(path, readonly=readonly),
+                         poolclass=NullPool)
@@ -0,0 +1,370 @@
+import sys
+import math
+import logging
+
+import numpy as np
+
+from storage import get_backend
+from compact_storage import push_star_sql, push_labeled_sql
+
+# ----------------------------
+# 增量統計引擎 (統計分析頁用)
+# 每個看板只保存充分統計量：筆數、總和、平方和、交叉乘積，
+# 以及 (標題星等, 內文星等, 推文平均分箱) 的聯合次數表。
+# post_sentiment.py 寫入標籤時以 refresh_articles() 增量更新，
+# dashboard 讀出後 Pearson / OLS / ANOVA 都是 O(1)，
+# Spearman 由聯合次數表以 midrank 近似 (推文平均以 0.1 分箱)。
+# ----------------------------
+
+VARIABLES = ["title_int", "content_int", "push_mean"]
+PUSH_BINS_PER_STAR = 10  # push_mean 分箱寬度 0.1
+
+def push_bin(push_mean):
+    return int(round(push_mean * PUSH_BINS_PER_STAR))
+
+# ----------------------------
+# 充分統計量
+# ----------------------------
+class SufficientStats:
+    """
+    三個變數 (title_int, content_int, push_mean) 的 n、Σx 與交叉乘積 Σxy
+    可加可減，因此看板之間可直接合併、單篇文章可撤回後重新加入
+    """
+    def __init__(self, n=0, s=None, sp=None):
+        self.n = n
+        self.s = np.zeros(3) if s is None else np.asarray(s, dtype=float)
+        # 交叉乘積矩陣 Σxᵢxⱼ，對角線即平方和
+        self.sp = np.zeros((3, 3)) if sp is None else np.asarray(sp, dtype=float)
+
+    def add(self, values, weight=1):
+        v = np.asarray(values, dtype=float)
+        self.n += weight
+        self.s += weight * v
+        self.sp += weight * np.outer(v, v)
+
+    def merge(self, other):
+        self.n += other.n
+        self.s += other.s
+        self.sp += other.sp
+        return self
+
+    def mean(self, i):
+        return self.s[i] / self.n if self.n else float("nan")
+
+    def var(self, i):
+        if self.n < 2:
+            return float("nan")
+        return max(self.sp[i, i] - self.s[i] ** 2 / self.n, 0.0) / (self.n - 1)
+
+    def describe(self, i):
+        return {"count": self.n, "mean": self.mean(i), "std": math.sqrt(self.var(i))}
+
+    def pearson(self, i, j):
+        """
+        回傳 (r, p)；p 以 t 分配 (自由度 n-2) 計算，與 scipy.stats.pearsonr 相同
+        """
+        if self.n < 3:
+            return float("nan"), float("nan")
+        cov = self.sp[i, j] - self.s[i] * self.s[j] / self.n
+        var_i = self.sp[i, i] - self.s[i] ** 2 / self.n
+        var_j = self.sp[j, j] - self.s[j] ** 2 / self.n
+        if var_i <= 0 or var_j <= 0:
+            return float("nan"), float("nan")
+        r = max(-1.0, min(1.0, cov / math.sqrt(var_i * var_j)))
+        return r, correlation_p_value(r, self.n)
+
+    def ols(self):
+        """
+        push_mean ~ const + title_int + content_int，以正規方程式求解
+        回傳 dict: params, bse, tvalues, pvalues, rsquared, nobs
+        X'X 奇異 (如 title_int 為常數、或每列 title_int == content_int) 時與 statsmodels 相同改用
+        虛反矩陣 (最小範數解)，殘差自由度為 n - rank；無法估計的統計量為 NaN
+        """
+        from scipy.stats import t as t_dist
+
+        n = self.n
+        xtx = np.array([
+            [n, self.s[0], self.s[1]],
+            [self.s[0], self.sp[0, 0], self.sp[0, 1]],
+            [self.s[1], self.sp[0, 1], self.sp[1, 1]],
+        ])
+        xty = np.array([self.s[2], self.sp[0, 2], self.sp[1, 2]])
+        xtx_inv = np.linalg.pinv(xtx)
+        beta = xtx_inv @ xty
+        sse = max(self.sp[2, 2] - beta @ xty, 0.0)
+        sst = self.sp[2, 2] - self.s[2] ** 2 / n
+        dof = n - np.linalg.matrix_rank(xtx)
+        sigma2 = sse / dof if dof > 0 else float("nan")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bse = np.sqrt(np.clip(np.diag(sigma2 * xtx_inv), 0.0, None))
+            tvalues = np.where(bse > 0, beta / bse, np.nan)
+        names = ["const", "title_int", "content_int"]
+        return {
+            "params": dict(zip(names, beta)),
+            "bse": dict(zip(names, bse)),
+            "tvalues": dict(zip(names, tvalues)),
+            "pvalues": dict(zip(names, 2 * t_dist.sf(np.abs(tvalues), dof))),
+            "rsquared": 1 - sse / sst if sst > 0 else float("nan"),
+            "nobs": n,
+        }
+
+def correlation_p_value(r, n):
+    from scipy.stats import t as t_dist
+
+    if abs(r) >= 1.0:
+        return 0.0
+    dof = n - 2
+    t_stat = r * math.sqrt(dof / (1 - r * r))
+    return float(2 * t_dist.sf(abs(t_stat), dof))
+
+# ----------------------------
+# 多看板 ANOVA (push_mean ~ C(board))
+# ----------------------------
+def anova_push_mean(stats_by_board):
+    """
+    以各看板的 n、Σpush、Σpush² 做單因子 ANOVA，欄位同 statsmodels anova_lm
+    """
+    from scipy.stats import f as f_dist
+
+    groups = [st for st in stats_by_board.values() if st.n > 0]
+    k = len(groups)
+    big_n = sum(g.n for g in groups)
+    if k < 2 or big_n <= k:
+        return None
+    total_s = sum(g.s[2] for g in groups)
+    between = sum(g.s[2] ** 2 / g.n for g in groups)
+    ssb = between - total_s ** 2 / big_n
+    ssw = sum(g.sp[2, 2] for g in groups) - between
+    df_b, df_w = k - 1, big_n - k
+    f_stat = (ssb / df_b) / (ssw / df_w) if ssw > 0 else float("inf")
+    return {
+        "C(board)": {"sum_sq": ssb, "df": df_b, "F": f_stat, "PR(>F)": float(f_dist.sf(f_stat, df_b, df_w))},
+        "Residual": {"sum_sq": ssw, "df": df_w, "F": float("nan"), "PR(>F)": float("nan")},
+    }
+
+# ----------------------------
+# Spearman 近似 (聯合次數表 + midrank)
+# ----------------------------
+def spearman_from_hist(hist, i, j):
+    """
+    hist: {(title_int, content_int, push_bin): cnt}
+    同一格視為同值 (ties)；title/content 為離散 1~5，其間的結果是精確值，
+    涉及 push_mean 時誤差來自 0.1 的分箱
+    """
+    pairs = {}
+    for key, cnt in hist.items():
+        if cnt <= 0:
+            continue
+        xy = (key[i], key[j])
+        pairs[xy] = pairs.get(xy, 0) + cnt
+    n = sum(pairs.values())
+    if n < 3:
+        return float("nan"), float("nan")
+
+    def midranks(axis):
+        marginal = {}
+        for xy, cnt in pairs.items():
+            marginal[xy[axis]] = marginal.get(xy[axis], 0) + cnt
+        ranks, below = {}, 0
+        for value in sorted(marginal):
+            cnt = marginal[value]
+            ranks[value] = below + (cnt + 1) / 2
+            below += cnt
+        return ranks
+
+    rank_x, rank_y = midranks(0), midranks(1)
+    st = SufficientStats()
+    for (x, y), cnt in pairs.items():
+        st.add([rank_x[x], rank_y[y], 0.0], weight=cnt)
+    return st.pearson(0, 1)
+
+# ----------------------------
+# 建表
+# ----------------------------
+def init_stats_tables(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS board_stats (
+        board TEXT PRIMARY KEY,
+        n BIGINT NOT NULL DEFAULT 0,
+        s_t DOUBLE PRECISION NOT NULL DEFAULT 0,
+        s_c DOUBLE PRECISION NOT NULL DEFAULT 0,
+        s_p DOUBLE PRECISION NOT NULL DEFAULT 0,
+        sp_tt DOUBLE PRECISION NOT NULL DEFAULT 0,
+        sp_cc DOUBLE PRECISION NOT NULL DEFAULT 0,
+        sp_pp DOUBLE PRECISION NOT NULL DEFAULT 0,
+        sp_tc DOUBLE PRECISION NOT NULL DEFAULT 0,
+        sp_tp DOUBLE PRECISION NOT NULL DEFAULT 0,
+        sp_cp DOUBLE PRECISION NOT NULL DEFAULT 0
+    );
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS board_stats_hist (
+        board TEXT NOT NULL,
+        title_int SMALLINT NOT NULL,
+        content_int SMALLINT NOT NULL,
+        push_bin SMALLINT NOT NULL,
+        cnt BIGINT NOT NULL,
+        PRIMARY KEY (board, title_int, content_int, push_bin)
+    );
+    """)
+    # 每篇文章目前被計入的值，用來在標籤更新時先撤回舊貢獻
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS article_stats_contrib (
+        article_id INT PRIMARY KEY,
+        board TEXT NOT NULL,
+        title_int SMALLINT NOT NULL,
+        content_int SMALLINT NOT NULL,
+        push_mean DOUBLE PRECISION NOT NULL
+    );
+    """)
+
+STAT_COLUMNS = ["n", "s_t", "s_c", "s_p", "sp_tt", "sp_cc", "sp_pp", "sp_tc", "sp_tp", "sp_cp"]
+
+def stats_to_row(st):
+    return [st.n, st.s[0], st.s[1], st.s[2],
+            st.sp[0, 0], st.sp[1, 1], st.sp[2, 2],
+            st.sp[0, 1], st.sp[0, 2], st.sp[1, 2]]
+
+def stats_from_row(row):
+    n, s_t, s_c, s_p, sp_tt, sp_cc, sp_pp, sp_tc, sp_tp, sp_cp = row
+    sp = np.array([
+        [sp_tt, sp_tc, sp_tp],
+        [sp_tc, sp_cc, sp_cp],
+        [sp_tp, sp_cp, sp_pp],
+    ])
+    return SufficientStats(n=int(n), s=[s_t, s_c, s_p], sp=sp)
+
+# ----------------------------
+# 增量更新：重新計算指定文章的貢獻並套用差值
+# ----------------------------
+def refresh_articles(cur, article_ids, backend=None):
+    """
+    在呼叫端的交易中執行；成本只與 article_ids 數量有關
+    """
+    ids = sorted({int(a) for a in article_ids})
+    if not ids:
+        return
+    backend = backend or get_backend()
+    push_in, push_params = backend.in_list("article_id", ids, "push_ids")
+    sent_in, sent_params = backend.in_list("s.id", ids, "sent_ids")
+    backend.execute(cur, f"""
+    SELECT s.id, s.board,
+           {backend.star_int("s.title_star_label")},
+           {backend.star_int("s.content_star_label")},
+           pm.push_mean
+    FROM sentiments s
+    JOIN (
+        SELECT article_id,
+               CAST(AVG({push_star_sql(backend)}) AS DOUBLE PRECISION) AS push_mean
+        FROM push_comments
+        WHERE {push_in} AND {push_labeled_sql()}
+        GROUP BY article_id
+    ) pm ON pm.article_id = s.id
+    WHERE {sent_in}
+      AND s.title_star_label IS NOT NULL
+      AND s.content_star_label IS NOT NULL
+      AND s.board IS NOT NULL
+    """, {**push_params, **sent_params})
+    new_rows = {r[0]: tuple(r[1:]) for r in cur.fetchall()}
+    contrib_in, contrib_params = backend.in_list("article_id", ids, "ids")
+    backend.execute(cur, f"""
+    SELECT article_id, board, title_int, content_int, push_mean
+    FROM article_stats_contrib
+    WHERE {contrib_in}
+    """, contrib_params)
+    old_rows = {r[0]: tuple(r[1:]) for r in cur.fetchall()}
+
+    deltas = {}
+    hist_deltas = {}
+
+    def apply(row, weight):
+        board, t, c, p = row
+        deltas.setdefault(board, SufficientStats()).add([t, c, p], weight=weight)
+        key = (board, t, c, push_bin(p))
+        hist_deltas[key] = hist_deltas.get(key, 0) + weight
+
+    for aid in ids:
+        old, new = old_rows.get(aid), new_rows.get(aid)
+        if old == new:
+            continue
+        if old is not None:
+            apply(old, -1)
+        if new is not None:
+            apply(new, 1)
+
+    if deltas:
+        backend.upsert(cur, "board_stats", ["board"] + STAT_COLUMNS, ["board"],
+                       [[board] + stats_to_row(st) for board, st in deltas.items()],
+                       update=", ".join(f"{c} = board_stats.{c} + EXCLUDED.{c}" for c in STAT_COLUMNS))
+    hist_rows = [list(k) + [v] for k, v in hist_deltas.items() if v != 0]
+    if hist_rows:
+        backend.upsert(cur, "board_stats_hist", ["board", "title_int", "content_int", "push_bin", "cnt"],
+                       ["board", "title_int", "content_int", "push_bin"], hist_rows,
+                       update="cnt = board_stats_hist.cnt + EXCLUDED.cnt")
+
+    removed = [aid for aid in old_rows if aid not in new_rows]
+    if removed:
+        removed_in, removed_params = backend.in_list("article_id", removed, "removed")
+        backend.execute(cur, f"DELETE FROM article_stats_contrib WHERE {removed_in}", removed_params)
+    if new_rows:
+        backend.upsert(cur, "article_stats_contrib", ["article_id", "board", "title_int", "content_int", "push_mean"],
+                       ["article_id"], [(aid,) + row for aid, row in new_rows.items()],
+                       update="""
+            board = EXCLUDED.board,
+            title_int = EXCLUDED.title_int,
+            content_int = EXCLUDED.content_int,
+            push_mean = EXCLUDED.push_mean""")
+
+# ----------------------------
+# 讀取 (dashboard 用)
+# ----------------------------
+def load_board_stats(cur):
+    """
+    回傳 ({board: SufficientStats}, {board: {(t, c, push_bin): cnt}})
+    """
+    cur.execute(f"SELECT board, {', '.join(STAT_COLUMNS)} FROM board_stats")
+    stats = {r[0]: stats_from_row(r[1:]) for r in cur.fetchall()}
+    cur.execute("SELECT board, title_int, content_int, push_bin, cnt FROM board_stats_hist WHERE cnt > 0")
+    hist = {}
+    for board, t, c, b, cnt in cur.fetchall():
+        hist.setdefault(board, {})[(t, c, b)] = cnt
+    return stats, hist
+
+def combine_board_stats(stats, hist, board_filter=None):
+    """
+    board_filter 為 None / "All" 時合併全部看板
+    """
+    boards = list(stats) if not board_filter or board_filter == "All" else [board_filter]
+    total = SufficientStats()
+    total_hist = {}
+    for b in boards:
+        if b in stats:
+            total.merge(stats[b])
+        for key, cnt in hist.get(b, {}).items():
+            total_hist[key] = total_hist.get(key, 0) + cnt
+    return total, total_hist
+
+# ----------------------------
+# 全量重建 (首次導入或校正用)
+# ----------------------------
+def rebuild_stats(batch_size=5000, backend=None):
+    backend = backend or get_backend()
+    # SQLite 已搬到月分片的推文也要計入
+    conn = backend.connect(attach_shards=True)
+    with backend.transaction(conn) as cur:
+        init_stats_tables(cur)
+        backend.truncate(cur, ["board_stats", "board_stats_hist", "article_stats_contrib"])
+        cur.execute("SELECT id FROM sentiments ORDER BY id")
+        ids = [r[0] for r in cur.fetchall()]
+        for i in range(0, len(ids), batch_size):
+            refresh_articles(cur, ids[i:i + batch_size], backend)
+    conn.close()
+    logging.info(f"Board statistics rebuilt from {len(ids)} articles.")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    try:
+        rebuild_stats()
+    except Exception as e:
+        logging.error(f"Stats rebuild error: {e}")
+        sys.exit(1)
@@ -0,0 +1,434 @@
+import os
+import re
+import io
+import sqlite3
+import itertools
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from sqlite_db import SQLITE_DB_PATH, get_sqlite_connection, get_sqlite_engine, write_transaction
+
+try:
+    import psycopg2
+    from psycopg2.extras import execute_values
+except ImportError:
+    psycopg2 = None
+
+# ----------------------------
+# 儲存層 (PostgreSQL / SQLite 共用)
+# 所有腳本只透過 get_backend() 存取資料庫，SQL 一律以 psycopg2 風格
+# (%s / %(name)s，字面 % 寫成 %%) 撰寫，由 backend.sql() 轉成各引擎的 paramstyle。
+# 各引擎原生最佳化的寫入 / 讀取原語：
+#   bulk_insert  PG: COPY FROM STDIN          SQLite: executemany (WAL)
+#   bulk_update  PG: UPDATE ... FROM VALUES   SQLite: executemany
+#   upsert       PG: execute_values           SQLite: executemany
+#   stream       PG: server-side cursor       SQLite: fetchmany
+#   read_sql     pandas + 共用 SQLAlchemy engine (聚合查詢)
+# 以環境變數 PTT_DB_BACKEND=postgres|sqlite 選擇引擎 (預設 postgres)
+# ----------------------------
+
+DB_BACKEND = os.environ.get("PTT_DB_BACKEND", "postgres")
+STREAM_BATCH = 5000
+
+# PostgreSQL 連線參數
+PG_HOST = "localhost"
+PG_PORT = 5432
+PG_DBNAME = "ptt_db"
+PG_USER = "ptt_user"
+PG_PASSWORD = "ptt_password"
+
+TIME_BUCKET_FORMATS = {
+    "minute": "%%Y-%%m-%%d %%H:%%M:00",
+    "hour": "%%Y-%%m-%%d %%H:00:00",
+    "day": "%%Y-%%m-%%d 00:00:00",
+}
+
+def _csv_field(value):
+    """
+    COPY (FORMAT csv)：未加引號的空欄位為 NULL，字串一律加引號以保留空字串
+    """
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    if isinstance(value, datetime):
+        return value.isoformat(" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+class PostgresBackend:
+    name = "postgres"
+    label = "PostgreSQL"
+
+    def __init__(self):
+        if psycopg2 is None:
+            raise RuntimeError("psycopg2 is required for the PostgreSQL backend")
+        self.IntegrityError = psycopg2.IntegrityError
+        self._engine = None
+        self._cursor_ids = itertools.count()
+
+    # ---------- 連線 ----------
+    def connect(self, readonly=False, attach_shards=None):
+        """
+        attach_shards 只對 SQLite 有意義 (推文月分片)；PG 的分區對查詢透明
+        """
+        conn = psycopg2.connect(
+            host=PG_HOST,
+            port=PG_PORT,
+            dbname=PG_DBNAME,
+            user=PG_USER,
+            password=PG_PASSWORD
+        )
+        if readonly:
+            conn.set_session(readonly=True)
+        return conn
+
+    def engine(self):
+        if self._engine is None:
+            from sqlalchemy import create_engine
+
+            db_uri = f"postgresql+psycopg2://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DBNAME}"
+            self._engine = create_engine(db_uri)
+        return self._engine
+
+    @contextmanager
+    def transaction(self, conn):
+        cur = conn.cursor()
+        try:
+            yield cur
+        except Exception:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            cur.close()
+
+    @contextmanager
+    def read_snapshot(self, conn):
+        """
+        讀取端的一致快照：期間所有查詢 (含 stream) 看到同一時間點的資料
+        """
+        conn.rollback()
+        conn.set_session(isolation_level="REPEATABLE READ")
+        try:
+            yield
+        finally:
+            conn.rollback()
+            conn.set_session(isolation_level="DEFAULT")
+
+    # ---------- SQL 方言 ----------
+    def sql(self, query):
+        return query
+
+    def ddl(self, statement):
+        return statement
+
+    def left(self, expr, n):
+        return f"LEFT({expr}, {int(n)})"
+
+    def star_int(self, expr):
+        return f"CAST({self.left(expr, 1)} AS INT)"
+
+    def time_bucket(self, expr, resolution):
+        if resolution not in TIME_BUCKET_FORMATS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        return f"date_trunc('{resolution}', {expr})"
+
+    def to_date(self, expr):
+        return f"CAST({expr} AS DATE)"
+
+    def days_ago(self, param):
+        return f"CURRENT_DATE - %({param})s"
+
+    def now(self):
+        """
+        資料庫伺服器的現在時間 (不含時區、到秒)；多台主機協調時以此為準
+        """
+        return "LOCALTIMESTAMP(0)"
+
+    def seconds_from_now(self, param):
+        return f"LOCALTIMESTAMP(0) + %({param})s * INTERVAL '1 second'"
+
+    def epoch_now(self):
+        """
+        伺服器時鐘的 Unix 秒數 (含小數)，clock_timestamp() 不受交易開始時間影響
+        """
+        return "EXTRACT(EPOCH FROM clock_timestamp())::float8"
+
+    def least(self, *exprs):
+        return f"LEAST({', '.join(exprs)})"
+
+    def greatest(self, *exprs):
+        return f"GREATEST({', '.join(exprs)})"
+
+    def skip_locked(self):
+        """
+        搶工作佇列時略過其他交易已鎖定的列
+        """
+        return "FOR UPDATE SKIP LOCKED"
+
+    def in_list(self, column, values, param):
+        """
+        回傳 (條件, 參數)；PG 以單一陣列參數傳入
+        """
+        return f"{column} = ANY(%({param})s)", {param: list(values)}
+
+    def approx_count_sql(self, table):
+        # 尚未 ANALYZE 過的表為 -1 (或 0)，呼叫端需退回 COUNT(*)
+        return f"SELECT reltuples::bigint AS cnt FROM pg_class WHERE relname = '{table}'"
+
+    # ---------- 寫入原語 ----------
+    def execute(self, cur, query, params=None):
+        cur.execute(self.sql(query), params)
+
+    def add_column(self, cur, table, column, coltype):
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {coltype}")
+
+    def truncate(self, cur, tables):
+        cur.execute(f"TRUNCATE {', '.join(tables)}")
+
+    def insert_returning_id(self, cur, table, columns, values):
+        cur.execute(f"""
+        INSERT INTO {table}({", ".join(columns)})
+        VALUES ({", ".join(["%s"] * len(columns))})
+        RETURNING id
+        """, tuple(values))
+        return cur.fetchone()[0]
+
+    def bulk_insert(self, cur, table, columns, rows):
+        rows = list(rows)
+        if not rows:
+            return 0
+        buf = io.StringIO()
+        for row in rows:
+            buf.write(",".join(_csv_field(v) for v in row))
+            buf.write("\n")
+        buf.seek(0)
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+        return len(rows)
+
+    def bulk_update(self, cur, table, key, columns, rows, page_size=1000):
+        """
+        rows: (key, col1, col2, ...)；單一 UPDATE ... FROM (VALUES ...) 更新整批
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        set_clause = ", ".join(f"{c} = v.{c}" for c in columns)
+        execute_values(cur, f"""
+        UPDATE {table} AS t SET {set_clause}
+        FROM (VALUES %s) AS v({key}, {", ".join(columns)})
+        WHERE t.{key} = v.{key}
+        """, rows, page_size=page_size)
+        return len(rows)
+
+    def upsert(self, cur, table, columns, conflict, rows, update, page_size=1000):
+        """
+        update: ON CONFLICT 時的 SET 子句，可使用 EXCLUDED.<col> 與 <table>.<col>
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        execute_values(cur, f"""
+        INSERT INTO {table}({", ".join(columns)})
+        VALUES %s
+        ON CONFLICT ({", ".join(conflict)}) DO UPDATE SET {update}
+        """, rows, page_size=page_size)
+        return len(rows)
+
+    # ---------- 讀取原語 ----------
+    def stream(self, conn, query, params=None, batch_size=STREAM_BATCH):
+        """
+        逐批產生 (欄位名稱, rows)，記憶體只保留一批
+        """
+        cur = conn.cursor(name=f"stream_{next(self._cursor_ids)}")
+        cur.itersize = batch_size
+        try:
+            cur.execute(self.sql(query), params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [d[0] for d in cur.description], rows
+        finally:
+            cur.close()
+
+    def read_sql(self, query, params=None):
+        import pandas as pd
+
+        return pd.read_sql_query(self.sql(query), self.engine(), params=params)
+
+class SQLiteBackend(PostgresBackend):
+    name = "sqlite"
+    label = "SQLite"
+
+    # %(name)s -> :name, %s -> ?, %% -> %
+    PARAM_RE = re.compile(r"%\((\w+)\)s|%s|%%")
+
+    def __init__(self, path=SQLITE_DB_PATH):
+        self.path = path
+        self.IntegrityError = sqlite3.IntegrityError
+        self._engine = None
+
+    # ---------- 連線 ----------
+    def connect(self, readonly=False, attach_shards=None):
+        return get_sqlite_connection(self.path, readonly=readonly, attach_shards=attach_shards)
+
+    def engine(self):
+        if self._engine is None:
+            self._engine = get_sqlite_engine(self.path, readonly=True)
+        return self._engine
+
+    @contextmanager
+    def transaction(self, conn):
+        with write_transaction(conn):
+            cur = conn.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+
+    @contextmanager
+    def read_snapshot(self, conn):
+        # WAL：讀取交易從第一次讀取起固定在同一個版本
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN")
+        try:
+            yield
+        finally:
+            conn.rollback()
+
+    # ---------- SQL 方言 ----------
+    def sql(self, query):
+        def repl(m):
+            if m.group(1):
+                return f":{m.group(1)}"
+            return "?" if m.group(0) == "%s" else "%"
+        return self.PARAM_RE.sub(repl, query)
+
+    def ddl(self, statement):
+        return statement.replace("SERIAL PRIMARY KEY", "INTEGER PRIMARY KEY").replace("BYTEA", "BLOB")
+
+    def left(self, expr, n):
+        return f"substr({expr}, 1, {int(n)})"
+
+    def time_bucket(self, expr, resolution):
+        if resolution not in TIME_BUCKET_FORMATS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        return f"strftime('{TIME_BUCKET_FORMATS[resolution]}', {expr})"
+
+    def to_date(self, expr):
+        return f"date({expr})"
+
+    def days_ago(self, param):
+        return f"date('now', 'localtime', '-' || %({param})s || ' days')"
+
+    def now(self):
+        return "datetime('now', 'localtime')"
+
+    def seconds_from_now(self, param):
+        return f"datetime('now', 'localtime', '+' || %({param})s || ' seconds')"
+
+    def epoch_now(self):
+        return "((julianday('now') - 2440587.5) * 86400.0)"
+
+    def least(self, *exprs):
+        return f"MIN({', '.join(exprs)})"
+
+    def greatest(self, *exprs):
+        return f"MAX({', '.join(exprs)})"
+
+    def skip_locked(self):
+        # BEGIN IMMEDIATE 已讓寫入交易依序執行，不需要列鎖
+        return ""
+
+    def in_list(self, column, values, param):
+        values = list(values)
+        if not values:
+            return "1 = 0", {}
+        params = {f"{param}_{i}": v for i, v in enumerate(values)}
+        placeholders = ", ".join(f"%({name})s" for name in params)
+        return f"{column} IN ({placeholders})", params
+
+    def approx_count_sql(self, table):
+        # INTEGER PRIMARY KEY 的最大值：O(log n)，刪除過資料時會偏高
+        return f"SELECT MAX(rowid) AS cnt FROM {table}"
+
+    # ---------- 寫入原語 ----------
+    def execute(self, cur, query, params=None):
+        cur.execute(self.sql(query), params if params is not None else ())
+
+    def add_column(self, cur, table, column, coltype):
+        try:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {coltype}")
+        except sqlite3.OperationalError as e:
+            if "duplicate column" not in str(e):
+                raise
+
+    def truncate(self, cur, tables):
+        for table in tables:
+            cur.execute(f"DELETE FROM {table}")
+
+    def insert_returning_id(self, cur, table, columns, values):
+        cur.execute(f"""
+        INSERT INTO {table}({", ".join(columns)})
+        VALUES ({", ".join(["?"] * len(columns))})
+        """, tuple(values))
+        return cur.lastrowid
+
+    def bulk_insert(self, cur, table, columns, rows):
+        rows = list(rows)
+        if rows:
+            cur.executemany(f"""
+            INSERT INTO {table}({", ".join(columns)})
+            VALUES ({", ".join(["?"] * len(columns))})
+            """, rows)
+        return len(rows)
+
+    def bulk_update(self, cur, table, key, columns, rows, page_size=None):
+        rows = list(rows)
+        if rows:
+            set_clause = ", ".join(f"{c} = ?" for c in columns)
+            cur.executemany(f"UPDATE {table} SET {set_clause} WHERE {key} = ?",
+                            [tuple(r[1:]) + (r[0],) for r in rows])
+        return len(rows)
+
+    def upsert(self, cur, table, columns, conflict, rows, update, page_size=None):
+        rows = list(rows)
+        if rows:
+            cur.executemany(f"""
+            INSERT INTO {table}({", ".join(columns)})
+            VALUES ({", ".join(["?"] * len(columns))})
+            ON CONFLICT ({", ".join(conflict)}) DO UPDATE SET {update}
+            """, rows)
+        return len(rows)
+
+    # ---------- 讀取原語 ----------
+    def stream(self, conn, query, params=None, batch_size=STREAM_BATCH):
+        cur = conn.cursor()
+        try:
+            cur.execute(self.sql(query), params if params is not None else ())
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [d[0] for d in cur.description], rows
+        finally:
+            cur.close()
+
+BACKENDS = {"postgres": PostgresBackend, "sqlite": SQLiteBackend}
+_backends = {}
+
+def get_backend(name=None):
+    """
+    name 省略時依 PTT_DB_BACKEND 決定；同一引擎在行程內共用一個實例 (與其 engine)
+    """
+    name = name or DB_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend: {name}")
+    if name not in _backends:
+        _backends[name] = BACKENDS[name]()
+    return _backends[name]
@@ -0,0 +1,217 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+from storage import PostgresBackend, SQLiteBackend
+
+# ----------------------------
+# 儲存層一致性檢查 + 效能基準
+# 對每個 backend 以相同資料執行 storage.py 的各項原語，
+# 結果必須與 Python 端計算的期望值一致，並記錄各原語耗時。
+#   python storage_conformance.py                      # 只測 SQLite (暫存檔)
+#   python storage_conformance.py --backend all        # SQLite + PostgreSQL
+#   python storage_conformance.py --rows 200000
+# PostgreSQL 會在 ptt_db 建立 storage_conf_* 暫用表，結束後刪除
+# ----------------------------
+
+TABLE = "storage_conf_items"
+COUNT_TABLE = "storage_conf_counts"
+BOARDS = ["Gossiping", "NBA", "Stock"]
+BASE_TIME = datetime(2024, 1, 1, 0, 0, 0)
+
+def make_rows(n, seed=42):
+    """
+    (id, timestamp, board, label, note)；note 含 NULL、空字串、引號、換行與中文，檢查 COPY 跳脫
+    """
+    rng = random.Random(seed)
+    notes = [None, "", 'say "hi"', "a,b", "line1\nline2", "中文推文", "back\\slash"]
+    rows = []
+    for i in range(1, n + 1):
+        ts = BASE_TIME + timedelta(minutes=rng.randrange(0, 60 * 24 * 30))
+        rows.append((i, ts, rng.choice(BOARDS), f"{rng.randint(1, 5)} stars", rng.choice(notes)))
+    return rows
+
+def create_tables(backend, cur):
+    for table in (TABLE, COUNT_TABLE):
+        cur.execute(f"DROP TABLE IF EXISTS {table}")
+    cur.execute(backend.ddl(f"""
+    CREATE TABLE {TABLE} (
+        id SERIAL PRIMARY KEY,
+        timestamp TIMESTAMP,
+        board TEXT,
+        label TEXT,
+        note TEXT,
+        score DOUBLE PRECISION,
+        link TEXT UNIQUE
+    );
+    """))
+    cur.execute(f"""
+    CREATE TABLE {COUNT_TABLE} (
+        board TEXT NOT NULL,
+        term TEXT NOT NULL,
+        cnt INT NOT NULL,
+        PRIMARY KEY (board, term)
+    );
+    """)
+
+def drop_tables(backend, conn):
+    with backend.transaction(conn) as cur:
+        for table in (TABLE, COUNT_TABLE):
+            cur.execute(f"DROP TABLE IF EXISTS {table}")
+
+class Checker:
+    def __init__(self, name):
+        self.name = name
+        self.failures = []
+        self.timings = []
+
+    def check(self, what, ok, detail=""):
+        if not ok:
+            self.failures.append(f"{what} {detail}".strip())
+        print(f"  [{'OK' if ok else 'FAIL'}] {what}" + (f" {detail}" if not ok and detail else ""))
+
+    def timed(self, what, n, func):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        self.timings.append((what, n, elapsed))
+        return result
+
+def run_backend(backend, n_rows):
+    chk = Checker(backend.name)
+    print(f"== {backend.label} ({n_rows} rows) ==")
+    rows = make_rows(n_rows)
+    conn = backend.connect()
+    try:
+        with backend.transaction(conn) as cur:
+            create_tables(backend, cur)
+
+        # (1) bulk_insert + stream 讀回
+        with backend.transaction(conn) as cur:
+            # id 由資料庫產生 (新表依插入順序為 1..n)
+            chk.timed("bulk_insert", n_rows, lambda: backend.bulk_insert(
+                cur, TABLE, ["timestamp", "board", "label", "note"], [r[1:] for r in rows]))
+        read_back = []
+        chk.timed("stream", n_rows, lambda: [
+            read_back.extend(batch) for _, batch in backend.stream(
+                conn, f"SELECT id, timestamp, board, label, note FROM {TABLE} ORDER BY id", batch_size=10000)
+        ])
+        chk.check("bulk_insert/stream round trip", [tuple(r) for r in read_back] == rows,
+                  f"({len(read_back)} rows read)")
+
+        # (2) bulk_update
+        updates = [(r[0], f"{(int(r[3][0]) % 5) + 1} stars", r[0] / 10) for r in rows[::2]]
+        with backend.transaction(conn) as cur:
+            chk.timed("bulk_update", len(updates), lambda: backend.bulk_update(
+                cur, TABLE, "id", ["label", "score"], updates))
+        df = backend.read_sql(f"SELECT id, label, score FROM {TABLE} WHERE score IS NOT NULL ORDER BY id")
+        expected = {u[0]: (u[1], u[2]) for u in updates}
+        got = {int(i): (l, float(s)) for i, l, s in zip(df["id"], df["label"], df["score"])}
+        chk.check("bulk_update", got == expected)
+
+        # (3) upsert 累加
+        count_rows = [(b, f"t{i % 5000}", 1) for i, b in enumerate(r[2] for r in rows)]
+        expected_counts = {}
+        for b, t, c in count_rows:
+            expected_counts[(b, t)] = expected_counts.get((b, t), 0) + c
+        with backend.transaction(conn) as cur:
+            # 同一批次內主鍵不可重複 (PG ON CONFLICT 限制)，先合併再分兩次寫入驗證累加
+            half = {k: v // 2 for k, v in expected_counts.items()}
+            rest = {k: v - half[k] for k, v in expected_counts.items()}
+            for part in (half, rest):
+                chk.timed("upsert", len(part), lambda: backend.upsert(
+                    cur, COUNT_TABLE, ["board", "term", "cnt"], ["board", "term"],
+                    [(b, t, c) for (b, t), c in part.items()],
+                    update=f"cnt = {COUNT_TABLE}.cnt + EXCLUDED.cnt"))
+        df = backend.read_sql(f"SELECT board, term, cnt FROM {COUNT_TABLE}")
+        got = {(b, t): int(c) for b, t, c in zip(df["board"], df["term"], df["cnt"])}
+        chk.check("upsert accumulate", got == expected_counts)
+
+        # (4) insert_returning_id + IntegrityError
+        with backend.transaction(conn) as cur:
+            new_id = backend.insert_returning_id(cur, TABLE, ["timestamp", "board", "link"],
+                                                 (BASE_TIME, "NBA", "https://example/1"))
+        chk.check("insert_returning_id", new_id == n_rows + 1, f"(got {new_id})")
+        try:
+            with backend.transaction(conn) as cur:
+                backend.insert_returning_id(cur, TABLE, ["timestamp", "board", "link"],
+                                            (BASE_TIME, "NBA", "https://example/1"))
+            chk.check("IntegrityError on duplicate", False)
+        except backend.IntegrityError:
+            chk.check("IntegrityError on duplicate", True)
+
+        # (5) 方言函式：in_list / star_int / left / time_bucket / to_date (聚合)
+        ids = [r[0] for r in rows[:50]]
+        in_ids, params = backend.in_list("id", ids, "ids")
+        df = backend.read_sql(f"SELECT COUNT(*) AS cnt FROM {TABLE} WHERE {in_ids}", params)
+        chk.check("in_list", int(df["cnt"].iloc[0]) == len(ids))
+
+        df = chk.timed("aggregate (time_bucket)", n_rows, lambda: backend.read_sql(f"""
+        SELECT {backend.time_bucket("timestamp", "day")} AS bucket,
+               AVG({backend.star_int("label")}) AS star, COUNT(*) AS cnt
+        FROM {TABLE}
+        WHERE board = %(board)s AND label IS NOT NULL
+        GROUP BY {backend.time_bucket("timestamp", "day")}
+        ORDER BY bucket
+        """, {"board": "Stock"}))
+        final_labels = {r[0]: r[3] for r in rows}
+        final_labels.update({u[0]: u[1] for u in updates})
+        expected_days = {}
+        for r in rows:
+            if r[2] == "Stock":
+                day = r[1].replace(hour=0, minute=0)
+                cnt, total = expected_days.get(day, (0, 0))
+                expected_days[day] = (cnt + 1, total + int(final_labels[r[0]][0]))
+        got_days = {
+            datetime.fromisoformat(str(b)): (int(c), round(float(s) * c))
+            for b, s, c in zip(df["bucket"], df["star"], df["cnt"])
+        }
+        chk.check("time_bucket/star_int aggregate", got_days == expected_days)
+
+        df = backend.read_sql(f"""
+        SELECT {backend.left("label", 1)} AS head, {backend.to_date("timestamp")} AS day
+        FROM {TABLE} WHERE id = %(id)s
+        """, {"id": rows[0][0]})
+        chk.check("left/to_date", df["head"].iloc[0] == updates[0][1][0]
+                  and str(df["day"].iloc[0]) == rows[0][1].date().isoformat())
+
+        df = backend.read_sql(backend.approx_count_sql(TABLE))
+        chk.check("approx_count_sql", len(df) == 1)
+    finally:
+        drop_tables(backend, conn)
+        conn.close()
+    return chk
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage backend conformance checks and benchmark")
+    parser.add_argument("--backend", choices=["sqlite", "postgres", "all"], default="sqlite")
+    parser.add_argument("--rows", type=int, default=50000)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.backend in ("sqlite", "all"):
+            results.append(run_backend(SQLiteBackend(os.path.join(tmp, "conformance.db")), args.rows))
+        if args.backend in ("postgres", "all"):
+            results.append(run_backend(PostgresBackend(), args.rows))
+
+    print("\n== benchmark ==")
+    print(f"{'backend':<10}{'primitive':<26}{'rows':>10}{'seconds':>10}{'rows/s':>12}")
+    for chk in results:
+        for what, n, elapsed in chk.timings:
+            print(f"{chk.name:<10}{what:<26}{n:>10}{elapsed:>10.3f}{n / elapsed if elapsed else 0:>12.0f}")
+
+    failures = [(chk.name, f) for chk in results for f in chk.failures]
+    if failures:
+        print("\nFAILED:")
+        for name, f in failures:
+            print(f"  {name}: {f}")
+        sys.exit(1)
+    print("\nAll conformance checks passed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import re
+import sys
+import logging
+from collections import Counter
+
+from storage import get_backend
+
+# ----------------------------
+# 標題詞頻索引 (文字雲用)
+# 爬蟲寫入文章時即斷詞，依 (看板, 日期, 詞) 累加到 term_daily，
+# dashboard 只需 SUM 出 top-K 再用 generate_from_frequencies 繪圖。
+# 安裝 jieba 時使用 jieba 斷詞，否則退回中文雙字詞 (bigram) + 英數單字
+# ----------------------------
+
+try:
+    import jieba
+    jieba.setLogLevel(logging.WARNING)
+except ImportError:
+    jieba = None
+
+# 標題開頭的 Re:/Fw: 與分類標籤 ([問卦]、[新聞]...) 不列入詞頻
+TITLE_PREFIX_RE = re.compile(r"^\s*(?:(?:Re|Fw)\s*:\s*)*(?:\[[^\]]{1,8}\]\s*)?", re.IGNORECASE)
+CJK_RUN_RE = re.compile(r"[\u4e00-\u9fff\u3400-\u4dbf]+")
+WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9.+&-]*|\d+(?:\.\d+)?%?")
+STOPWORDS = {
+    "的", "了", "是", "在", "有", "嗎", "啊", "吧", "呢", "什麼", "怎麼", "為什麼",
+    "一個", "這個", "那個", "是不是", "有沒有", "re", "fw",
+}
+MIN_TERM_LEN = 2
+
+# ----------------------------
+# 斷詞
+# ----------------------------
+def tokenize(title: str):
+    if not title:
+        return []
+    text = TITLE_PREFIX_RE.sub("", title)
+    terms = []
+    if jieba is not None:
+        for w in jieba.cut(text):
+            w = w.strip()
+            if len(w) >= MIN_TERM_LEN and (CJK_RUN_RE.fullmatch(w) or WORD_RE.fullmatch(w)):
+                terms.append(w)
+    else:
+        for run in CJK_RUN_RE.findall(text):
+            if len(run) < MIN_TERM_LEN:
+                continue
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        terms.extend(WORD_RE.findall(text))
+    return [t for t in terms if len(t) >= MIN_TERM_LEN and t.lower() not in STOPWORDS]
+
+# ----------------------------
+# 建表
+# ----------------------------
+def init_term_index(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS term_daily (
+        board TEXT NOT NULL,
+        day DATE NOT NULL,
+        term TEXT NOT NULL,
+        cnt INT NOT NULL,
+        PRIMARY KEY (board, day, term)
+    );
+    """)
+
+# ----------------------------
+# 累加單篇標題 (與文章 INSERT 同一交易)
+# ----------------------------
+def add_title(cur, board, timestamp, title, backend=None):
+    counts = Counter(tokenize(title))
+    if not counts or timestamp is None:
+        return
+    backend = backend or get_backend()
+    day = timestamp.date()
+    backend.upsert(cur, "term_daily", ["board", "day", "term", "cnt"], ["board", "day", "term"],
+                   [(board, day, term, cnt) for term, cnt in counts.items()],
+                   update="cnt = term_daily.cnt + EXCLUDED.cnt")
+
+# ----------------------------
+# 由 sentiments 全量重建 (首次導入或調整斷詞規則後)
+# ----------------------------
+def rebuild_term_index(batch_size=5000, backend=None):
+    backend = backend or get_backend()
+    conn = backend.connect()
+    with backend.transaction(conn) as cur:
+        init_term_index(cur)
+        backend.truncate(cur, ["term_daily"])
+
+        # 逐批讀取標題，只在記憶體中保留 (看板, 日期, 詞) 計數
+        counts = Counter()
+        n_titles = 0
+        scan = "SELECT board, timestamp, title FROM sentiments WHERE timestamp IS NOT NULL"
+        for _, rows in backend.stream(conn, scan, batch_size=batch_size):
+            for board, timestamp, title in rows:
+                day = timestamp.date()
+                for term in tokenize(title):
+                    counts[(board, day, term)] += 1
+            n_titles += len(rows)
+
+        rows = [(board, day, term, cnt) for (board, day, term), cnt in counts.items()]
+        backend.bulk_insert(cur, "term_daily", ["board", "day", "term", "cnt"], rows)
+    conn.close()
+    logging.info(f"Term index rebuilt from {n_titles} titles ({len(rows)} rows).")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    try:
+        rebuild_term_index()
+    except Exception as e:
+        logging.error(f"Term index rebuild error: {e}")
+        sys.exit(1)
@@ -1,9 +1,13 @@
-import sqlite3
+from sqlite_db import get_sqlite_connection
+from storage import get_backend
+from compact_storage import decode_content
 
-conn = sqlite3.connect("ptt_data.db")
+backend = get_backend("sqlite")
+conn = get_sqlite_connection(readonly=True)
 cur = conn.cursor()
-cur.execute("SELECT id, title, title_star_label, content, content_star_label FROM sentiments LIMIT 10")
+# 內文可能已壓縮為 content_z (content 為 NULL)，需以字典解碼
+cur.execute("SELECT id, title, title_star_label, content, content_z, content_dict, content_star_label FROM sentiments LIMIT 10")
 rows = cur.fetchall()
-for row in rows:
-    print(row)
-conn.close()
\ No newline at end of file
+for id_, title, title_star, content, content_z, content_dict, content_star in rows:
+    print((id_, title, title_star, decode_content(content, content_z, content_dict, backend), content_star))
+conn.close()
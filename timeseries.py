@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+# ----------------------------
+# 時間粒度 (對應 PostgreSQL date_trunc 的單位)
+# ----------------------------
+RESOLUTIONS = ["minute", "hour", "day"]
+RESOLUTION_SECONDS = {
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+}
+MAX_BUCKETS = 2000
+
+# ----------------------------
+# 依可見時間範圍挑選粒度
+# ----------------------------
+def pick_resolution(start, end, max_buckets=MAX_BUCKETS):
+    """
+    回傳讓桶數不超過 max_buckets 的最細粒度；範圍越小粒度越細
+    """
+    span = max((end - start).total_seconds(), 1)
+    for res in RESOLUTIONS:
+        if span / RESOLUTION_SECONDS[res] <= max_buckets:
+            return res
+    return RESOLUTIONS[-1]
+
+# ----------------------------
+# LTTB (Largest-Triangle-Three-Buckets) 降採樣
+# ----------------------------
+def lttb_indices(x, y, threshold):
+    """
+    x, y: 依 x 遞增排序的序列 (x 可為 datetime64)
+    回傳保留點的索引，最多 threshold 個，保留首尾點與視覺上的峰谷
+    """
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype("datetime64[ns]").astype(np.int64)
+    x = x.astype(np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        # 下一個桶的平均點
+        avg_start = int(np.floor((i + 1) * every)) + 1
+        avg_end = min(int(np.floor((i + 2) * every)) + 1, n)
+        avg_x = x[avg_start:avg_end].mean()
+        avg_y = y[avg_start:avg_end].mean()
+
+        # 目前桶中與 (前一選點, 下一桶平均) 圍出最大三角形的點
+        range_start = int(np.floor(i * every)) + 1
+        range_end = int(np.floor((i + 1) * every)) + 1
+        area = np.abs(
+            (x[a] - avg_x) * (y[range_start:range_end] - y[a])
+            - (x[a] - x[range_start:range_end]) * (avg_y - y[a])
+        )
+        a = range_start + int(np.argmax(area))
+        indices[i + 1] = a
+    indices[-1] = n - 1
+    return indices
+
+def downsample_series(df, x_col, y_col, group_col=None, threshold=1000):
+    """
+    對長表 (long format) 的每一條序列各自做 LTTB，回傳縮減後的 DataFrame
+    """
+    if group_col is None:
+        df = df.sort_values(x_col)
+        return df.iloc[lttb_indices(df[x_col].values, df[y_col].values, threshold)]
+    parts = []
+    for _, grp in df.groupby(group_col, sort=False):
+        grp = grp.dropna(subset=[y_col]).sort_values(x_col)
+        parts.append(grp.iloc[lttb_indices(grp[x_col].values, grp[y_col].values, threshold)])
+    if not parts:
+        return df
+    return pd.concat(parts)
@@ -0,0 +1,269 @@
+import sys
+import time
+import math
+import hashlib
+import logging
+import argparse
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+from storage import get_backend
+from term_index import tokenize
+from article_time import PTT_TZ
+
+# ----------------------------
+# 即時熱門話題偵測 (由 crawler_auto.py 餵入新文章標題)
+# 每個看板維護：
+#   滑動視窗 (WINDOW_BUCKETS 個 BUCKET_SEC 秒的桶) 的 count-min sketch，桶過期時整桶相減
+#   baseline：過期桶以 EWMA 併入的長期每桶平均 (同樣是 count-min sketch)
+#   heavy hitters：視窗內估計次數最高的 HEAVY_HITTERS 個詞 (候選集合大小固定)
+# 爆量分數 = (視窗次數 - 預期次數) / sqrt(預期次數 + 1)，預期次數 = baseline 每桶平均 x 視窗桶數
+# 記憶體只與 sketch 大小、看板數、候選數有關，與詞彙量無關。
+# 結果每 FLUSH_SEC 秒整批覆寫到 trending_terms (每看板 TOP_N 筆)，dashboard「熱門話題」頁讀取。
+#   python trending.py show --board Stock
+# ----------------------------
+
+BUCKET_SEC = 600                # 10 分鐘一桶
+WINDOW_BUCKETS = 6              # 視窗 = 最近 1 小時
+BASELINE_HALF_LIFE_BUCKETS = 36 # baseline 半衰期 6 小時
+WARMUP_HOURS = 24               # 啟動時以最近 24 小時的文章重建 baseline
+CMS_WIDTH = 4096
+CMS_DEPTH = 4
+HEAVY_HITTERS = 200
+TOP_N = 30
+MIN_WINDOW_COUNT = 3            # 視窗內至少出現幾篇、且高於預期才列入
+FLUSH_SEC = 60
+
+BASELINE_ALPHA = 1 - 0.5 ** (1 / BASELINE_HALF_LIFE_BUCKETS)
+
+# ----------------------------
+# Count-min sketch
+# ----------------------------
+@lru_cache(maxsize=16384)
+def sketch_columns(term, width=CMS_WIDTH, depth=CMS_DEPTH):
+    """
+    雙重雜湊 (h1 + i * h2) 產生 depth 個欄位；快取大小固定，不隨詞彙量成長
+    """
+    digest = hashlib.blake2b(term.encode("utf-8"), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return np.array([(h1 + i * h2) % width for i in range(depth)], dtype=np.intp)
+
+class CountMinSketch:
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH, dtype=np.int64):
+        self.width = width
+        self.depth = depth
+        self.rows = np.arange(depth)
+        self.table = np.zeros((depth, width), dtype=dtype)
+
+    def add(self, term, n=1):
+        self.table[self.rows, sketch_columns(term, self.width, self.depth)] += n
+
+    def estimate(self, term):
+        return self.table[self.rows, sketch_columns(term, self.width, self.depth)].min()
+
+# ----------------------------
+# 單一看板的滑動視窗
+# ----------------------------
+class BoardTrends:
+    def __init__(self):
+        self.ring = deque()             # 視窗內各桶 (最後一個為目前的桶)
+        self.window = CountMinSketch()  # ring 中各桶的總和
+        self.baseline = CountMinSketch(dtype=np.float64)
+        self.bucket_id = None
+        self.baseline_buckets = 0
+        self.candidates = {}            # 詞 -> 視窗估計次數
+        self.min_candidate = 0
+
+    def roll(self, now):
+        bucket_id = int(now // BUCKET_SEC)
+        if self.bucket_id is None:
+            self.bucket_id = bucket_id
+            self.ring.append(CountMinSketch())
+            return
+        steps = bucket_id - self.bucket_id
+        if steps <= 0:
+            return
+        self.bucket_id = bucket_id
+        # 視窗內的桶依序過期 (超過視窗長度的部分都是空桶，只需衰減 baseline)
+        for _ in range(min(steps, WINDOW_BUCKETS)):
+            if len(self.ring) == WINDOW_BUCKETS:
+                expired = self.ring.popleft()
+                self.window.table -= expired.table
+                self.baseline.table *= 1 - BASELINE_ALPHA
+                self.baseline.table += BASELINE_ALPHA * expired.table
+                self.baseline_buckets += 1
+                expired.table[:] = 0
+                self.ring.append(expired)
+            else:
+                self.ring.append(CountMinSketch())
+        empty_steps = steps - min(steps, WINDOW_BUCKETS)
+        if empty_steps:
+            self.baseline.table *= (1 - BASELINE_ALPHA) ** empty_steps
+            self.baseline_buckets += empty_steps
+        # 視窗次數下降後重新估計候選詞
+        self.candidates = {t: c for t in self.candidates if (c := int(self.window.estimate(t))) > 0}
+        self.min_candidate = min(self.candidates.values(), default=0)
+
+    def observe(self, terms, now):
+        self.roll(now)
+        current = self.ring[-1]
+        for term in terms:
+            current.add(term)
+            self.window.add(term)
+            self.track(term, int(self.window.estimate(term)))
+
+    def track(self, term, count):
+        """
+        固定大小的 heavy hitter 候選集合：滿了之後只有估計次數超過目前最小者才換入
+        """
+        candidates = self.candidates
+        if term in candidates:
+            candidates[term] = count
+            return
+        if len(candidates) < HEAVY_HITTERS:
+            candidates[term] = count
+            self.min_candidate = min(self.min_candidate, count) if len(candidates) > 1 else count
+            return
+        if count <= self.min_candidate:
+            return
+        victim = min(candidates, key=candidates.get)
+        del candidates[victim]
+        candidates[term] = count
+        self.min_candidate = min(candidates.values())
+
+    def top(self, now, n=TOP_N):
+        self.roll(now)
+        rows = []
+        for term in self.candidates:
+            count = int(self.window.estimate(term))
+            if count < MIN_WINDOW_COUNT:
+                continue
+            expected = float(self.baseline.estimate(term)) * WINDOW_BUCKETS
+            score = (count - expected) / math.sqrt(expected + 1)
+            if score <= 0:
+                continue
+            rows.append((term, count, expected, score))
+        rows.sort(key=lambda r: (-r[3], -r[1]))
+        return rows[:n]
+
+# ----------------------------
+# 各看板的偵測器 + 定期寫入 trending_terms
+# ----------------------------
+def init_trending(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS trending_terms (
+        board TEXT NOT NULL,
+        term TEXT NOT NULL,
+        rank INT NOT NULL,
+        window_count INT NOT NULL,
+        expected DOUBLE PRECISION NOT NULL,
+        score DOUBLE PRECISION NOT NULL,
+        baseline_buckets INT NOT NULL,
+        updated_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (board, term)
+    );
+    """)
+
+class TrendTracker:
+    """
+    observe() 可能同時由主迴圈與重試執行緒呼叫，以 lock 保護
+    """
+    def __init__(self, backend=None):
+        self.backend = backend or get_backend()
+        self.boards = {}
+        self.lock = threading.Lock()
+        self.last_flush = time.time()
+
+    def observe(self, board, title, now=None):
+        now = time.time() if now is None else now
+        terms = set(tokenize(title))
+        if not terms:
+            return
+        with self.lock:
+            trends = self.boards.get(board)
+            if trends is None:
+                trends = self.boards[board] = BoardTrends()
+            trends.observe(terms, now)
+        if now - self.last_flush >= FLUSH_SEC:
+            self.flush(now)
+
+    def warm_up(self, hours=WARMUP_HOURS):
+        """
+        以最近 hours 小時的文章標題 (依發文時間) 重播，重啟後 baseline 不必從零開始。
+        sentiments.timestamp 為不含時區的台灣時間，換算 epoch 時明確指定 PTT_TZ，與主機時區無關
+        """
+        since = datetime.now(PTT_TZ).replace(tzinfo=None) - timedelta(hours=hours)
+        conn = self.backend.connect(readonly=True)
+        n_articles = 0
+        try:
+            scan = """
+            SELECT board, timestamp, title FROM sentiments
+            WHERE timestamp >= %(since)s ORDER BY timestamp
+            """
+            for _, rows in self.backend.stream(conn, scan, {"since": since}):
+                with self.lock:
+                    for board, timestamp, title in rows:
+                        terms = set(tokenize(title))
+                        if terms and board:
+                            self.boards.setdefault(board, BoardTrends()).observe(terms, timestamp.replace(tzinfo=PTT_TZ).timestamp())
+                n_articles += len(rows)
+        finally:
+            conn.close()
+        logging.info(f"Trend detector warmed up with {n_articles} articles from the last {hours}h.")
+
+    def flush(self, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            self.last_flush = now
+            results = {board: (trends.top(now), trends.baseline_buckets) for board, trends in self.boards.items()}
+        if not results:
+            return
+        updated_at = datetime.fromtimestamp(now).replace(microsecond=0)
+        conn = self.backend.connect()
+        try:
+            with self.backend.transaction(conn) as cur:
+                for board, (rows, baseline_buckets) in results.items():
+                    self.backend.execute(cur, "DELETE FROM trending_terms WHERE board = %s", (board,))
+                    self.backend.bulk_insert(
+                        cur, "trending_terms",
+                        ["board", "term", "rank", "window_count", "expected", "score", "baseline_buckets",
+                         "updated_at"],
+                        [(board, term, rank, count, round(expected, 3), round(score, 3), baseline_buckets,
+                          updated_at)
+                         for rank, (term, count, expected, score) in enumerate(rows, start=1)]
+                    )
+        except Exception as e:
+            logging.error(f"Writing trending_terms failed: {e}")
+        finally:
+            conn.close()
+
+# ----------------------------
+# 檢視目前結果
+# ----------------------------
+def print_trending(board=None, backend=None):
+    backend = backend or get_backend()
+    where = "WHERE board = %(board)s" if board else ""
+    df = backend.read_sql(f"""
+    SELECT board, rank, term, window_count, expected, score, updated_at
+    FROM trending_terms {where}
+    ORDER BY board, rank
+    """, {"board": board} if board else None)
+    print(df.to_string(index=False))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Trending terms detected by crawler_auto.py")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_show = sub.add_parser("show", help="print the current trending_terms table")
+    p_show.add_argument("--board")
+    args = parser.parse_args()
+    try:
+        print_trending(args.board)
+    except Exception as e:
+        logging.error(f"Trending error: {e}")
+        sys.exit(1)
@@ -0,0 +1,204 @@
+import sys
+import logging
+from collections import defaultdict
+
+from storage import get_backend
+from compact_storage import push_star_sql, push_tag_sql, push_labeled_sql
+
+# ----------------------------
+# 推文使用者 (push_userid) 索引
+# user_stats: 依 (使用者, 看板) 累計推文數、推 / 噓 / → 次數、星等總和與筆數、最早 / 最晚推文時間
+# user_daily: 依 (使用者, 日期) 累計推文數與星等，給 dashboard 畫單一使用者的活動趨勢
+# 兩張表都隨寫入遞增維護，不必掃描 push_comments：
+#   爬蟲寫入推文時 (同一交易) 以 add_pushes() 累加次數與時間
+#   post_sentiment.py 寫回推文星等時 (同一交易) 以 add_push_stars() 累加星等
+#   python user_index.py     # 首次導入或資料修正後，由 push_comments 全量重建
+# ----------------------------
+
+PUSH_TAGS = {"推": "up_cnt", "噓": "down_cnt", "→": "arrow_cnt"}
+STAT_COLUMNS = ["push_cnt", "up_cnt", "down_cnt", "arrow_cnt", "star_sum", "star_n"]
+DAILY_COLUMNS = ["push_cnt", "star_sum", "star_n"]
+
+# ----------------------------
+# 建表
+# ----------------------------
+def init_user_index(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS user_stats (
+        userid TEXT NOT NULL,
+        board TEXT NOT NULL,
+        push_cnt INT NOT NULL DEFAULT 0,
+        up_cnt INT NOT NULL DEFAULT 0,
+        down_cnt INT NOT NULL DEFAULT 0,
+        arrow_cnt INT NOT NULL DEFAULT 0,
+        star_sum INT NOT NULL DEFAULT 0,
+        star_n INT NOT NULL DEFAULT 0,
+        first_seen TIMESTAMP,
+        last_seen TIMESTAMP,
+        PRIMARY KEY (userid, board)
+    );
+    """)
+    # 單一看板的活躍使用者排行
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_user_stats_board_cnt ON user_stats (board, push_cnt DESC)")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS user_daily (
+        userid TEXT NOT NULL,
+        day DATE NOT NULL,
+        push_cnt INT NOT NULL DEFAULT 0,
+        star_sum INT NOT NULL DEFAULT 0,
+        star_n INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (userid, day)
+    );
+    """)
+
+def accumulate_update(table, columns):
+    return ", ".join(f"{c} = {table}.{c} + EXCLUDED.{c}" for c in columns)
+
+def seen_update(backend):
+    """
+    first_seen / last_seen 取較早 / 較晚者 (任一邊為 NULL 時取另一邊)
+    """
+    first = backend.least("COALESCE(user_stats.first_seen, EXCLUDED.first_seen)",
+                          "COALESCE(EXCLUDED.first_seen, user_stats.first_seen)")
+    last = backend.greatest("COALESCE(user_stats.last_seen, EXCLUDED.last_seen)",
+                            "COALESCE(EXCLUDED.last_seen, user_stats.last_seen)")
+    return f"first_seen = {first}, last_seen = {last}"
+
+def upsert_stats(cur, rows, backend):
+    """
+    rows: [(userid, board, push_cnt, up_cnt, down_cnt, arrow_cnt, star_sum, star_n, first_seen, last_seen), ...]
+    """
+    backend.upsert(cur, "user_stats", ["userid", "board"] + STAT_COLUMNS + ["first_seen", "last_seen"],
+                   ["userid", "board"], rows,
+                   update=accumulate_update("user_stats", STAT_COLUMNS) + ", " + seen_update(backend))
+
+def upsert_daily(cur, rows, backend):
+    """
+    rows: [(userid, day, push_cnt, star_sum, star_n), ...]
+    """
+    backend.upsert(cur, "user_daily", ["userid", "day"] + DAILY_COLUMNS, ["userid", "day"], rows,
+                   update=accumulate_update("user_daily", DAILY_COLUMNS))
+
+# ----------------------------
+# 累加單篇文章的推文 (與推文 INSERT 同一交易)
+# ----------------------------
+def add_pushes(cur, board, push_list, backend=None):
+    """
+    push_list: 爬蟲解析出的推文 dict (userid / tag / at)；星等此時尚未產生，由 add_push_stars() 補上
+    """
+    backend = backend or get_backend()
+    stats = {}
+    daily = defaultdict(int)
+    for p in push_list:
+        userid = p["userid"]
+        if not userid:
+            continue
+        entry = stats.get(userid)
+        if entry is None:
+            entry = stats[userid] = {"push_cnt": 0, "up_cnt": 0, "down_cnt": 0, "arrow_cnt": 0,
+                                     "first_seen": None, "last_seen": None}
+        entry["push_cnt"] += 1
+        if p["tag"] in PUSH_TAGS:
+            entry[PUSH_TAGS[p["tag"]]] += 1
+        at = p["at"]
+        if at is not None:
+            if entry["first_seen"] is None or at < entry["first_seen"]:
+                entry["first_seen"] = at
+            if entry["last_seen"] is None or at > entry["last_seen"]:
+                entry["last_seen"] = at
+            daily[(userid, at.date())] += 1
+    if not stats:
+        return
+    upsert_stats(cur, [(userid, board, e["push_cnt"], e["up_cnt"], e["down_cnt"], e["arrow_cnt"], 0, 0,
+                        e["first_seen"], e["last_seen"]) for userid, e in stats.items()], backend)
+    upsert_daily(cur, [(userid, day, cnt, 0, 0) for (userid, day), cnt in daily.items()], backend)
+
+# ----------------------------
+# 累加推文星等 (與 push_star_label 寫回同一交易)
+# ----------------------------
+def add_push_stars(cur, push_ids, backend=None):
+    """
+    push_ids: 本批剛寫入星等的推文 id；只在資料庫端彙總這些列 (主鍵查找)
+    """
+    backend = backend or get_backend()
+    push_ids = list(push_ids)
+    if not push_ids:
+        return
+    where, params = backend.in_list("p.id", push_ids, "pid")
+    star = push_star_sql(backend, "p")
+    backend.execute(cur, f"""
+    SELECT p.push_userid, s.board, {backend.to_date("p.push_at")} AS day,
+           SUM({star}) AS star_sum, COUNT({star}) AS star_n
+    FROM push_comments p
+    JOIN sentiments s ON s.id = p.article_id
+    WHERE {where} AND p.push_userid IS NOT NULL AND p.push_userid <> ''
+      AND {push_labeled_sql("p")}
+    GROUP BY p.push_userid, s.board, {backend.to_date("p.push_at")}
+    """, params)
+    stats = defaultdict(lambda: [0, 0])
+    daily = defaultdict(lambda: [0, 0])
+    for userid, board, day, star_sum, star_n in cur.fetchall():
+        stats[(userid, board)][0] += star_sum or 0
+        stats[(userid, board)][1] += star_n
+        if day is not None:
+            daily[(userid, day)][0] += star_sum or 0
+            daily[(userid, day)][1] += star_n
+    # 推文數已在爬取時計入，這裡只加星等
+    upsert_stats(cur, [(userid, board, 0, 0, 0, 0, s, n, None, None)
+                       for (userid, board), (s, n) in stats.items()], backend)
+    upsert_daily(cur, [(userid, day, 0, s, n) for (userid, day), (s, n) in daily.items()], backend)
+
+# ----------------------------
+# 由 push_comments 全量重建
+# ----------------------------
+def rebuild_user_index(batch_size=5000, backend=None):
+    backend = backend or get_backend()
+    # 讀取端附加推文月分片 (SQLite)，彙總結果分批寫入
+    reader = backend.connect(readonly=True, attach_shards=True)
+    writer = backend.connect()
+    star = push_star_sql(backend, "p")
+    tag = push_tag_sql("p")
+    tag_sums = ", ".join(f"SUM(CASE WHEN {tag} = '{t}' THEN 1 ELSE 0 END)" for t in PUSH_TAGS)
+    valid_user = "p.push_userid IS NOT NULL AND p.push_userid <> ''"
+    stats_sql = f"""
+    SELECT p.push_userid, s.board, COUNT(*), {tag_sums},
+           COALESCE(SUM({star}), 0), COUNT({star}), MIN(p.push_at), MAX(p.push_at)
+    FROM push_comments p
+    JOIN sentiments s ON s.id = p.article_id
+    WHERE {valid_user}
+    GROUP BY p.push_userid, s.board
+    """
+    day = backend.to_date("p.push_at")
+    daily_sql = f"""
+    SELECT p.push_userid, {day}, COUNT(*), COALESCE(SUM({star}), 0), COUNT({star})
+    FROM push_comments p
+    WHERE {valid_user} AND p.push_at IS NOT NULL
+    GROUP BY p.push_userid, {day}
+    """
+    counts = {}
+    # 清空與所有批次寫入在同一交易內：重建中途失敗會整個回滾，
+    # 其他連線在提交前不會讀到清空或半套的索引
+    try:
+        with backend.transaction(writer) as cur:
+            init_user_index(cur)
+            backend.truncate(cur, ["user_stats", "user_daily"])
+            for table, sql, columns in (
+                ("user_stats", stats_sql, ["userid", "board"] + STAT_COLUMNS + ["first_seen", "last_seen"]),
+                ("user_daily", daily_sql, ["userid", "day"] + DAILY_COLUMNS),
+            ):
+                counts[table] = 0
+                for _, rows in backend.stream(reader, sql, batch_size=batch_size):
+                    counts[table] += backend.bulk_insert(cur, table, columns, rows)
+    finally:
+        reader.close()
+        writer.close()
+    logging.info(f"User index rebuilt ({counts['user_stats']} user/board rows, "
+                 f"{counts['user_daily']} user/day rows).")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    try:
+        rebuild_user_index()
+    except Exception as e:
+        logging.error(f"User index rebuild error: {e}")
+        sys.exit(1)